@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'api.settings')
+# Async read views (core/async_views.py) only pay off on an event loop
+os.environ.setdefault('ASYNC_VIEWS', 'true')
 
 application = get_asgi_application()
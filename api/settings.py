@@ -53,6 +53,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so request timing covers every other middleware (auth included)
+    'core.middleware.metrics_middleware.MetricsMiddleware',
+    # Dev/staging: slow-query log and N+1 detection (QUERY_AUDIT)
+    'core.middleware.query_audit_middleware.QueryAuditMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -70,6 +74,9 @@ CORS_ALLOWED_ORIGINS = [
     'http://localhost:5173',
 ]
 
+# Keyset pagination headers on list endpoints
+CORS_EXPOSE_HEADERS = ['X-Next-Cursor', 'Link', 'ETag']
+
 CSRF_TRUSTED_ORIGINS = [
     'http://localhost:5173',
 ]
@@ -77,6 +84,20 @@ CSRF_TRUSTED_ORIGINS = [
 # MongoDB (Path A): used by PyMongo repositories in core.mongo
 MONGODB_URI = os.getenv('MONGODB_URI', '')
 MONGODB_DB = os.getenv('MONGODB_DB', '')
+# Read analytics totals from the monthly_rollups collection; turn on only after `manage.py rebuild_rollups`
+ANALYTICS_USE_ROLLUPS = os.getenv('ANALYTICS_USE_ROLLUPS', 'false').lower() == 'true'
+# Connection pool / driver options applied to every MongoClient built by core.mongo
+MONGODB_MAX_POOL_SIZE = int(os.getenv('MONGODB_MAX_POOL_SIZE', '100'))
+MONGODB_MIN_POOL_SIZE = int(os.getenv('MONGODB_MIN_POOL_SIZE', '0'))
+MONGODB_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv('MONGODB_WAIT_QUEUE_TIMEOUT_MS', '0')) or None
+MONGODB_COMPRESSORS = os.getenv('MONGODB_COMPRESSORS', '')  # e.g. "zstd,snappy"
+MONGODB_READ_PREFERENCE = os.getenv('MONGODB_READ_PREFERENCE', '')
+# Named handles for core.mongo.get_db(name). Without a "uri" a handle shares the default pool.
+MONGODB_HANDLES = {
+    'analytics': {
+        'read_preference': os.getenv('MONGODB_ANALYTICS_READ_PREFERENCE', 'secondaryPreferred'),
+    },
+}
 
 # Aliases used by middleware
 MONGO_URI = os.getenv('MONGO_URI', MONGODB_URI)
@@ -88,7 +109,20 @@ AUTH_VERIFY_URL = os.getenv('AUTH_VERIFY_URL', 'https://your-auth-service.com/ap
 # Option B (local JWT) - optional
 JWT_SECRET = os.getenv('JWT_SECRET', '')
 JWT_ALGORITHM = os.getenv('JWT_ALGORITHM', 'HS256')
-# JWT_PUBLIC_KEY_PATH = os.getenv('JWT_PUBLIC_KEY_PATH', '')
+JWT_PUBLIC_KEY_PATH = os.getenv('JWT_PUBLIC_KEY_PATH', '')
+JWT_PUBLIC_KEY = Path(JWT_PUBLIC_KEY_PATH).read_text() if JWT_PUBLIC_KEY_PATH else os.getenv('JWT_PUBLIC_KEY', '')
+
+# Verifier order: comma list of "local"/"external"; empty = local first when a JWT secret/public key is set
+AUTH_VERIFY_ORDER = os.getenv('AUTH_VERIFY_ORDER', '')
+AUTH_VERIFY_TIMEOUT = float(os.getenv('AUTH_VERIFY_TIMEOUT', '5'))
+AUTH_VERIFY_POOL_SIZE = int(os.getenv('AUTH_VERIFY_POOL_SIZE', '20'))
+# Circuit breaker around AUTH_VERIFY_URL: open after N consecutive failures, retry after cooldown seconds
+AUTH_BREAKER_THRESHOLD = int(os.getenv('AUTH_BREAKER_THRESHOLD', '5'))
+AUTH_BREAKER_COOLDOWN = float(os.getenv('AUTH_BREAKER_COOLDOWN', '30'))
+
+# Verified-token cache in ExternalAuthMiddleware (entries never outlive the JWT exp claim)
+AUTH_CACHE_TTL = int(os.getenv('AUTH_CACHE_TTL', '60'))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv('AUTH_CACHE_MAX_ENTRIES', '10000'))
 
 ROOT_URLCONF = 'api.urls'
 
@@ -175,12 +209,62 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
+    # orjson-backed JSON (core/renderers.py); the browsable API stays available
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     # Add JWT later if needed:
     # 'DEFAULT_AUTHENTICATION_CLASSES': [
     #     'rest_framework_simplejwt.authentication.JWTAuthentication',
     # ],
 }
 
+# BaseMongoViewSet.list page sizes (?limit= is clamped to LIST_MAX_PAGE_SIZE)
+LIST_PAGE_SIZE = int(os.getenv('LIST_PAGE_SIZE', '100'))
+LIST_MAX_PAGE_SIZE = int(os.getenv('LIST_MAX_PAGE_SIZE', '500'))
+# POST /api/transactions/bulk/ item cap
+BULK_MAX_ITEMS = int(os.getenv('BULK_MAX_ITEMS', '1000'))
+# GET /api/transactions/export/: cursor batch size and streamed chunk size
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', '2000'))
+EXPORT_CHUNK_BYTES = int(os.getenv('EXPORT_CHUNK_BYTES', str(64 * 1024)))
+# POST /api/transactions/import/: rows validated and inserted per insert_many, and row errors reported
+IMPORT_CHUNK_SIZE = int(os.getenv('IMPORT_CHUNK_SIZE', '1000'))
+IMPORT_MAX_ERRORS = int(os.getenv('IMPORT_MAX_ERRORS', '100'))
+# GET /api/dashboard/summary/: threads (per process) running the sections concurrently under WSGI
+DASHBOARD_MAX_WORKERS = int(os.getenv('DASHBOARD_MAX_WORKERS', '16'))
+
+# Request/Mongo/auth metrics at /metrics (Prometheus text format). METRICS_TOKEN is required as a bearer token;
+# without one /metrics is only served with DEBUG on
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'false').lower() == 'true'
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# Dev/staging Mongo audit: log commands slower than QUERY_SLOW_MS, and report a request sending one
+# command shape more than QUERY_REPEAT_LIMIT times (N+1); QUERY_AUDIT_RAISE turns the report into an error
+QUERY_AUDIT = os.getenv('QUERY_AUDIT', 'false').lower() == 'true'
+QUERY_SLOW_MS = float(os.getenv('QUERY_SLOW_MS', '100'))
+QUERY_REPEAT_LIMIT = int(os.getenv('QUERY_REPEAT_LIMIT', '10'))
+QUERY_AUDIT_RAISE = os.getenv('QUERY_AUDIT_RAISE', 'false').lower() == 'true'
+
+# Serve the read paths with async views (core/async_views.py); api/asgi.py turns this on. Leave off under WSGI
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'false').lower() == 'true'
+
+# Create paths enqueue XP awards in the outbox instead of awarding inline. Opt-in: only turn this on
+# where `manage.py run_outbox_worker` runs, or XP, badges and counters are never applied
+XP_OUTBOX_ENABLED = os.getenv('XP_OUTBOX_ENABLED', 'false').lower() == 'true'
+OUTBOX_RETENTION_SECONDS = int(os.getenv('OUTBOX_RETENTION_SECONDS', str(7 * 24 * 3600)))
+
+# Most missed occurrences one recurring rule fires per run; the rest follow on later runs
+RECURRING_CATCHUP_MAX = int(os.getenv('RECURRING_CATCHUP_MAX', '366'))
+
+# Analytics response cache, keyed by the per-user data version (0 disables it)
+ANALYTICS_CACHE_TTL = int(os.getenv('ANALYTICS_CACHE_TTL', '300'))
+ANALYTICS_CACHE_MAX_ENTRIES = int(os.getenv('ANALYTICS_CACHE_MAX_ENTRIES', '5000'))
+# Optional Django CACHES alias (e.g. Redis) shared by all workers; empty keeps the cache per process
+ANALYTICS_CACHE_ALIAS = os.getenv('ANALYTICS_CACHE_ALIAS', '')
+# How long a cached data version (per process, or in the shared cache) is served before it is re-read
+DATA_VERSION_TTL = float(os.getenv('DATA_VERSION_TTL', '5'))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -14,6 +14,7 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
@@ -21,7 +22,11 @@ from core.views import health, ProfileViewSet, TransactionViewSet, GoalViewSet,
 from core.views_profile_example import profile_snapshot
 from core.auth_views import signup_view, login_view, me_profile
 from core.xp_views import award_xp_view
+from core.export_views import export_transactions
+from core.import_views import import_transactions
 from core.analytics_views import spend_by_category, income_vs_expense, goal_progress
+from core.dashboard_views import dashboard_summary
+from core.metrics import metrics_view
 from core.recurring_views import (
     list_recurring,
     create_recurring,
@@ -38,11 +43,26 @@ router.register(r'profiles', ProfileViewSet, basename='profile')
 router.register(r'transactions', TransactionViewSet, basename='transaction')
 router.register(r'goals', GoalViewSet, basename='goal')
 router.register(r'xp-log', XPLogViewSet, basename='xp-log')
+router_urls = router.urls
+
+if settings.ASYNC_VIEWS:
+    # ASGI: serve the read paths natively async; writes stay on the sync views
+    from core import async_views
+    router_urls = async_views.read_routes(router_urls)
+    me_profile = async_views.me_profile
+    spend_by_category = async_views.spend_by_category
+    income_vs_expense = async_views.income_vs_expense
+    goal_progress = async_views.goal_progress
+    dashboard_summary = async_views.dashboard_summary
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('health/', health),
-    path('api/', include(router.urls)),
+    path('metrics', metrics_view),
+    # Before the router so "export"/"import" are not taken as transaction ids
+    path('api/transactions/export/', export_transactions),
+    path('api/transactions/import/', import_transactions),
+    path('api/', include(router_urls)),
     # Auth endpoints (bypass middleware)
     path('api/auth/signup/', signup_view),
     path('api/auth/login/', login_view),
@@ -53,6 +73,7 @@ urlpatterns = [
     path('api/analytics/spend-by-category/', spend_by_category),
     path('api/analytics/income-vs-expense/', income_vs_expense),
     path('api/analytics/goal-progress/', goal_progress),
+    path('api/dashboard/summary/', dashboard_summary),
     # Recurring
     path('api/recurring/', list_recurring),
     path('api/recurring/create/', create_recurring),
@@ -1,9 +1,12 @@
 from datetime import datetime, timedelta, timezone
-from collections import defaultdict
-from django.http import JsonResponse
 from django.views.decorators.http import require_GET
 from django.utils.dateparse import parse_date
+from django.conf import settings
+from .renderers import FastJsonResponse
 from .mongo import get_db
+from . import forecast, rollups
+from .response_cache import cached_by_data_version
+from .rollups import AMOUNT_EXPR as _AMOUNT_EXPR, CATEGORY_EXPR as _CATEGORY_EXPR, IS_INCOME_EXPR as _IS_INCOME_EXPR
 
 
 def _get_user_id(request):
@@ -34,133 +37,202 @@ def _month_range_utc(month_str: str):
         return start, end
 
 
+def _use_rollups() -> bool:
+    return getattr(settings, "ANALYTICS_USE_ROLLUPS", False)
+
+
+def _spend_by_category_pipeline(user_id: str, start: datetime, end: datetime) -> list:
+    return [
+        {"$match": {
+            "user_id": user_id,
+            "is_deleted": {"$ne": True},
+            "occurred_at": {"$gte": start, "$lt": end},
+        }},
+        {"$group": {"_id": _CATEGORY_EXPR, "total": {"$sum": _AMOUNT_EXPR}, "first_seen": {"$min": "$_id"}}},
+        # Ties keep first-seen order, as the old Python loop did
+        {"$sort": {"total": -1, "first_seen": 1}},
+    ]
+
+
+def _spend_by_category_data(db, user_id: str, start: datetime, end: datetime) -> list:
+    return rollups.spend_by_category_result(db["transactions"].aggregate(_spend_by_category_pipeline(user_id, start, end)))
+
+
+def _spend_by_category_for(db, user_id: str, start: datetime, end: datetime) -> list:
+    if _use_rollups():
+        return rollups.spend_by_category(db, user_id, rollups.months_between(start, end))
+    return _spend_by_category_data(db, user_id, start, end)
+
+
+def _spend_month(request):
+    month = request.GET.get("month")
+    return _month_range_utc(month) if month else _month_range_utc(datetime.now(timezone.utc).strftime("%Y-%m"))
+
+
 @require_GET
+@cached_by_data_version("spend_by_category", _get_user_id)
 def spend_by_category(request):
     user_id = _get_user_id(request)
     if not user_id:
-        return JsonResponse({"error": "Unauthorized"}, status=401)
-    month = request.GET.get("month")
-    start, end = _month_range_utc(month) if month else _month_range_utc(datetime.now(timezone.utc).strftime("%Y-%m"))
+        return FastJsonResponse({"error": "Unauthorized"}, status=401)
+    start, end = _spend_month(request)
+
+    data = _spend_by_category_for(get_db("analytics"), user_id, start, end)
+    return FastJsonResponse({"month": start.strftime("%Y-%m"), "data": data})
 
-    db = get_db()
-    filt = {
+
+_INCOME_EXPENSE_ACCUMULATORS = {
+    "income": {"$sum": {"$cond": [_IS_INCOME_EXPR, _AMOUNT_EXPR, 0.0]}},
+    "expense": {"$sum": {"$cond": [_IS_INCOME_EXPR, 0.0, _AMOUNT_EXPR]}},
+}
+
+GROUP_BY_UNITS = ("day", "week", "month")
+
+
+def _income_expense_pipeline(user_id: str, start: datetime, end: datetime, group_by: str | None = None) -> list:
+    match = {"$match": {
         "user_id": user_id,
         "is_deleted": {"$ne": True},
         "occurred_at": {"$gte": start, "$lt": end},
-    }
-    cursor = db["transactions"].find(filt, {"category": 1, "amount": 1})
-    totals = defaultdict(float)
-    for t in cursor:
-        cat = (t.get("category") or "Uncategorized").strip() or "Uncategorized"
-        try:
-            amt = float(t.get("amount") or 0)
-        except Exception:
-            amt = 0
-        totals[cat] += amt
-    data = [{"category": k, "total": round(v, 2)} for k, v in sorted(totals.items(), key=lambda x: -x[1])]
-    return JsonResponse({"month": start.strftime("%Y-%m"), "data": data})
+    }}
+    totals_stage = {"$group": {"_id": None, **_INCOME_EXPENSE_ACCUMULATORS}}
+    if not group_by:
+        return [match, totals_stage]
+    period = {"$dateTrunc": {"date": "$occurred_at", "unit": group_by, "timezone": "UTC", "startOfWeek": "monday"}}
+    return [
+        match,
+        {"$facet": {
+            "totals": [totals_stage],
+            "series": [
+                {"$group": {"_id": period, **_INCOME_EXPENSE_ACCUMULATORS}},
+                {"$sort": {"_id": 1}},
+            ],
+        }},
+    ]
 
 
-def _is_income_category(cat: str) -> bool:
-    if not cat:
-        return False
-    c = cat.lower()
-    income_keywords = ["income", "salary", "refund", "bonus", "interest", "dividend"]
-    return any(k in c for k in income_keywords)
+def _income_expense_result(rows: list, group_by: str | None = None) -> dict:
+    if not group_by:
+        totals = rows[0] if rows else {}
+        return {"income": totals.get("income", 0.0), "expense": totals.get("expense", 0.0)}
+    facets = rows[0] if rows else {}
+    totals = (facets.get("totals") or [{}])[0]
+    series = []
+    for row in facets.get("series") or []:
+        p = row["_id"]
+        if isinstance(p, datetime) and p.tzinfo is None:
+            p = p.replace(tzinfo=timezone.utc)
+        series.append({
+            "period": p.date().isoformat() if isinstance(p, datetime) else p,
+            "income": round(row["income"], 2),
+            "expense": round(row["expense"], 2),
+            "net": round(row["income"] - row["expense"], 2),
+        })
+    return {"income": totals.get("income", 0.0), "expense": totals.get("expense", 0.0), "series": series}
 
 
-@require_GET
-def income_vs_expense(request):
-    user_id = _get_user_id(request)
-    if not user_id:
-        return JsonResponse({"error": "Unauthorized"}, status=401)
-    from_str = request.GET.get("from")
-    to_str = request.GET.get("to")
+def _income_expense_data(db, user_id: str, start: datetime, end: datetime, group_by: str | None = None) -> dict:
+    """Totals (and optionally a per-period series) for the range in one aggregation round trip."""
+    rows = list(db["transactions"].aggregate(_income_expense_pipeline(user_id, start, end, group_by)))
+    return _income_expense_result(rows, group_by)
+
+
+def _next_month_start(dt: datetime) -> datetime:
+    return datetime(dt.year + 1, 1, 1, tzinfo=timezone.utc) if dt.month == 12 else datetime(dt.year, dt.month + 1, 1, tzinfo=timezone.utc)
+
+
+def _rollup_split(start: datetime, end: datetime):
+    """(whole months, partial edge ranges) of [start, end), or None to query raw rows only."""
+    month_start = datetime(start.year, start.month, 1, tzinfo=timezone.utc)
+    first_full = start if start == month_start else _next_month_start(start)
+    last_full = datetime(end.year, end.month, 1, tzinfo=timezone.utc)
+    if not _use_rollups() or first_full >= last_full:
+        return None
+    edges = [(lo, hi) for lo, hi in ((start, first_full), (last_full, end)) if lo < hi]
+    return rollups.months_between(first_full, last_full), edges
+
+
+def _income_expense_totals(db, user_id: str, start: datetime, end: datetime) -> dict:
+    """Whole months inside [start, end) come from rollups; the partial edge months from raw rows."""
+    split = _rollup_split(start, end)
+    if split is None:
+        return _income_expense_data(db, user_id, start, end)
+    months, edges = split
+    totals = rollups.income_expense(db, user_id, months)
+    for lo, hi in edges:
+        edge = _income_expense_data(db, user_id, lo, hi)
+        totals["income"] += edge["income"]
+        totals["expense"] += edge["expense"]
+    return totals
+
+
+def _income_expense_for(db, user_id: str, start: datetime, end: datetime, group_by: str | None) -> dict:
+    if group_by:
+        return _income_expense_data(db, user_id, start, end, group_by)
+    return _income_expense_totals(db, user_id, start, end)
+
+
+def _income_expense_range(request):
+    """(start, end, group_by) from the query string; raises ValueError on bad input."""
+    group_by = (request.GET.get("group_by") or "").lower() or None
+    if group_by and group_by not in GROUP_BY_UNITS:
+        raise ValueError(f"group_by must be one of {', '.join(GROUP_BY_UNITS)}")
     now = datetime.now(timezone.utc)
-    start = parse_date(from_str) if from_str else None
-    end = parse_date(to_str) if to_str else None
+    start = parse_date(request.GET["from"]) if request.GET.get("from") else None
+    end = parse_date(request.GET["to"]) if request.GET.get("to") else None
     start_dt = datetime(start.year, start.month, start.day, tzinfo=timezone.utc) if start else now - timedelta(days=30)
     end_dt = datetime(end.year, end.month, end.day, tzinfo=timezone.utc) + timedelta(days=1) if end else now
+    return start_dt, end_dt, group_by
 
-    db = get_db()
-    filt = {
-        "user_id": user_id,
-        "is_deleted": {"$ne": True},
-        "occurred_at": {"$gte": start_dt, "$lt": end_dt},
-    }
-    cursor = db["transactions"].find(filt, {"category": 1, "amount": 1, "type": 1})
-    income = 0.0
-    expense = 0.0
-    for t in cursor:
-        try:
-            amt = float(t.get("amount") or 0)
-        except Exception:
-            amt = 0
-        # Prefer explicit type; fallback to category heuristics
-        tx_type = (t.get("type") or "").lower()
-        cat = t.get("category") or ""
-        if tx_type == "income" or (not tx_type and _is_income_category(cat)):
-            income += amt
-        else:
-            expense += amt
-    return JsonResponse({
-        "from": start_dt.isoformat(),
-        "to": end_dt.isoformat(),
+
+def _income_expense_payload(start: datetime, end: datetime, group_by: str | None, result: dict) -> dict:
+    income = result["income"]
+    expense = result["expense"]
+    payload = {
+        "from": start,
+        "to": end,
         "income": round(income, 2),
         "expense": round(expense, 2),
         "net": round(income - expense, 2),
-    })
+    }
+    if group_by:
+        payload["group_by"] = group_by
+        payload["series"] = result["series"]
+    return payload
+
+
+@require_GET
+@cached_by_data_version("income_vs_expense", _get_user_id)
+def income_vs_expense(request):
+    user_id = _get_user_id(request)
+    if not user_id:
+        return FastJsonResponse({"error": "Unauthorized"}, status=401)
+    try:
+        start_dt, end_dt, group_by = _income_expense_range(request)
+    except ValueError as e:
+        return FastJsonResponse({"error": str(e)}, status=400)
+
+    result = _income_expense_for(get_db("analytics"), user_id, start_dt, end_dt, group_by)
+    return FastJsonResponse(_income_expense_payload(start_dt, end_dt, group_by, result))
+
+
+def _window_days(request) -> int:
+    return min(max(int(request.GET.get("window") or 90), 7), 365)
 
 
 @require_GET
+@cached_by_data_version("goal_progress", _get_user_id)
 def goal_progress(request):
     try:
         user_id = _get_user_id(request)
         if not user_id:
-            return JsonResponse({"error": "Unauthorized"}, status=401)
-        db = get_db()
-        cursor = db["goals"].find({"user_id": user_id, "is_deleted": {"$ne": True}})
+            return FastJsonResponse({"error": "Unauthorized"}, status=401)
+        try:
+            window = _window_days(request)
+        except ValueError:
+            return FastJsonResponse({"error": "window must be an integer number of days"}, status=400)
         now = datetime.now(timezone.utc)
-        out = []
-        def _parse_dt(val):
-            if isinstance(val, datetime):
-                # normalize naive to UTC
-                return val if val.tzinfo is not None else val.replace(tzinfo=timezone.utc)
-            if isinstance(val, str):
-                try:
-                    # support trailing Z
-                    s = val.replace("Z", "+00:00")
-                    dt = datetime.fromisoformat(s)
-                    return dt if dt.tzinfo is not None else dt.replace(tzinfo=timezone.utc)
-                except Exception:
-                    return now
-            return now
-        for g in cursor:
-            try:
-                tgt = float(g.get("target_amount") or 0)
-            except Exception:
-                tgt = 0.0
-            try:
-                cur = float(g.get("current_amount") or 0)
-            except Exception:
-                cur = 0.0
-            created_at = _parse_dt(g.get("created_at") or now)
-            days = max((now - created_at).days, 1)
-            rate_per_day = cur / days if days > 0 else 0
-            progress_pct = (cur / tgt * 100.0) if tgt > 0 else 0
-            forecast_date = None
-            if rate_per_day > 0 and tgt > cur:
-                remaining = (tgt - cur) / rate_per_day
-                forecast_date = (now + timedelta(days=remaining)).date().isoformat()
-            out.append({
-                "id": g.get("id"),
-                "name": g.get("name"),
-                "target_amount": round(tgt, 2),
-                "current_amount": round(cur, 2),
-                "progress_pct": round(progress_pct, 2),
-                "forecast_date": forecast_date,
-                "status": g.get("status"),
-            })
-        return JsonResponse({"goals": out})
+        out = forecast.project(forecast.load(get_db("analytics"), user_id, now, window), now, window_days=window)
+        return FastJsonResponse({"goals": out, "window_days": window})
     except Exception as e:
-        return JsonResponse({"error": f"goal_progress_failed: {e}"}, status=400)
+        return FastJsonResponse({"error": f"goal_progress_failed: {e}"}, status=400)
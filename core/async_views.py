@@ -0,0 +1,279 @@
+"""Async (ASGI) versions of the read-heavy views.
+
+api/urls.py serves these instead of their sync counterparts when
+settings.ASYNC_VIEWS is on (api/asgi.py turns it on), so a request waiting on
+Mongo or the auth verifier no longer holds a worker thread. Query building and
+response shaping are shared with the sync views; only the I/O differs.
+
+Mongo is reached through PyMongo's async API (core.mongo.get_async_db). Where
+that is unavailable (PyMongo < 4.13) each view runs the sync code in a worker
+thread instead, which keeps the event loop free but is bounded by the thread pool.
+"""
+import asyncio
+from datetime import datetime, timezone
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.urls import URLPattern
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET
+from . import analytics_views, auth_views, dashboard_views, dataversion, forecast, response_cache, rollups
+from .mongo import get_async_db, get_db
+from .renderers import FastJsonResponse, dumps
+from .response_cache import cached_by_data_version
+from .views import BaseMongoViewSet
+
+
+async def _in_thread(fn, *args):
+    return await sync_to_async(fn, thread_sensitive=False)(*args)
+
+
+async def _aggregate(adb, collection: str, pipeline: list) -> list:
+    cursor = await adb[collection].aggregate(pipeline)
+    return await cursor.to_list(None)
+
+
+# Analytics ------------------------------------------------------------------
+
+async def _spend_by_category_for(user_id: str, start: datetime, end: datetime) -> list:
+    adb = get_async_db("analytics")
+    if adb is None:
+        return await _in_thread(analytics_views._spend_by_category_for, get_db("analytics"), user_id, start, end)
+    if analytics_views._use_rollups():
+        pipeline = rollups.spend_by_category_pipeline(user_id, rollups.months_between(start, end))
+        return rollups.spend_by_category_result(await _aggregate(adb, rollups.COLLECTION, pipeline))
+    rows = await _aggregate(adb, "transactions", analytics_views._spend_by_category_pipeline(user_id, start, end))
+    return rollups.spend_by_category_result(rows)
+
+
+async def _income_expense_for(user_id: str, start: datetime, end: datetime, group_by) -> dict:
+    adb = get_async_db("analytics")
+    if adb is None:
+        return await _in_thread(analytics_views._income_expense_for, get_db("analytics"), user_id, start, end, group_by)
+    split = None if group_by else analytics_views._rollup_split(start, end)
+    if split is None:
+        rows = await _aggregate(adb, "transactions", analytics_views._income_expense_pipeline(user_id, start, end, group_by))
+        return analytics_views._income_expense_result(rows, group_by)
+    months, edges = split
+    # The rollup months and the raw edge ranges are independent: run them concurrently
+    results = await asyncio.gather(
+        _aggregate(adb, rollups.COLLECTION, rollups.income_expense_pipeline(user_id, months)),
+        *(_aggregate(adb, "transactions", analytics_views._income_expense_pipeline(user_id, lo, hi)) for lo, hi in edges),
+    )
+    totals = rollups.income_expense_result(results[0])
+    for rows in results[1:]:
+        edge = analytics_views._income_expense_result(rows)
+        totals["income"] += edge["income"]
+        totals["expense"] += edge["expense"]
+    return totals
+
+
+async def _forecast_load(user_id: str, now: datetime, window: int) -> dict:
+    adb = get_async_db("analytics")
+    if adb is None:
+        return await _in_thread(forecast.load, get_db("analytics"), user_id, now, window)
+    q = forecast.queries(user_id, now, window)
+    goals, plans, recent = await asyncio.gather(
+        adb["goals"].find(*q["goals"]).to_list(None),
+        adb["savings_plans"].find(*q["plans"]).to_list(None),
+        _aggregate(adb, "savings_contributions", q["recent"]),
+    )
+    return forecast.assemble(goals, plans, recent)
+
+
+@require_GET
+@cached_by_data_version("spend_by_category", analytics_views._get_user_id)
+async def spend_by_category(request):
+    user_id = analytics_views._get_user_id(request)
+    if not user_id:
+        return FastJsonResponse({"error": "Unauthorized"}, status=401)
+    start, end = analytics_views._spend_month(request)
+    data = await _spend_by_category_for(user_id, start, end)
+    return FastJsonResponse({"month": start.strftime("%Y-%m"), "data": data})
+
+
+@require_GET
+@cached_by_data_version("income_vs_expense", analytics_views._get_user_id)
+async def income_vs_expense(request):
+    user_id = analytics_views._get_user_id(request)
+    if not user_id:
+        return FastJsonResponse({"error": "Unauthorized"}, status=401)
+    try:
+        start, end, group_by = analytics_views._income_expense_range(request)
+    except ValueError as e:
+        return FastJsonResponse({"error": str(e)}, status=400)
+    result = await _income_expense_for(user_id, start, end, group_by)
+    return FastJsonResponse(analytics_views._income_expense_payload(start, end, group_by, result))
+
+
+@require_GET
+@cached_by_data_version("goal_progress", analytics_views._get_user_id)
+async def goal_progress(request):
+    try:
+        user_id = analytics_views._get_user_id(request)
+        if not user_id:
+            return FastJsonResponse({"error": "Unauthorized"}, status=401)
+        try:
+            window = analytics_views._window_days(request)
+        except ValueError:
+            return FastJsonResponse({"error": "window must be an integer number of days"}, status=400)
+        now = datetime.now(timezone.utc)
+        out = forecast.project(await _forecast_load(user_id, now, window), now, window_days=window)
+        return FastJsonResponse({"goals": out, "window_days": window})
+    except Exception as e:
+        return FastJsonResponse({"error": f"goal_progress_failed: {e}"}, status=400)
+
+
+# Profile --------------------------------------------------------------------
+
+async def me_profile(request):
+    adb = get_async_db()
+    if adb is None:
+        return await _in_thread(auth_views.me_profile, request)
+    user_doc = getattr(request, "mongodb_user", None)
+    if not user_doc:
+        user_id = auth_views._bearer_user_id(request)
+        if user_id:
+            try:
+                user_doc = await adb["users"].find_one({"id": user_id, "is_deleted": {"$ne": True}})
+            except Exception:
+                user_doc = None
+    if not user_doc:
+        return FastJsonResponse({"error": "Unauthorized"}, status=401)
+    profile = await adb["profiles"].find_one({"user_id": user_doc.get("id"), "is_deleted": {"$ne": True}}) or {}
+    return FastJsonResponse(auth_views._profile_payload(user_doc, profile))
+
+
+# Dashboard summary ------------------------------------------------------------
+
+async def _dashboard_profile(adb, user_id: str, user_doc, params: dict) -> dict:
+    if not user_doc:
+        user_doc = await adb["users"].find_one({"id": user_id, "is_deleted": {"$ne": True}}) or {"id": user_id}
+    profile = await adb["profiles"].find_one(dashboard_views.active(user_id)) or {}
+    return auth_views._profile_payload(user_doc, profile)
+
+
+async def _dashboard_spend(adb, user_id: str, user_doc, params: dict) -> dict:
+    start, end = params["month"]
+    return {"month": start.strftime("%Y-%m"), "data": await _spend_by_category_for(user_id, start, end)}
+
+
+async def _dashboard_income(adb, user_id: str, user_doc, params: dict) -> dict:
+    start, end, group_by = params["range"]
+    result = await _income_expense_for(user_id, start, end, group_by)
+    return analytics_views._income_expense_payload(start, end, group_by, result)
+
+
+async def _dashboard_goals(adb, user_id: str, user_doc, params: dict) -> dict:
+    window = params["window"]
+    now = datetime.now(timezone.utc)
+    goals = forecast.project(await _forecast_load(user_id, now, window), now, window_days=window)
+    return {"goals": goals, "window_days": window}
+
+
+def _dashboard_list(collection: str):
+    async def load(adb, user_id: str, user_doc, params: dict) -> dict:
+        return {"items": await adb[collection].find(dashboard_views.active(user_id), {"_id": 0}).to_list(None)}
+    return load
+
+
+_DASHBOARD_LOADERS = {
+    "profile": _dashboard_profile,
+    "spend_by_category": _dashboard_spend,
+    "income_vs_expense": _dashboard_income,
+    "goal_progress": _dashboard_goals,
+    **{name: _dashboard_list(collection) for name, collection in dashboard_views.LISTS.items()},
+}
+
+
+@require_GET
+async def dashboard_summary(request):
+    adb = get_async_db()
+    if adb is None:
+        return await _in_thread(dashboard_views.dashboard_summary, request)
+    user_id = analytics_views._get_user_id(request)
+    if not user_id:
+        return FastJsonResponse({"error": "Unauthorized"}, status=401)
+    try:
+        sections, params = dashboard_views.parse(request)
+    except ValueError as e:
+        return FastJsonResponse({"error": str(e)}, status=400)
+    keys = {}
+    if response_cache.enabled() and any(name in dashboard_views.CACHED for name in sections):
+        keys = dashboard_views.cache_keys(request, user_id, sections, await dataversion.acurrent(user_id))
+    results = await response_cache.aget_many(keys) if keys else {}
+    missing = [name for name in sections if name not in results]
+    if missing:
+        user_doc = getattr(request, "mongodb_user", None)
+        loaded = dict(zip(missing, await asyncio.gather(
+            *(_DASHBOARD_LOADERS[name](adb, user_id, user_doc, params) for name in missing),
+            return_exceptions=True,
+        )))
+        if keys:
+            await response_cache.aset_many(dashboard_views.to_cache(keys, loaded))
+        results.update(loaded)
+    return FastJsonResponse(dashboard_views.compose(sections, results))
+
+
+# Viewset list/retrieve --------------------------------------------------------
+
+def _drf_json(data, status: int = 200, headers=None) -> HttpResponse:
+    """What FastJSONRenderer would produce for a DRF Response."""
+    response = HttpResponse(dumps(data, utc_z=True), content_type="application/json", status=status)
+    for name, value in (headers or {}).items():
+        response[name] = value
+    patch_vary_headers(response, ("Accept",))
+    return response
+
+
+async def _list(viewset: BaseMongoViewSet, adb, request) -> HttpResponse:
+    try:
+        filt, order, limit = viewset._list_query(request)
+    except ValueError as e:
+        return _drf_json({"detail": str(e)}, status=400)
+    cursor = adb[viewset.collection_name].find(filt, viewset._projection()).sort(order).limit(limit + 1)
+    data, headers = viewset._list_page(request, await cursor.to_list(None), limit)
+    return _drf_json(data, headers=headers)
+
+
+async def _retrieve(viewset: BaseMongoViewSet, adb, request, pk) -> HttpResponse:
+    doc = await adb[viewset.collection_name].find_one({"id": pk, "is_deleted": False})
+    payload, code = viewset._retrieve_result(request, doc)
+    return _drf_json(payload, status=code)
+
+
+def _async_reads(drf_view):
+    """Serve GET natively; every other method goes to the DRF view in a thread."""
+    action = drf_view.actions["get"]
+    viewset = drf_view.cls()  # only its query/response helpers are used
+    in_thread = sync_to_async(drf_view)
+
+    @csrf_exempt
+    async def view(request, *args, **kwargs):
+        browsable = "text/html" in request.headers.get("Accept", "")
+        if request.method != "GET" or kwargs.get("format") or request.GET.get("format") or browsable:
+            # Writes, format overrides and the browsable API stay on DRF
+            return await in_thread(request, *args, **kwargs)
+        adb = get_async_db()
+        if adb is None:
+            return await in_thread(request, *args, **kwargs)
+        if action == "list":
+            return await _list(viewset, adb, request)
+        return await _retrieve(viewset, adb, request, kwargs.get("pk"))
+
+    view.cls = drf_view.cls
+    view.actions = drf_view.actions
+    return view
+
+
+def read_routes(patterns) -> list:
+    """Router URL patterns with the list/retrieve routes of Mongo viewsets served by async views."""
+    out = []
+    for p in patterns:
+        callback = getattr(p, "callback", None)
+        cls = getattr(callback, "cls", None)
+        actions = getattr(callback, "actions", None) or {}
+        if isinstance(p, URLPattern) and cls and issubclass(cls, BaseMongoViewSet) and actions.get("get") in ("list", "retrieve"):
+            p = URLPattern(p.pattern, _async_reads(callback), p.default_args, p.name)
+        out.append(p)
+    return out
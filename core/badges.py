@@ -0,0 +1,56 @@
+"""Badge rule registry.
+
+Rules are thresholds over values already on the profile document: ``level`` and the
+counters kept under ``profile["stats"]`` (see gamelogic.PROFILE_COUNTERS), so
+evaluating them never needs another query.
+"""
+from dataclasses import dataclass
+from typing import Dict, Iterable, List
+
+
+@dataclass(frozen=True)
+class BadgeRule:
+    code: str
+    metric: str
+    threshold: float
+    title: str = ""
+
+    def is_met(self, profile: Dict) -> bool:
+        return metric_value(profile, self.metric) >= self.threshold
+
+
+BADGE_RULES: List[BadgeRule] = [
+    BadgeRule("first_tx", "tx_count", 1, "First transaction"),
+    BadgeRule("tx_100", "tx_count", 100, "100 transactions"),
+    BadgeRule("tx_1000", "tx_count", 1000, "1,000 transactions"),
+    BadgeRule("first_goal", "goal_count", 1, "First goal created"),
+    BadgeRule("goals_5", "goal_count", 5, "Five goals"),
+    BadgeRule("level_5", "level", 5, "Level 5"),
+    BadgeRule("level_10", "level", 10, "Level 10"),
+    BadgeRule("level_25", "level", 25, "Level 25"),
+    BadgeRule("streak_7", "streak_days", 7, "7-day streak"),
+    BadgeRule("streak_30", "streak_days", 30, "30-day streak"),
+    BadgeRule("saved_1000", "total_saved", 1000, "Saved 1,000"),
+    BadgeRule("saved_10000", "total_saved", 10000, "Saved 10,000"),
+]
+
+
+def metric_value(profile: Dict, metric: str) -> float:
+    if metric == "level":
+        raw = profile.get("level") or 1
+    else:
+        raw = (profile.get("stats") or {}).get(metric) or 0
+    try:
+        return float(raw)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def earned_codes(profile: Dict) -> set:
+    return {b.get("code") for b in profile.get("badges", []) if isinstance(b, dict)}
+
+
+def evaluate(profile: Dict, rules: Iterable[BadgeRule] = None) -> List[BadgeRule]:
+    """Rules the profile satisfies but has not been awarded yet, in registry order."""
+    have = earned_codes(profile)
+    return [r for r in (BADGE_RULES if rules is None else rules) if r.code not in have and r.is_met(profile)]
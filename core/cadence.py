@@ -0,0 +1,88 @@
+"""Calendar-aware schedules for recurring rules and savings plans.
+
+Occurrences keep the time of day of the rule's ``next_run``. Monthly and yearly
+cadences step by calendar months and clamp to the last day of shorter months
+without drifting: a rule anchored on the 31st runs Jan 31, Feb 28, Mar 31, ...
+(the anchor is the rule's ``anchor_day``, falling back to ``next_run``'s day).
+"""
+import calendar
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+CADENCES = ("daily", "weekly", "biweekly", "monthly", "yearly")
+
+_FIXED = {
+    "daily": timedelta(days=1),
+    "weekly": timedelta(weeks=1),
+    "biweekly": timedelta(weeks=2),
+}
+_MONTHS = {"monthly": 1, "yearly": 12}
+
+
+def normalize(cadence: Optional[str]) -> str:
+    """Lower-cased cadence; unknown values fall back to weekly (the historical default)."""
+    c = (cadence or "").lower()
+    return c if c in CADENCES else "weekly"
+
+
+def aware(dt: datetime) -> datetime:
+    """pymongo returns naive UTC datetimes; make them comparable with timezone.utc 'now'."""
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt
+
+
+def add_months(dt: datetime, months: int, anchor_day: Optional[int] = None) -> datetime:
+    y, m = divmod(dt.month - 1 + months, 12)
+    year, month = dt.year + y, m + 1
+    day = min(anchor_day or dt.day, calendar.monthrange(year, month)[1])
+    return dt.replace(year=year, month=month, day=day)
+
+
+def next_occurrence(cadence: Optional[str], dt: datetime, anchor_day: Optional[int] = None) -> datetime:
+    c = normalize(cadence)
+    if c in _MONTHS:
+        return add_months(dt, _MONTHS[c], anchor_day)
+    return dt + _FIXED[c]
+
+
+def occurrences(
+    cadence: Optional[str], start: datetime, until: datetime, cap: Optional[int] = None, anchor_day: Optional[int] = None
+) -> List[datetime]:
+    """Scheduled dates from ``start`` up to and including ``until``, at most ``cap`` of them."""
+    out: List[datetime] = []
+    cur = aware(start)
+    until = aware(until)
+    anchor_day = anchor_day or cur.day
+    while cur <= until and (cap is None or len(out) < cap):
+        out.append(cur)
+        cur = next_occurrence(cadence, cur, anchor_day)
+    return out
+
+
+def anchor_of(doc: dict) -> Optional[int]:
+    """The rule's anchor day; rules created before ``anchor_day`` existed use their next_run's day."""
+    if doc.get("anchor_day"):
+        return int(doc["anchor_day"])
+    return doc["next_run"].day if isinstance(doc.get("next_run"), datetime) else None
+
+
+def catch_up(doc: dict, cadence: Optional[str], now: datetime, cap: Optional[int] = None) -> Tuple[List[datetime], datetime, bool]:
+    """Missed occurrences of a rule/plan up to ``now``.
+
+    Returns (occurrences, next_run after them, capped) where ``capped`` means the rule
+    is still behind after firing ``cap`` occurrences and will continue next run.
+    """
+    start = aware(doc.get("next_run") or now)
+    anchor = anchor_of(doc) or start.day
+    occs = occurrences(cadence, start, now, cap=cap, anchor_day=anchor)
+    next_run = next_occurrence(cadence, occs[-1], anchor) if occs else start
+    return occs, next_run, next_run <= aware(now)
+
+
+def next_after(doc: dict, cadence: Optional[str], now: datetime) -> datetime:
+    """First scheduled occurrence strictly after ``now`` (missed occurrences are skipped)."""
+    cur = aware(doc.get("next_run") or now)
+    anchor = anchor_of(doc) or cur.day
+    now = aware(now)
+    while cur <= now:
+        cur = next_occurrence(cadence, cur, anchor)
+    return cur
@@ -0,0 +1,203 @@
+"""GET /api/dashboard/summary/: the dashboard's reads in one request.
+
+The profile, analytics and recurring/savings list queries are independent, so they
+run concurrently on a bounded, process-wide thread pool (DASHBOARD_MAX_WORKERS) and
+the response takes about as long as the slowest of them rather than their sum.
+``sections=`` picks which ones run; each section has the same shape as its
+standalone endpoint, and the query string takes the same parameters (month,
+from/to/group_by, window). A section that fails is reported under ``errors``
+instead of failing the whole response.
+
+The response as a whole is not cached: XP and badge changes do not bump the data
+version (core/dataversion.py), so the profile section would go stale. The
+analytics sections are cached one by one under the data version instead, like
+their standalone endpoints (core/response_cache.py), so a repeat load only runs
+the profile and list queries. The lists are single indexed finds and carry
+scheduler lease fields that writes do not version, so they are always read.
+"""
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from django.conf import settings
+from django.views.decorators.http import require_GET
+from . import analytics_views, auth_views, dataversion, forecast, response_cache
+from .mongo import get_db
+from .renderers import FastJsonResponse
+
+SECTIONS = ("profile", "spend_by_category", "income_vs_expense", "goal_progress", "recurring", "savings")
+
+# List sections and the collection each one reads
+LISTS = {"recurring": "recurring_rules", "savings": "savings_plans"}
+
+# Sections keyed by data version, and the query parameters each one reads. Like the
+# standalone endpoints they are keyed by the raw query (plus the UTC day, for the
+# "now"-relative defaults), not the parsed range, which moves with the clock.
+CACHED = {"spend_by_category": ("month",), "income_vs_expense": ("from", "to", "group_by"), "goal_progress": ("window",)}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _reset_after_fork():
+    # The parent's worker threads do not exist in the child
+    global _pool
+    _pool = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(
+                    max_workers=max(getattr(settings, "DASHBOARD_MAX_WORKERS", 16), 1),
+                    thread_name_prefix="dashboard",
+                )
+    return _pool
+
+
+def _sections(request) -> list:
+    raw = request.GET.get("sections")
+    if not raw:
+        return list(SECTIONS)
+    names = [s.strip() for s in raw.split(",") if s.strip()]
+    if not names or any(s not in SECTIONS for s in names):
+        raise ValueError(f"sections must be a comma-separated subset of {', '.join(SECTIONS)}")
+    return list(dict.fromkeys(names))
+
+
+def parse(request) -> tuple:
+    """(sections, params) for the request; raises ValueError on bad input."""
+    sections = _sections(request)
+    params = {}
+    if "spend_by_category" in sections:
+        params["month"] = analytics_views._spend_month(request)
+    if "income_vs_expense" in sections:
+        params["range"] = analytics_views._income_expense_range(request)
+    if "goal_progress" in sections:
+        try:
+            params["window"] = analytics_views._window_days(request)
+        except ValueError:
+            raise ValueError("window must be an integer number of days") from None
+    return sections, params
+
+
+def active(user_id: str) -> dict:
+    return {"user_id": user_id, "is_deleted": {"$ne": True}}
+
+
+def _profile(user_id: str, user_doc, params: dict) -> dict:
+    db = get_db()
+    if not user_doc:
+        user_doc = db["users"].find_one({"id": user_id, "is_deleted": {"$ne": True}}) or {"id": user_id}
+    profile = db["profiles"].find_one(active(user_id)) or {}
+    return auth_views._profile_payload(user_doc, profile)
+
+
+def _spend_by_category(user_id: str, user_doc, params: dict) -> dict:
+    start, end = params["month"]
+    data = analytics_views._spend_by_category_for(get_db("analytics"), user_id, start, end)
+    return {"month": start.strftime("%Y-%m"), "data": data}
+
+
+def _income_vs_expense(user_id: str, user_doc, params: dict) -> dict:
+    start, end, group_by = params["range"]
+    result = analytics_views._income_expense_for(get_db("analytics"), user_id, start, end, group_by)
+    return analytics_views._income_expense_payload(start, end, group_by, result)
+
+
+def _goal_progress(user_id: str, user_doc, params: dict) -> dict:
+    window = params["window"]
+    now = datetime.now(timezone.utc)
+    goals = forecast.project(forecast.load(get_db("analytics"), user_id, now, window), now, window_days=window)
+    return {"goals": goals, "window_days": window}
+
+
+def _list(collection: str):
+    def load(user_id: str, user_doc, params: dict) -> dict:
+        return {"items": list(get_db()[collection].find(active(user_id), {"_id": 0}))}
+    return load
+
+
+LOADERS = {
+    "profile": _profile,
+    "spend_by_category": _spend_by_category,
+    "income_vs_expense": _income_vs_expense,
+    "goal_progress": _goal_progress,
+    **{name: _list(collection) for name, collection in LISTS.items()},
+}
+
+
+def compose(sections: list, results: dict) -> dict:
+    """The response payload from {section: value or the exception it raised}."""
+    payload, errors = {}, {}
+    for name in sections:
+        value = results[name]
+        if isinstance(value, BaseException):
+            errors[name] = f"{name}_failed: {value}"
+        else:
+            payload[name] = value
+    if errors:
+        payload["errors"] = errors
+    return payload
+
+
+def cache_keys(request, user_id: str, sections: list, version: int) -> dict:
+    """{section: cache key} for the cacheable sections requested."""
+    return {
+        name: response_cache.value_key(user_id, f"dashboard:{name}", tuple(request.GET.get(p) for p in CACHED[name]), version)
+        for name in sections if name in CACHED
+    }
+
+
+def to_cache(keys: dict, results: dict) -> dict:
+    """{key: value} for the freshly loaded sections that are cacheable and succeeded."""
+    return {keys[name]: value for name, value in results.items() if name in keys and not isinstance(value, BaseException)}
+
+
+def _run(name: str, user_id: str, user_doc, params: dict):
+    try:
+        return LOADERS[name](user_id, user_doc, params)
+    except Exception as e:
+        return e
+
+
+def load(user_id: str, user_doc, sections: list, params: dict) -> dict:
+    """{section: value or exception}; the first section runs on the calling thread, the rest on the pool."""
+    first, *rest = sections
+    # Each task gets a copy of the request's context, so per-request metrics see its queries
+    futures = {
+        name: _executor().submit(contextvars.copy_context().run, _run, name, user_id, user_doc, params)
+        for name in rest
+    }
+    results = {first: _run(first, user_id, user_doc, params)}
+    results.update((name, future.result()) for name, future in futures.items())
+    return results
+
+
+@require_GET
+def dashboard_summary(request):
+    user_id = analytics_views._get_user_id(request)
+    if not user_id:
+        return FastJsonResponse({"error": "Unauthorized"}, status=401)
+    try:
+        sections, params = parse(request)
+    except ValueError as e:
+        return FastJsonResponse({"error": str(e)}, status=400)
+    keys = {}
+    if response_cache.enabled() and any(name in CACHED for name in sections):
+        keys = cache_keys(request, user_id, sections, dataversion.current(user_id))
+    results = response_cache.get_many(keys) if keys else {}
+    missing = [name for name in sections if name not in results]
+    if missing:
+        loaded = load(user_id, getattr(request, "mongodb_user", None), missing, params)
+        if keys:
+            response_cache.set_many(to_cache(keys, loaded))
+        results.update(loaded)
+    return FastJsonResponse(compose(sections, results))
@@ -0,0 +1,129 @@
+"""Per-user data version, bumped by every write path.
+
+Analytics responses are cached and ETagged against this version (see
+core/response_cache.py), so a 304 only needs the version. The durable counter
+lives in the ``data_versions`` collection. Reads go through a cache: the shared
+Django cache named by ANALYTICS_CACHE_ALIAS when one is configured, otherwise a
+per-process LRU. A bump writes the new version into the cache, so a reader that
+loaded the old one just before cannot leave it there, and then re-reads Mongo so a
+concurrent bump's older version cannot be left there either; cached versions
+expire after DATA_VERSION_TTL, which bounds how long a write can go unnoticed.
+"""
+from datetime import datetime, timezone
+from typing import Iterable, Optional
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from pymongo import UpdateOne
+from .cache import LRUTTLCache
+from .mongo import get_async_db, get_db
+
+COLLECTION = "data_versions"
+
+_local = LRUTTLCache(
+    max_entries=getattr(settings, "ANALYTICS_CACHE_MAX_ENTRIES", 5000),
+    ttl=getattr(settings, "DATA_VERSION_TTL", 5),
+)
+
+
+def shared_cache():
+    """The Django cache shared across processes, or None to stay in-process."""
+    alias = getattr(settings, "ANALYTICS_CACHE_ALIAS", "")
+    return caches[alias] if alias else None
+
+
+def _key(user_id: str) -> str:
+    return f"fq:dv:{user_id}"
+
+
+def _ttl() -> float:
+    return getattr(settings, "DATA_VERSION_TTL", 5)
+
+
+def current(user_id: str) -> int:
+    key = _key(user_id)
+    shared = shared_cache()
+    version = shared.get(key) if shared is not None else _local.get(key)
+    if version is None:
+        doc = get_db()[COLLECTION].find_one({"user_id": user_id}, {"_id": 0, "version": 1})
+        version = int((doc or {}).get("version") or 0)
+        if shared is not None:
+            # add(): never overwrite the newer value a concurrent bump wrote
+            shared.add(key, version, _ttl())
+        else:
+            _local.set(key, version)
+    return version
+
+
+async def acurrent(user_id: str) -> int:
+    """current() for async views; without the async driver it runs current() in a thread."""
+    adb = get_async_db()
+    if adb is None:
+        return await sync_to_async(current, thread_sensitive=False)(user_id)
+    key = _key(user_id)
+    shared = shared_cache()
+    version = await shared.aget(key) if shared is not None else _local.get(key)
+    if version is None:
+        doc = await adb[COLLECTION].find_one({"user_id": user_id}, {"_id": 0, "version": 1})
+        version = int((doc or {}).get("version") or 0)
+        if shared is not None:
+            await shared.aadd(key, version, _ttl())
+        else:
+            _local.set(key, version)
+    return version
+
+
+def _read_versions(coll, user_ids, session=None) -> dict:
+    return {
+        d["user_id"]: int(d.get("version") or 0)
+        for d in coll.find({"user_id": {"$in": list(user_ids)}}, {"_id": 0, "user_id": 1, "version": 1}, session=session)
+    }
+
+
+def _store(versions: dict) -> None:
+    shared = shared_cache()
+    if shared is not None:
+        shared.set_many({_key(u): v for u, v in versions.items()}, _ttl())
+    for user_id, version in versions.items():
+        _local.set(_key(user_id), version)
+
+
+def _forget(user_ids) -> None:
+    keys = [_key(u) for u in user_ids]
+    shared = shared_cache()
+    if shared is not None:
+        shared.delete_many(keys)
+    for key in keys:
+        _local.delete(key)
+
+
+def bump_many(user_ids: Iterable[Optional[str]], session=None) -> None:
+    """Advance the version of every user in ``user_ids``. Call after the write is committed."""
+    ids = sorted({str(u) for u in user_ids if u})
+    if not ids:
+        return
+    now = datetime.now(timezone.utc)
+    coll = get_db()[COLLECTION]
+    coll.bulk_write(
+        [UpdateOne({"user_id": u}, {"$inc": {"version": 1}, "$set": {"updated_at": now}}, upsert=True) for u in ids],
+        ordered=False,
+        session=session,
+    )
+    # Write the new versions into the cache rather than deleting the keys: a reader that
+    # loaded the old version before the $inc would otherwise add() it back afterwards.
+    # Read back in one query instead of a find_one_and_update per user.
+    versions = _read_versions(coll, ids, session)
+    for _ in range(3):
+        _store(versions)
+        # A concurrent bump can cache its higher version just before this set lands on
+        # top of it; re-read, and store again until Mongo has not moved past the cache
+        latest = _read_versions(coll, versions, session)
+        versions = {u: v for u, v in latest.items() if v != versions[u]}
+        if not versions:
+            return
+    # Still racing after three rounds: drop the keys so the next read loads from Mongo
+    _forget(versions)
+
+
+def bump(user_id: Optional[str], session=None) -> None:
+    bump_many([user_id], session=session)
@@ -0,0 +1,145 @@
+"""Streaming transaction export (CSV / NDJSON).
+
+Rows are read from one cursor in EXPORT_BATCH_SIZE batches, serialized with the
+compiled TransactionSerializer and written out in ~EXPORT_CHUNK_BYTES chunks, so
+memory stays flat no matter how many rows the range holds. When the client
+accepts gzip the chunks are compressed on the fly.
+"""
+import csv
+import io
+import re
+from datetime import datetime, timedelta, timezone
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.dateparse import parse_date
+from django.utils.text import compress_sequence
+from django.views.decorators.http import require_GET
+from .compiled_serializers import compile_serializer
+from .mongo import get_db
+from .renderers import FastJsonResponse, dumps
+from .serializers import TransactionSerializer
+
+FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+}
+
+# CSV columns, in order; user_id and is_deleted are implied by the request
+FIELDS = ("id", "type", "amount", "currency", "category", "description", "occurred_at", "created_at", "updated_at")
+# Free text from users and statement imports; spreadsheets run cells starting with these as formulas
+TEXT_FIELDS = ("category", "description")
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+_accepts_gzip = re.compile(r"\bgzip\b")
+
+
+def _get_user_id(request):
+    u = getattr(request, "mongodb_user", None)
+    if u and u.get("id"):
+        return u["id"]
+    # fallback to header (dev)
+    return request.headers.get("X-User-Id")
+
+
+def _day_start(value: str):
+    d = parse_date(value)
+    if d is None:
+        raise ValueError(value)
+    return datetime(d.year, d.month, d.day, tzinfo=timezone.utc)
+
+
+def _query(user_id: str, start, end) -> dict:
+    filt = {"user_id": user_id, "is_deleted": {"$ne": True}}
+    if start or end:
+        filt["occurred_at"] = {}
+        if start:
+            filt["occurred_at"]["$gte"] = start
+        if end:
+            filt["occurred_at"]["$lt"] = end
+    return filt
+
+
+def _rows(db, filt: dict):
+    """Serialized rows in (occurred_at, id) order; the cursor is closed if the client goes away."""
+    to_representation = compile_serializer(TransactionSerializer)
+    projection = {"_id": 0, "user_id": 1, **{f: 1 for f in FIELDS}}
+    cursor = (
+        db["transactions"].find(filt, projection)
+        .sort([("occurred_at", 1), ("id", 1)])
+        .batch_size(getattr(settings, "EXPORT_BATCH_SIZE", 2000))
+    )
+    with cursor:
+        for doc in cursor:
+            yield to_representation(doc)
+
+
+def _csv_safe(row: dict) -> dict:
+    """Prefix text cells that a spreadsheet would evaluate with ' (CSV formula injection)."""
+    for field in TEXT_FIELDS:
+        value = row.get(field)
+        if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+            row[field] = "'" + value
+    return row
+
+
+def _csv_chunks(rows, chunk_bytes: int):
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=FIELDS, extrasaction="ignore", lineterminator="\n")
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(_csv_safe(row))
+        if buf.tell() >= chunk_bytes:
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue().encode("utf-8")
+
+
+def _ndjson_chunks(rows, chunk_bytes: int):
+    buf = bytearray()
+    for row in rows:
+        buf += dumps(row)
+        buf += b"\n"
+        if len(buf) >= chunk_bytes:
+            yield bytes(buf)
+            buf.clear()
+    yield bytes(buf)
+
+
+def stream(db, user_id: str, fmt: str, start=None, end=None, chunk_bytes=None):
+    """Byte chunks of the export body (uncompressed)."""
+    chunk_bytes = chunk_bytes or getattr(settings, "EXPORT_CHUNK_BYTES", 64 * 1024)
+    rows = _rows(db, _query(user_id, start, end))
+    chunks = _csv_chunks if fmt == "csv" else _ndjson_chunks
+    return chunks(rows, chunk_bytes)
+
+
+@require_GET
+def export_transactions(request):
+    user_id = _get_user_id(request)
+    if not user_id:
+        return FastJsonResponse({"error": "Unauthorized"}, status=401)
+    fmt = (request.GET.get("format") or "csv").lower()
+    if fmt not in FORMATS:
+        return FastJsonResponse({"error": f"format must be one of {', '.join(FORMATS)}"}, status=400)
+    try:
+        start = _day_start(request.GET["from"]) if request.GET.get("from") else None
+        # "to" is inclusive, like the analytics ranges
+        end = _day_start(request.GET["to"]) + timedelta(days=1) if request.GET.get("to") else None
+    except ValueError:
+        return FastJsonResponse({"error": "from/to must be dates (YYYY-MM-DD)"}, status=400)
+
+    content_type, ext = FORMATS[fmt]
+    body = stream(get_db(), user_id, fmt, start, end)
+    gzip = bool(_accepts_gzip.search(request.headers.get("Accept-Encoding", "")))
+    if gzip:
+        body = compress_sequence(body)
+    response = StreamingHttpResponse(body, content_type=content_type)
+    if gzip:
+        response["Content-Encoding"] = "gzip"
+    patch_vary_headers(response, ("Accept-Encoding",))
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%d")
+    response["Content-Disposition"] = f'attachment; filename="transactions-{stamp}.{ext}"'
+    response["Cache-Control"] = "private, no-store"
+    return response
@@ -0,0 +1,160 @@
+"""Goal completion forecasts, computed for all of a user's goals at once.
+
+Three models estimate a daily saving rate per goal and project when the remaining
+amount is reached:
+
+- ``linear``: current_amount spread over the days since the goal was created
+  (what goal-progress has always reported as ``forecast_date``);
+- ``plan``: the combined daily rate of the goal's active savings plans;
+- ``velocity``: applied savings contributions over the last ``window_days``.
+
+Inputs are loaded with three queries (goals, plans, one contribution aggregation).
+With NumPy installed the projections run as array operations; without it the same
+arithmetic runs per goal in Python and gives the same dates.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+
+try:
+    import numpy as np
+except ImportError:  # optional: pip install numpy
+    np = None
+
+MODELS = ("linear", "plan", "velocity")
+
+# Average days per cadence step, for turning plan amounts into a daily rate
+CADENCE_DAYS = {"daily": 1.0, "weekly": 7.0, "biweekly": 14.0, "monthly": 365.25 / 12, "yearly": 365.25}
+
+# Projections further out than this are reported as None
+MAX_HORIZON_DAYS = 365 * 100
+
+
+def _float(v) -> float:
+    try:
+        return float(v or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def parse_dt(val, default: datetime) -> datetime:
+    if isinstance(val, datetime):
+        # normalize naive to UTC
+        return val if val.tzinfo is not None else val.replace(tzinfo=timezone.utc)
+    if isinstance(val, str):
+        try:
+            # support trailing Z
+            dt = datetime.fromisoformat(val.replace("Z", "+00:00"))
+            return dt if dt.tzinfo is not None else dt.replace(tzinfo=timezone.utc)
+        except ValueError:
+            return default
+    return default
+
+
+def queries(user_id: str, now: datetime, window_days: int) -> Dict:
+    """The three reads behind load(): (filter, projection) for goals and plans, and the contributions pipeline."""
+    return {
+        "goals": (
+            {"user_id": user_id, "is_deleted": {"$ne": True}},
+            {"_id": 0, "id": 1, "name": 1, "target_amount": 1, "current_amount": 1, "created_at": 1, "deadline": 1, "status": 1},
+        ),
+        "plans": (
+            {"user_id": user_id, "is_deleted": {"$ne": True}, "active": True},
+            {"_id": 0, "goal_id": 1, "amount_per_interval": 1, "interval": 1},
+        ),
+        "recent": [
+            {"$match": {"user_id": user_id, "applied": True, "scheduled_for": {"$gte": now - timedelta(days=window_days)}}},
+            {"$group": {"_id": "$goal_id", "total": {"$sum": "$amount"}}},
+        ],
+    }
+
+
+def assemble(goals: List[Dict], plans: Iterable[Dict], recent: Iterable[Dict]) -> Dict:
+    plan_rate: Dict[str, float] = {}
+    for p in plans:
+        days = CADENCE_DAYS.get((p.get("interval") or "").lower(), CADENCE_DAYS["weekly"])
+        plan_rate[p.get("goal_id")] = plan_rate.get(p.get("goal_id"), 0.0) + _float(p.get("amount_per_interval")) / days
+    return {"goals": goals, "plan_rate": plan_rate, "recent": {r["_id"]: r["total"] for r in recent}}
+
+
+def load(db, user_id: str, now: datetime, window_days: int) -> Dict:
+    """Goals plus per-goal plan rates and recent contribution totals, in three round trips."""
+    q = queries(user_id, now, window_days)
+    return assemble(
+        list(db["goals"].find(*q["goals"])),
+        db["savings_plans"].find(*q["plans"]),
+        db["savings_contributions"].aggregate(q["recent"]),
+    )
+
+
+def _columns(data: Dict, now: datetime, window_days: int) -> Dict[str, List[float]]:
+    goals = data["goals"]
+    target = [_float(g.get("target_amount")) for g in goals]
+    current = [_float(g.get("current_amount")) for g in goals]
+    age = [max((now - parse_dt(g.get("created_at"), now)).days, 1) for g in goals]
+    return {
+        "target": target,
+        "current": current,
+        "linear": [c / a for c, a in zip(current, age)],
+        "plan": [data["plan_rate"].get(g.get("id"), 0.0) for g in goals],
+        "velocity": [_float(data["recent"].get(g.get("id"))) / window_days for g in goals],
+    }
+
+
+def _dates_numpy(cols: Dict[str, List[float]], now: datetime) -> Dict[str, List[Optional[str]]]:
+    remaining = np.asarray(cols["target"], dtype=float) - np.asarray(cols["current"], dtype=float)
+    base = np.datetime64(now.astimezone(timezone.utc).replace(tzinfo=None), "us")
+    out = {}
+    for model in MODELS:
+        rate = np.asarray(cols[model], dtype=float)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            days = np.where((rate > 0) & (remaining > 0), remaining / rate, np.nan)
+        days[days > MAX_HORIZON_DAYS] = np.nan
+        missing = np.isnan(days)
+        offset = np.round(np.where(missing, 0.0, days) * 86_400_000_000).astype("int64").astype("timedelta64[us]")
+        dates = (base + offset).astype("datetime64[D]").astype(str)
+        out[model] = [None if m else d for m, d in zip(missing.tolist(), dates.tolist())]
+    return out
+
+
+def _dates_python(cols: Dict[str, List[float]], now: datetime) -> Dict[str, List[Optional[str]]]:
+    remaining = [t - c for t, c in zip(cols["target"], cols["current"])]
+    out = {}
+    for model in MODELS:
+        days = [r / rate if rate > 0 and r > 0 else None for r, rate in zip(remaining, cols[model])]
+        out[model] = [
+            (now + timedelta(days=d)).date().isoformat() if d is not None and d <= MAX_HORIZON_DAYS else None for d in days
+        ]
+    return out
+
+
+def project(data: Dict, now: datetime, window_days: int = 90, use_numpy: Optional[bool] = None) -> List[Dict]:
+    """Per-goal progress and completion dates under each model, in goal order."""
+    cols = _columns(data, now, window_days)
+    if use_numpy is None:
+        use_numpy = np is not None
+    dates = _dates_numpy(cols, now) if use_numpy else _dates_python(cols, now)
+    out = []
+    for i, g in enumerate(data["goals"]):
+        tgt, cur = cols["target"][i], cols["current"][i]
+        forecasts = {m: dates[m][i] for m in MODELS}
+        # Most specific model with a rate: scheduled plans, then recent velocity, then lifetime average
+        model = next((m for m in ("plan", "velocity", "linear") if forecasts[m]), None)
+        deadline = parse_dt(g.get("deadline"), None) if g.get("deadline") else None
+        on_track = None
+        if deadline is not None:
+            on_track = cur >= tgt > 0 or (model is not None and forecasts[model] <= deadline.date().isoformat())
+        out.append({
+            "id": g.get("id"),
+            "name": g.get("name"),
+            "target_amount": round(tgt, 2),
+            "current_amount": round(cur, 2),
+            "progress_pct": round((cur / tgt * 100.0) if tgt > 0 else 0, 2),
+            "forecast_date": forecasts["linear"],
+            "status": g.get("status"),
+            "forecasts": forecasts,
+            "daily_rates": {m: round(cols[m][i], 4) for m in MODELS},
+            "forecast_model": model,
+            "deadline": deadline.date().isoformat() if deadline else None,
+            "on_track": on_track,
+        })
+    return out
@@ -1,94 +1,127 @@
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 import uuid
 from typing import Dict, List
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
 from pymongo.client_session import ClientSession
-from .mongo import get_client, get_db
+from . import badges
+from .mongo import get_db, run_in_transaction
+
+
+XP_PER_LEVEL = 100
 
 
 def compute_level_from_xp(xp: int) -> int:
     """Simple leveling curve: level = floor(xp/100) or min 1."""
     if xp is None or xp < 0:
         xp = 0
-    lvl = xp // 100
+    lvl = xp // XP_PER_LEVEL
     return max(1, int(lvl))
 
 
+# compute_level_from_xp as an aggregation expression over the document's own xp
+LEVEL_EXPR = {
+    "$max": [1, {"$toInt": {"$floor": {"$divide": [{"$max": [{"$ifNull": ["$xp", 0]}, 0]}, XP_PER_LEVEL]}}}]
+}
+
+
 def _utcnow():
     return datetime.now(timezone.utc)
 
 
-def update_profile_xp(user_id: str, xp_delta: int, session: ClientSession | None = None) -> Dict:
-    """Update profile xp/level. Create profile document if missing. Returns changes."""
-    db = get_db()
-    profiles = db["profiles"]
+# Counters kept under profile["stats"] for badge rules; write paths adjust them with $inc
+PROFILE_COUNTERS = ("tx_count", "goal_count", "total_saved")
+
 
+def _profile_defaults(now: datetime) -> Dict:
+    return {"id": str(uuid.uuid4()), "xp": 0, "level": 1, "badges": [], "created_at": now, "is_deleted": False}
+
+
+def _apply_xp(user_id: str, xp_delta: int, session: ClientSession | None = None, counters: Dict | None = None) -> Dict:
+    """Upsert the profile, add xp, recompute level, advance the daily streak and apply
+    counter deltas in one pipeline update. Returns the updated profile."""
     now = _utcnow()
-    # Upsert profile and increment xp
-    result = profiles.find_one_and_update(
+    today = now.date().isoformat()
+    yesterday = (now - timedelta(days=1)).date().isoformat()
+    fields = {
+        **{k: {"$ifNull": [f"${k}", v]} for k, v in _profile_defaults(now).items() if k not in ("xp", "level")},
+        "xp": {"$add": [{"$ifNull": ["$xp", 0]}, int(xp_delta)]},
+        "updated_at": now,
+        # Consecutive UTC days with at least one award
+        "stats.streak_days": {"$switch": {
+            "branches": [
+                {"case": {"$eq": ["$stats.last_active_day", today]}, "then": {"$ifNull": ["$stats.streak_days", 1]}},
+                {"case": {"$eq": ["$stats.last_active_day", yesterday]}, "then": {"$add": [{"$ifNull": ["$stats.streak_days", 0]}, 1]}},
+            ],
+            "default": 1,
+        }},
+        "stats.last_active_day": today,
+    }
+    for name, delta in (counters or {}).items():
+        fields[f"stats.{name}"] = {"$add": [{"$ifNull": [f"$stats.{name}", 0]}, delta]}
+    return get_db()["profiles"].find_one_and_update(
         {"user_id": user_id, "is_deleted": {"$ne": True}},
-        {
-            "$setOnInsert": {
-                "id": str(uuid.uuid4()),
-                "user_id": user_id,
-                "xp": 0,
-                "level": 1,
-                "badges": [],
-                "created_at": now,
-                "is_deleted": False,
-            },
-            "$inc": {"xp": xp_delta},
-            "$set": {"updated_at": now},
-        },
+        [{"$set": fields}, {"$set": {"level": LEVEL_EXPR}}],
+        projection={"_id": 0, "id": 1, "xp": 1, "level": 1, "badges": 1, "stats": 1},
         upsert=True,
-        return_document=True,
+        return_document=ReturnDocument.AFTER,
         session=session,
     )
 
-    # Recompute level
-    new_xp = int(result.get("xp", 0))
-    new_level = compute_level_from_xp(new_xp)
-    if new_level != result.get("level"):
-        profiles.update_one({"id": result["id"]}, {"$set": {"level": new_level, "updated_at": now}}, session=session)
 
-    return {"xp_awarded": xp_delta, "new_level": new_level}
+def update_profile_xp(user_id: str, xp_delta: int, session: ClientSession | None = None) -> Dict:
+    """Update profile xp/level. Create profile document if missing. Returns changes."""
+    profile = _apply_xp(user_id, xp_delta, session=session)
+    return {"xp_awarded": xp_delta, "new_level": int(profile.get("level") or 1)}
 
 
-def check_and_award_badges(user_id: str, session: ClientSession | None = None) -> List[Dict]:
-    """Inspect xp_log, transactions, goals and award badges if criteria met.
-    Badges are stored as array of {code, awarded_at} with unique code per profile.
-    Returns list of newly awarded badges.
-    """
-    db = get_db()
-    profiles = db["profiles"]
-    xp_log = db["xp_log"]
-    transactions = db["transactions"]
-    goals = db["goals"]
+def _counter_update(user_id: str, counters: Dict, now: datetime):
+    inc = {f"stats.{k}": v for k, v in (counters or {}).items() if v}
+    if not inc:
+        return None
+    return (
+        {"user_id": user_id, "is_deleted": {"$ne": True}},
+        {"$inc": inc, "$set": {"updated_at": now}, "$setOnInsert": _profile_defaults(now)},
+    )
 
-    now = _utcnow()
 
-    profile = profiles.find_one({"user_id": user_id, "is_deleted": {"$ne": True}}, session=session) or {}
-    current_badges = {b.get("code") for b in profile.get("badges", []) if isinstance(b, dict)}
-    new_badges: List[Dict] = []
+def increment_profile_counters(user_id: str, counters: Dict, session: ClientSession | None = None) -> None:
+    """$inc badge counters on the user's profile (creating it if missing). Zero deltas are dropped."""
+    update = _counter_update(user_id, counters, _utcnow())
+    if update is None:
+        return
+    get_db()["profiles"].update_one(*update, upsert=True, session=session)
 
-    # Example rules
-    # 1) First Transaction
-    if "first_tx" not in current_badges:
-        if transactions.count_documents({"user_id": user_id, "is_deleted": {"$ne": True}}, session=session) > 0:
-            new_badges.append({"code": "first_tx", "awarded_at": now.isoformat()})
 
-    # 2) First Goal Created
-    if "first_goal" not in current_badges:
-        if goals.count_documents({"user_id": user_id, "is_deleted": {"$ne": True}}, session=session) > 0:
-            new_badges.append({"code": "first_goal", "awarded_at": now.isoformat()})
+def increment_profile_counters_many(deltas: Dict[str, Dict], session: ClientSession | None = None) -> None:
+    """increment_profile_counters for many users ({user_id: counters}) in one bulk_write."""
+    now = _utcnow()
+    updates = (_counter_update(uid, c, now) for uid, c in deltas.items())
+    ops = [UpdateOne(*u, upsert=True) for u in updates if u is not None]
+    if ops:
+        get_db()["profiles"].bulk_write(ops, ordered=False, session=session)
 
-    # 3) Level 5 Achieved
-    level = int(profile.get("level") or 1)
-    if level >= 5 and "level_5" not in current_badges:
-        new_badges.append({"code": "level_5", "awarded_at": now.isoformat()})
+
+def check_and_award_badges(user_id: str, session: ClientSession | None = None, profile: Dict | None = None) -> List[Dict]:
+    """Evaluate the badge registry (core.badges) against the profile's level and counters.
+    Badges are stored as array of {code, awarded_at} with unique code per profile.
+    Pass ``profile`` (as returned by the xp update) to skip re-reading it.
+    Returns list of newly awarded badges.
+    """
+    profiles = get_db()["profiles"]
+    now = _utcnow()
+
+    if profile is None:
+        profile = profiles.find_one(
+            {"user_id": user_id, "is_deleted": {"$ne": True}}, {"_id": 0, "level": 1, "badges": 1, "stats": 1}, session=session
+        ) or {}
+    new_badges = [{"code": r.code, "awarded_at": now.isoformat()} for r in badges.evaluate(profile)]
 
     if new_badges:
+        codes = [b["code"] for b in new_badges]
+        # Guard on the codes so a concurrent award cannot push the same badge twice
         profiles.update_one(
-            {"user_id": user_id},
+            {"user_id": user_id, "is_deleted": {"$ne": True}, "badges.code": {"$nin": codes}},
             {"$push": {"badges": {"$each": new_badges}}, "$set": {"updated_at": now}},
             session=session,
         )
@@ -96,58 +129,84 @@ def check_and_award_badges(user_id: str, session: ClientSession | None = None) -
     return new_badges
 
 
-def award_xp(user_id: str, reason: str, xp_amount: int) -> Dict:
-    """Atomically append to xp_log and update profile xp/level. Returns summary with new badges."""
-    client = get_client()
-    db = get_db()
-    xp_log_coll = db["xp_log"]
-
-    # Fallback if transactions are not supported on the cluster
-    try:
-        with client.start_session() as session:
-            def txn(s: ClientSession):
-                now = _utcnow()
-                # Insert xp log
-                xp_log_coll.insert_one(
-                    {
-                        "id": str(uuid.uuid4()),
-                        "user_id": user_id,
-                        "xp_delta": int(xp_amount),
-                        "reason": reason,
-                        "related_entity_type": None,
-                        "related_entity_id": None,
-                        "created_at": now,
-                        "updated_at": now,
-                        "is_deleted": False,
-                    },
-                    session=s,
-                )
-                # Update profile xp/level
-                changes = update_profile_xp(user_id, int(xp_amount), session=s)
-                # Check badges after xp update
-                new_badges = check_and_award_badges(user_id, session=s)
-                changes["new_badges"] = new_badges
-                return changes
-
-            result = session.with_transaction(txn)
-            return result or {"xp_awarded": xp_amount, "new_level": None, "new_badges": []}
-    except Exception:
-        # Non-transactional fallback
-        now = _utcnow()
-        xp_log_coll.insert_one(
-            {
-                "id": str(uuid.uuid4()),
-                "user_id": user_id,
-                "xp_delta": int(xp_amount),
-                "reason": reason,
-                "related_entity_type": None,
-                "related_entity_id": None,
-                "created_at": now,
-                "updated_at": now,
-                "is_deleted": False,
-            }
-        )
-        changes = update_profile_xp(user_id, int(xp_amount))
-        new_badges = check_and_award_badges(user_id)
-        changes["new_badges"] = new_badges
-        return changes
+def _xp_log_doc(user_id: str, reason: str, xp_amount: int, event_id: str | None = None) -> Dict:
+    now = _utcnow()
+    doc = {
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "xp_delta": int(xp_amount),
+        "reason": reason,
+        "related_entity_type": None,
+        "related_entity_id": None,
+        "created_at": now,
+        "updated_at": now,
+        "is_deleted": False,
+    }
+    if event_id:
+        # Unique (partial) index on xp_log.event_id makes outbox replays no-ops
+        doc["event_id"] = event_id
+    return doc
+
+
+def _award(user_id: str, reason: str, xp_amount: int, session: ClientSession | None = None, counters: Dict | None = None) -> Dict:
+    """xp_log insert + one profile update, plus a badge push only when a rule newly passes."""
+    get_db()["xp_log"].insert_one(_xp_log_doc(user_id, reason, xp_amount), session=session)
+    profile = _apply_xp(user_id, int(xp_amount), session=session, counters=counters)
+    new_badges = check_and_award_badges(user_id, session=session, profile=profile)
+    return {"xp_awarded": xp_amount, "new_level": int(profile.get("level") or 1), "new_badges": new_badges}
+
+
+def award_xp(user_id: str, reason: str, xp_amount: int, counters: Dict | None = None) -> Dict:
+    """Atomically append to xp_log and update profile xp/level (plus any badge counter
+    deltas, see PROFILE_COUNTERS). Returns summary with new badges."""
+    # Only a server without transactions runs it unwrapped; any other error propagates
+    # rather than re-applying xp and counters that a failed commit may already have written
+    result = run_in_transaction(lambda s: _award(user_id, reason, xp_amount, session=s, counters=counters))
+    return result or {"xp_awarded": xp_amount, "new_level": None, "new_badges": []}
+
+
+def _duplicates_only(exc: BulkWriteError) -> bool:
+    errors = exc.details.get("writeErrors", [])
+    return bool(errors) and all(w.get("code") == 11000 for w in errors)
+
+
+def _award_events(user_id: str, events: List[Dict], session: ClientSession | None = None) -> Dict:
+    xp_log = get_db()["xp_log"]
+    ids = [e["id"] for e in events]
+    done = {d["event_id"] for d in xp_log.find({"event_id": {"$in": ids}}, {"_id": 0, "event_id": 1}, session=session)}
+    fresh = [e for e in events if e["id"] not in done]
+    if fresh:
+        logs = [_xp_log_doc(user_id, e.get("reason") or "add_transaction", int(e.get("xp_amount") or 0), event_id=e["id"]) for e in fresh]
+        try:
+            xp_log.insert_many(logs, ordered=False, session=session)
+        except BulkWriteError as exc:
+            # Inside a transaction the server has already aborted it, so nothing more can be
+            # written here; award_xp_events starts over instead
+            if session is not None or not _duplicates_only(exc):
+                raise
+            # Another worker applied some of these in the meantime; only count our inserts
+            dupes = {logs[w["index"]]["event_id"] for w in exc.details["writeErrors"]}
+            fresh = [e for e in fresh if e["id"] not in dupes]
+    if not fresh:
+        return {"xp_awarded": 0, "new_level": None, "new_badges": [], "applied": 0}
+    xp_total = sum(int(e.get("xp_amount") or 0) for e in fresh)
+    counters: Dict = {}
+    for e in fresh:
+        for k, v in (e.get("counters") or {}).items():
+            counters[k] = counters.get(k, 0) + v
+    profile = _apply_xp(user_id, xp_total, session=session, counters=counters)
+    new_badges = check_and_award_badges(user_id, session=session, profile=profile)
+    return {"xp_awarded": xp_total, "new_level": int(profile.get("level") or 1), "new_badges": new_badges, "applied": len(fresh)}
+
+
+def award_xp_events(user_id: str, events: List[Dict], attempts: int = 3) -> Dict:
+    """Apply a batch of queued award events for one user with a single profile update.
+    Each event is logged under its id, so events that were already applied are skipped."""
+    for attempt in range(attempts):
+        try:
+            return run_in_transaction(lambda s: _award_events(user_id, events, session=s))
+        except BulkWriteError as exc:
+            # Another worker logged some of these events after our read and the duplicate
+            # key aborted the transaction; the next attempt reads them and skips them
+            if attempt == attempts - 1 or not _duplicates_only(exc):
+                raise
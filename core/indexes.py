@@ -0,0 +1,214 @@
+"""Mongo index declarations (mirroring schema.sql) and the query shapes they must serve.
+
+``INDEXES`` is applied by ``manage.py ensure_indexes``; ``query_shapes()`` lists the
+filters/sorts the views actually issue so ``ensure_indexes --check`` can explain()
+each one and flag any that would fall back to a collection scan.
+"""
+from datetime import datetime, timezone
+from django.conf import settings
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+_LIVE = {"is_deleted": False}
+
+INDEXES = {
+    "users": [
+        IndexModel([("id", ASCENDING)], name="uniq_users_id", unique=True),
+        IndexModel([("email", ASCENDING)], name="idx_users_email"),
+        # One live account per email; soft-deleted accounts may share it
+        IndexModel(
+            [("email", ASCENDING), ("is_deleted", ASCENDING)],
+            name="uniq_users_email_live",
+            unique=True,
+            partialFilterExpression=_LIVE,
+        ),
+    ],
+    "profiles": [
+        IndexModel([("id", ASCENDING)], name="uniq_profiles_id", unique=True),
+        IndexModel([("user_id", ASCENDING)], name="idx_profiles_user_id"),
+        IndexModel(
+            [("user_id", ASCENDING), ("is_deleted", ASCENDING)],
+            name="uniq_profiles_user_live",
+            unique=True,
+            partialFilterExpression=_LIVE,
+        ),
+    ],
+    "transactions": [
+        IndexModel([("id", ASCENDING)], name="uniq_transactions_id", unique=True),
+        IndexModel(
+            [("user_id", ASCENDING), ("occurred_at", DESCENDING), ("id", DESCENDING)],
+            name="idx_transactions_user_occurred_at",
+        ),
+        IndexModel([("user_id", ASCENDING), ("category", ASCENDING)], name="idx_transactions_user_category"),
+        IndexModel([("created_at", DESCENDING)], name="idx_transactions_created_at"),
+        # Statement imports: a row already imported for the user is a duplicate-key error
+        IndexModel(
+            [("user_id", ASCENDING), ("content_hash", ASCENDING)],
+            name="uniq_transactions_user_content_hash",
+            unique=True,
+            partialFilterExpression={"content_hash": {"$type": "string"}},
+        ),
+        # Recurring runs: one transaction per rule occurrence, so a replayed batch cannot fire twice
+        IndexModel(
+            [("rule_id", ASCENDING), ("occurrence", ASCENDING)],
+            name="uniq_transactions_rule_occurrence",
+            unique=True,
+            partialFilterExpression={"rule_id": {"$type": "string"}},
+        ),
+    ],
+    "goals": [
+        IndexModel([("id", ASCENDING)], name="uniq_goals_id", unique=True),
+        IndexModel([("user_id", ASCENDING), ("status", ASCENDING)], name="idx_goals_user_status"),
+        IndexModel([("user_id", ASCENDING), ("updated_at", DESCENDING), ("id", DESCENDING)], name="idx_goals_user_updated_at"),
+        IndexModel([("deadline", ASCENDING)], name="idx_goals_deadline"),
+    ],
+    "xp_log": [
+        IndexModel([("id", ASCENDING)], name="uniq_xp_log_id", unique=True),
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="idx_xp_log_user_created_at"),
+        IndexModel([("reason", ASCENDING)], name="idx_xp_log_reason"),
+        # Outbox idempotency: an award event can be logged at most once
+        IndexModel(
+            [("event_id", ASCENDING)],
+            name="uniq_xp_log_event_id",
+            unique=True,
+            partialFilterExpression={"event_id": {"$type": "string"}},
+        ),
+    ],
+    "recurring_rules": [
+        IndexModel([("id", ASCENDING)], name="uniq_recurring_rules_id", unique=True),
+        IndexModel([("user_id", ASCENDING), ("created_at", ASCENDING)], name="idx_recurring_rules_user_created_at"),
+        # run-due only ever looks at active rules
+        IndexModel(
+            [("user_id", ASCENDING), ("next_run", ASCENDING)],
+            name="idx_recurring_rules_user_next_run_active",
+            partialFilterExpression={"active": True},
+        ),
+        # run_scheduler: due rules across all users
+        IndexModel([("next_run", ASCENDING)], name="idx_recurring_rules_next_run_active", partialFilterExpression={"active": True}),
+    ],
+    "savings_plans": [
+        IndexModel([("id", ASCENDING)], name="uniq_savings_plans_id", unique=True),
+        IndexModel([("user_id", ASCENDING), ("created_at", ASCENDING)], name="idx_savings_plans_user_created_at"),
+        IndexModel(
+            [("user_id", ASCENDING), ("next_run", ASCENDING)],
+            name="idx_savings_plans_user_next_run_active",
+            partialFilterExpression={"active": True},
+        ),
+        IndexModel([("next_run", ASCENDING)], name="idx_savings_plans_next_run_active", partialFilterExpression={"active": True}),
+        IndexModel([("goal_id", ASCENDING)], name="idx_savings_plans_goal_id"),
+    ],
+    # Savings audit trail; one contribution per plan occurrence makes replays no-ops
+    "savings_contributions": [
+        IndexModel([("id", ASCENDING)], name="uniq_savings_contributions_id", unique=True),
+        IndexModel(
+            [("plan_id", ASCENDING), ("scheduled_for", ASCENDING)],
+            name="uniq_savings_contributions_plan_scheduled_for",
+            unique=True,
+        ),
+        IndexModel([("user_id", ASCENDING), ("goal_id", ASCENDING), ("created_at", DESCENDING)], name="idx_savings_contributions_user_goal"),
+        # goal-progress velocity window
+        IndexModel([("user_id", ASCENDING), ("scheduled_for", DESCENDING)], name="idx_savings_contributions_user_scheduled_for"),
+    ],
+    "data_versions": [
+        IndexModel([("user_id", ASCENDING)], name="uniq_data_versions_user_id", unique=True),
+    ],
+    "outbox": [
+        IndexModel([("id", ASCENDING)], name="uniq_outbox_id", unique=True),
+        IndexModel([("status", ASCENDING), ("available_at", ASCENDING)], name="idx_outbox_status_available_at"),
+        IndexModel([("status", ASCENDING), ("lease_until", ASCENDING)], name="idx_outbox_status_lease_until"),
+        IndexModel(
+            [("processed_at", ASCENDING)],
+            name="ttl_outbox_processed_at",
+            expireAfterSeconds=int(getattr(settings, "OUTBOX_RETENTION_SECONDS", 7 * 24 * 3600)),
+            partialFilterExpression={"status": "done"},
+        ),
+    ],
+    "monthly_rollups": [
+        IndexModel(
+            [("user_id", ASCENDING), ("month", ASCENDING), ("category", ASCENDING), ("type", ASCENDING)],
+            name="uniq_monthly_rollups_key",
+            unique=True,
+        ),
+    ],
+}
+
+
+def query_shapes(user_id: str = "00000000-0000-0000-0000-000000000000", entity_id: str = "00000000-0000-0000-0000-000000000000"):
+    """(label, collection, filter, sort) for every query the views and workers issue.
+
+    Keep in step with the query sites: a shape listed here that nothing issues hides a
+    missing one from ``ensure_indexes --check``."""
+    now = datetime.now(timezone.utc)
+    not_deleted = {"$ne": True}
+    month = {"$gte": datetime(now.year, now.month, 1, tzinfo=timezone.utc), "$lt": now}
+    return [
+        ("auth.middleware user lookup", "users", {"id": user_id, "is_deleted": not_deleted}, None),
+        ("auth.login", "users", {"email": "someone@example.com", "is_deleted": not_deleted}, None),
+        ("auth.me_profile", "profiles", {"user_id": user_id, "is_deleted": not_deleted}, None),
+        ("profiles.list", "profiles", {"is_deleted": False, "user_id": user_id}, [("updated_at", -1), ("id", -1)]),
+        ("transactions.list", "transactions", {"is_deleted": False, "user_id": user_id}, [("occurred_at", -1), ("id", -1)]),
+        ("transactions.export", "transactions", {"user_id": user_id, "is_deleted": not_deleted, "occurred_at": month}, [("occurred_at", 1), ("id", 1)]),
+        ("transactions.retrieve", "transactions", {"id": entity_id, "is_deleted": False}, None),
+        ("goals.list", "goals", {"is_deleted": False, "user_id": user_id}, [("updated_at", -1), ("id", -1)]),
+        ("goals.retrieve", "goals", {"id": entity_id, "is_deleted": False}, None),
+        ("xp_log.list", "xp_log", {"is_deleted": False, "user_id": user_id}, [("created_at", -1), ("id", -1)]),
+        ("analytics.spend_by_category", "transactions", {"user_id": user_id, "is_deleted": not_deleted, "occurred_at": month}, None),
+        ("analytics.income_vs_expense", "transactions", {"user_id": user_id, "is_deleted": not_deleted, "occurred_at": month}, None),
+        ("analytics.rollups", "monthly_rollups", {"user_id": user_id, "month": {"$in": [now.strftime("%Y-%m")]}}, None),
+        ("analytics.goal_progress", "goals", {"user_id": user_id, "is_deleted": not_deleted}, None),
+        ("analytics.goal_progress plans", "savings_plans", {"user_id": user_id, "is_deleted": not_deleted, "active": True}, None),
+        ("analytics.goal_progress velocity", "savings_contributions", {"user_id": user_id, "applied": True, "scheduled_for": {"$gte": now}}, None),
+        ("gamelogic.badges push", "profiles", {"user_id": user_id, "is_deleted": not_deleted, "badges.code": {"$nin": ["first_tx"]}}, None),
+        ("recurring.list", "recurring_rules", {"user_id": user_id, "is_deleted": not_deleted}, None),
+        ("recurring.run_now", "recurring_rules", {"id": entity_id, "user_id": user_id, "is_deleted": not_deleted}, None),
+        ("recurring.run_due", "recurring_rules", {"user_id": user_id, "is_deleted": not_deleted, "active": True, "next_run": {"$lte": now}}, None),
+        ("savings.list", "savings_plans", {"user_id": user_id, "is_deleted": not_deleted}, None),
+        ("savings.run_now", "savings_plans", {"id": entity_id, "user_id": user_id, "is_deleted": not_deleted}, None),
+        ("savings.run_due", "savings_plans", {"user_id": user_id, "is_deleted": not_deleted, "active": True, "next_run": {"$lte": now}}, None),
+        ("savings.increment_goal", "goals", {"id": entity_id, "user_id": user_id, "is_deleted": not_deleted}, None),
+        ("savings.contributions replay check", "savings_contributions", {"plan_id": {"$in": [entity_id]}, "scheduled_for": {"$in": [now]}}, None),
+        ("scheduler.claim recurring", "recurring_rules", {"active": True, "is_deleted": not_deleted, "next_run": {"$lte": now}, "lease_until": {"$not": {"$gt": now}}}, [("next_run", 1)]),
+        ("scheduler.claim savings", "savings_plans", {"active": True, "is_deleted": not_deleted, "next_run": {"$lte": now}, "lease_until": {"$not": {"$gt": now}}}, [("next_run", 1)]),
+        ("scheduler.claim recurring (run_due)", "recurring_rules", {"active": True, "is_deleted": not_deleted, "next_run": {"$lte": now}, "lease_until": {"$not": {"$gt": now}}, "user_id": user_id, "id": {"$nin": [entity_id]}}, [("next_run", 1)]),
+        ("scheduler.claim savings (run_due)", "savings_plans", {"active": True, "is_deleted": not_deleted, "next_run": {"$lte": now}, "lease_until": {"$not": {"$gt": now}}, "user_id": user_id, "id": {"$nin": [entity_id]}}, [("next_run", 1)]),
+        ("scheduler.claimed", "recurring_rules", {"id": {"$in": [entity_id]}, "lease_owner": "worker"}, None),
+        ("scheduler.rule replay check", "transactions", {"rule_id": {"$in": [entity_id]}, "occurrence": {"$in": [now]}}, None),
+        ("scheduler.savings goals", "goals", {"id": {"$in": [entity_id]}, "is_deleted": not_deleted}, None),
+        ("outbox.claim", "outbox", {"$or": [
+            {"status": "pending", "available_at": {"$lte": now}},
+            {"status": "processing", "lease_until": {"$lt": now}},
+        ]}, [("available_at", 1)]),
+        ("outbox.claimed", "outbox", {"id": {"$in": [entity_id]}, "lease_owner": "worker", "status": "processing"}, None),
+        ("gamelogic.award_events", "xp_log", {"event_id": {"$in": [entity_id]}}, None),
+        ("dataversion.current", "data_versions", {"user_id": user_id}, None),
+        ("dataversion.bump_many", "data_versions", {"user_id": {"$in": [user_id]}}, None),
+        ("rollups.user_rollups", "transactions", {"user_id": user_id, "is_deleted": not_deleted}, None),
+        ("rebuild_rollups.actual", "monthly_rollups", {"user_id": user_id, "count": {"$ne": 0}}, None),
+    ]
+
+
+def unique_conflicts(db, collection: str, model: IndexModel, limit: int = 20) -> list:
+    """Key values that more than one document shares under a unique ``model``, i.e. what
+    would make creating it fail. Each item is ``{"key": {...}, "count": n, "ids": [...]}``."""
+    spec = model.document
+    fields = list(spec["key"].keys())
+    pipeline = [
+        {"$match": spec.get("partialFilterExpression", {})},
+        {"$group": {"_id": {f: f"${f}" for f in fields}, "count": {"$sum": 1}, "ids": {"$push": "$id"}}},
+        {"$match": {"count": {"$gt": 1}}},
+        {"$limit": limit},
+    ]
+    return [{"key": row["_id"], "count": row["count"], "ids": row["ids"]} for row in db[collection].aggregate(pipeline, allowDiskUse=True)]
+
+
+def plan_stages(plan) -> set:
+    """All stage names appearing anywhere in an explain() plan tree."""
+    stages = set()
+    if isinstance(plan, dict):
+        if isinstance(plan.get("stage"), str):
+            stages.add(plan["stage"])
+        for v in plan.values():
+            stages |= plan_stages(v)
+    elif isinstance(plan, list):
+        for v in plan:
+            stages |= plan_stages(v)
+    return stages
@@ -0,0 +1,87 @@
+from datetime import date, datetime, timedelta, timezone
+from django.core.management.base import BaseCommand
+from pymongo import UpdateOne
+from core.gamelogic import _profile_defaults, check_and_award_badges
+from core.mongo import get_db
+
+
+def _streak(days: list) -> tuple:
+    """(streak length ending at the latest day, latest day) for sorted-desc ISO dates."""
+    if not days:
+        return 0, None
+    streak, prev = 1, date.fromisoformat(days[0])
+    for d in days[1:]:
+        cur = date.fromisoformat(d)
+        if prev - cur != timedelta(days=1):
+            break
+        streak, prev = streak + 1, cur
+    return streak, days[0]
+
+
+class Command(BaseCommand):
+    help = "Recompute profile badge counters (tx_count, goal_count, total_saved, streak) from raw data."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=str, default=None, help="Only this user_id")
+        parser.add_argument("--award-badges", action="store_true", help="Evaluate badge rules after writing counters")
+        parser.add_argument("--batch", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        db = get_db()
+        live = {"is_deleted": {"$ne": True}}
+        if options["user"]:
+            live["user_id"] = options["user"]
+
+        stats = {}
+
+        def slot(uid):
+            return stats.setdefault(uid, {"tx_count": 0, "goal_count": 0, "total_saved": 0.0})
+
+        for row in db["transactions"].aggregate(
+            [{"$match": live}, {"$group": {"_id": "$user_id", "n": {"$sum": 1}}}], allowDiskUse=True
+        ):
+            slot(row["_id"])["tx_count"] = row["n"]
+        for row in db["goals"].aggregate([
+            {"$match": live},
+            {"$group": {
+                "_id": "$user_id",
+                "n": {"$sum": 1},
+                "saved": {"$sum": {"$convert": {"input": "$current_amount", "to": "double", "onError": 0.0, "onNull": 0.0}}},
+            }},
+        ], allowDiskUse=True):
+            s = slot(row["_id"])
+            s["goal_count"], s["total_saved"] = row["n"], row["saved"]
+        for row in db["xp_log"].aggregate([
+            {"$match": {**live, "created_at": {"$type": "date"}}},
+            {"$group": {"_id": "$user_id", "days": {"$addToSet": {"$dateToString": {"date": "$created_at", "format": "%Y-%m-%d", "timezone": "UTC"}}}}},
+        ], allowDiskUse=True):
+            s = slot(row["_id"])
+            s["streak_days"], s["last_active_day"] = _streak(sorted(row["days"], reverse=True))
+
+        now = datetime.now(timezone.utc)
+        ops, written = [], 0
+        for uid, s in stats.items():
+            if not uid:
+                continue
+            defaults = _profile_defaults(now)
+            ops.append(UpdateOne(
+                {"user_id": uid, "is_deleted": {"$ne": True}},
+                {"$set": {**{f"stats.{k}": v for k, v in s.items()}, "updated_at": now}, "$setOnInsert": defaults},
+                upsert=True,
+            ))
+            if len(ops) >= options["batch"]:
+                db["profiles"].bulk_write(ops, ordered=False)
+                written += len(ops)
+                ops = []
+        if ops:
+            db["profiles"].bulk_write(ops, ordered=False)
+            written += len(ops)
+        self.stdout.write(f"Updated counters on {written} profile(s).")
+
+        if options["award_badges"]:
+            awarded = 0
+            for uid in stats:
+                if uid:
+                    awarded += len(check_and_award_badges(uid))
+            self.stdout.write(f"Awarded {awarded} badge(s).")
+        self.stdout.write(self.style.SUCCESS("Backfill complete."))
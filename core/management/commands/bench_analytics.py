@@ -0,0 +1,129 @@
+import random
+import statistics
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from django.core.management.base import BaseCommand, CommandError
+from core.analytics_views import _income_expense_data, _month_range_utc, _spend_by_category_data
+from core import rollups
+from core.rollups import is_income_category
+from core.mongo import get_db
+
+CATEGORIES = ["Food", " Food ", "Transport", "Utilities", "Shopping", "Health", "Entertainment", "", None, "Salary"]
+
+
+def _legacy_spend_by_category(db, user_id, start, end):
+    """The pre-aggregation implementation: ship every document and sum in Python."""
+    filt = {"user_id": user_id, "is_deleted": {"$ne": True}, "occurred_at": {"$gte": start, "$lt": end}}
+    totals = defaultdict(float)
+    for t in db["transactions"].find(filt, {"category": 1, "amount": 1}):
+        cat = (t.get("category") or "Uncategorized").strip() or "Uncategorized"
+        try:
+            amt = float(t.get("amount") or 0)
+        except Exception:
+            amt = 0
+        totals[cat] += amt
+    return [{"category": k, "total": round(v, 2)} for k, v in sorted(totals.items(), key=lambda x: -x[1])]
+
+
+def _legacy_income_vs_expense(db, user_id, start, end):
+    filt = {"user_id": user_id, "is_deleted": {"$ne": True}, "occurred_at": {"$gte": start, "$lt": end}}
+    income = 0.0
+    expense = 0.0
+    for t in db["transactions"].find(filt, {"category": 1, "amount": 1, "type": 1}):
+        try:
+            amt = float(t.get("amount") or 0)
+        except Exception:
+            amt = 0
+        tx_type = (t.get("type") or "").lower()
+        cat = t.get("category") or ""
+        if tx_type == "income" or (not tx_type and is_income_category(cat)):
+            income += amt
+        else:
+            expense += amt
+    return {"income": round(income, 2), "expense": round(expense, 2)}
+
+
+def _pipeline_income_vs_expense(db, user_id, start, end):
+    r = _income_expense_data(db, user_id, start, end)
+    return {"income": round(r["income"], 2), "expense": round(r["expense"], 2)}
+
+
+def _rollup_income_vs_expense(db, user_id, months):
+    r = rollups.income_expense(db, user_id, months)
+    return {"income": round(r["income"], 2), "expense": round(r["expense"], 2)}
+
+
+class Command(BaseCommand):
+    help = "Benchmark analytics endpoints (Python loop vs Mongo aggregation vs monthly rollups) for a synthetic user at several transaction counts."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=str, default="1000,100000,1000000", help="Comma-separated transactions-per-user counts")
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--batch", type=int, default=10000)
+
+    def _seed(self, db, user_id, n, start, batch):
+        span = 27 * 24 * 3600
+        docs = []
+        now = datetime.now(timezone.utc)
+        for i in range(n):
+            docs.append({
+                "id": str(uuid.uuid4()),
+                "user_id": user_id,
+                "type": "income" if i % 10 == 0 else "expense",
+                "amount": round(random.uniform(1, 500), 2),
+                "currency": "USD",
+                "category": random.choice(CATEGORIES),
+                "description": None,
+                "occurred_at": start + timedelta(seconds=random.randint(0, span)),
+                "created_at": now,
+                "updated_at": now,
+                "is_deleted": i % 50 == 0,
+            })
+            if len(docs) >= batch:
+                db["transactions"].insert_many(docs, ordered=False)
+                docs = []
+        if docs:
+            db["transactions"].insert_many(docs, ordered=False)
+
+    def _time(self, fn, repeat):
+        samples = []
+        result = None
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            result = fn()
+            samples.append((time.perf_counter() - t0) * 1000.0)
+        return result, statistics.median(samples)
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(x) for x in options["sizes"].split(",") if x.strip()]
+        except ValueError:
+            raise CommandError("--sizes must be comma-separated integers")
+        db = get_db()
+        start, end = _month_range_utc("2024-02")
+        months = rollups.months_between(start, end)
+        self.stdout.write(f"{'rows':>9} {'endpoint':<20} {'python ms':>11} {'pipeline ms':>12} {'rollup ms':>10}  same")
+        for n in sizes:
+            user_id = f"bench-{uuid.uuid4()}"
+            try:
+                self._seed(db, user_id, n, start, options["batch"])
+                expected = list(rollups.expected_rollups(db, user_id))
+                if expected:
+                    db[rollups.COLLECTION].insert_many(expected)
+                cases = [
+                    ("spend_by_category", _legacy_spend_by_category, _spend_by_category_data, rollups.spend_by_category),
+                    ("income_vs_expense", _legacy_income_vs_expense, _pipeline_income_vs_expense, _rollup_income_vs_expense),
+                ]
+                for name, slow_fn, fast_fn, rollup_fn in cases:
+                    legacy, legacy_ms = self._time(lambda: slow_fn(db, user_id, start, end), options["repeat"])
+                    fast, fast_ms = self._time(lambda: fast_fn(db, user_id, start, end), options["repeat"])
+                    rolled, rollup_ms = self._time(lambda: rollup_fn(db, user_id, months), options["repeat"])
+                    self.stdout.write(
+                        f"{n:>9} {name:<20} {legacy_ms:>11.2f} {fast_ms:>12.2f} {rollup_ms:>10.2f}  "
+                        f"{legacy == fast and legacy == rolled}"
+                    )
+            finally:
+                db["transactions"].delete_many({"user_id": user_id})
+                db[rollups.COLLECTION].delete_many({"user_id": user_id})
@@ -0,0 +1,102 @@
+import json
+import socket
+import statistics
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import jwt
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from core.middleware import auth_middleware
+from core.middleware.auth_middleware import CircuitBreaker, ExternalAuthMiddleware
+
+
+class _StubVerifier(BaseHTTPRequestHandler):
+    delay = 0.0
+    user_id = None
+
+    def do_GET(self):
+        if self.delay:
+            time.sleep(self.delay)
+        body = json.dumps({"id": self.user_id, "email": "bench@example.com"}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # Client already gave up (timeout) on the slow stub
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+def _pct(samples, q):
+    ordered = sorted(samples)
+    idx = min(len(ordered) - 1, max(0, int(round(q / 100.0 * len(ordered))) - 1))
+    return ordered[idx]
+
+
+class Command(BaseCommand):
+    help = "Benchmark token verification overhead (p50/p99) against a local stub verifier that is healthy, slow or down."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--slow-delay", type=float, default=1.5, help="Seconds the slow stub waits before answering")
+        parser.add_argument("--timeout", type=float, default=1.0, help="AUTH_VERIFY_TIMEOUT used during the run")
+
+    def _start_stub(self, delay, user_id, port=0):
+        handler = type("Stub", (_StubVerifier,), {"delay": delay, "user_id": user_id})
+        server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server, f"http://127.0.0.1:{server.server_address[1]}/verify"
+
+    def _closed_port_url(self):
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+        sock.close()
+        return f"http://127.0.0.1:{port}/verify"
+
+    def _run(self, url, order, token, n, timeout):
+        auth_middleware.verify_breaker = CircuitBreaker(threshold=5, cooldown=30)
+        mw = ExternalAuthMiddleware(lambda r: None)
+        samples = []
+        with override_settings(AUTH_VERIFY_URL=url, AUTH_VERIFY_ORDER=order, AUTH_VERIFY_TIMEOUT=timeout):
+            for _ in range(n):
+                t0 = time.perf_counter()
+                info = mw._verify_token(token)
+                samples.append((time.perf_counter() - t0) * 1000.0)
+                if not info:
+                    raise RuntimeError("verification failed during benchmark")
+        return samples
+
+    def handle(self, *args, **options):
+        n = max(options["requests"], 1)
+        secret = "bench-secret-" + uuid.uuid4().hex
+        user_id = str(uuid.uuid4())
+        token = jwt.encode({"sub": user_id, "email": "bench@example.com", "exp": int(time.time()) + 3600}, secret, algorithm="HS256")
+
+        healthy, healthy_url = self._start_stub(0.0, user_id)
+        slow, slow_url = self._start_stub(options["slow_delay"], user_id)
+        scenarios = [("healthy", healthy_url), ("slow", slow_url), ("down", self._closed_port_url())]
+        try:
+            self.stdout.write(f"{'verifier':<9} {'order':<16} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+            with override_settings(JWT_SECRET=secret, JWT_ALGORITHM="HS256", JWT_PUBLIC_KEY=""):
+                for name, url in scenarios:
+                    for order in ("external,local", "local,external"):
+                        samples = self._run(url, order, token, n, options["timeout"])
+                        self.stdout.write(
+                            f"{name:<9} {order:<16} {statistics.median(samples):>9.3f} "
+                            f"{_pct(samples, 99):>9.3f} {max(samples):>9.3f}"
+                        )
+        finally:
+            healthy.shutdown()
+            slow.shutdown()
+            auth_middleware.verify_breaker = CircuitBreaker(
+                threshold=auth_middleware.verify_breaker.threshold,
+                cooldown=auth_middleware.verify_breaker.cooldown,
+            )
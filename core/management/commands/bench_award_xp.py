@@ -0,0 +1,117 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pymongo import monitoring
+from django.core.management.base import BaseCommand
+from core import gamelogic
+from core.gamelogic import compute_level_from_xp
+from core.mongo import get_db
+
+# Driver chatter that is not part of an award
+_IGNORED = {"hello", "isMaster", "ismaster", "ping", "endSessions", "saslStart", "saslContinue", "buildInfo", "getMore"}
+
+
+class _CommandCounter(monitoring.CommandListener):
+    def __init__(self):
+        self.local = threading.local()
+
+    def _bump(self, name):
+        if getattr(self.local, "active", False) and name not in _IGNORED:
+            self.local.count = getattr(self.local, "count", 0) + 1
+
+    def started(self, event):
+        self._bump(event.command_name)
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def measure(self, fn):
+        self.local.active, self.local.count = True, 0
+        try:
+            fn()
+            return self.local.count
+        finally:
+            self.local.active = False
+
+
+def _legacy_award(user_id, reason, xp_amount):
+    """The pre-pipeline sequence: log insert, xp upsert, level write-back, profile re-read, two counts, badge push."""
+    db = gamelogic.get_db()
+    now = gamelogic._utcnow()
+    db["xp_log"].insert_one(gamelogic._xp_log_doc(user_id, reason, xp_amount))
+    result = db["profiles"].find_one_and_update(
+        {"user_id": user_id, "is_deleted": {"$ne": True}},
+        {
+            "$setOnInsert": {"id": str(uuid.uuid4()), "user_id": user_id, "level": 1, "badges": [], "created_at": now, "is_deleted": False},
+            "$inc": {"xp": xp_amount},
+            "$set": {"updated_at": now},
+        },
+        upsert=True,
+        return_document=True,
+    )
+    new_level = compute_level_from_xp(int(result.get("xp", 0)))
+    if new_level != result.get("level"):
+        db["profiles"].update_one({"id": result["id"]}, {"$set": {"level": new_level, "updated_at": now}})
+    profile = db["profiles"].find_one({"user_id": user_id, "is_deleted": {"$ne": True}}) or {}
+    badges = {b.get("code") for b in profile.get("badges", []) if isinstance(b, dict)}
+    new_badges = []
+    if "first_tx" not in badges and db["transactions"].count_documents({"user_id": user_id, "is_deleted": {"$ne": True}}) > 0:
+        new_badges.append({"code": "first_tx", "awarded_at": now.isoformat()})
+    if "first_goal" not in badges and db["goals"].count_documents({"user_id": user_id, "is_deleted": {"$ne": True}}) > 0:
+        new_badges.append({"code": "first_goal", "awarded_at": now.isoformat()})
+    if int(profile.get("level") or 1) >= 5 and "level_5" not in badges:
+        new_badges.append({"code": "level_5", "awarded_at": now.isoformat()})
+    if new_badges:
+        db["profiles"].update_one({"user_id": user_id}, {"$push": {"badges": {"$each": new_badges}}, "$set": {"updated_at": now}})
+
+
+class Command(BaseCommand):
+    help = "Report Mongo operations per XP award and awards/sec under concurrency, legacy sequence vs pipeline update."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--awards", type=int, default=2000)
+        parser.add_argument("--threads", type=int, default=16)
+        parser.add_argument("--users", type=int, default=50, help="Distinct users the concurrent awards are spread over")
+
+    def handle(self, *args, **options):
+        counter = _CommandCounter()
+        # Must be registered before core.mongo builds its client
+        monitoring.register(counter)
+        db = get_db()
+        impls = [
+            ("legacy", _legacy_award),
+            ("pipeline", lambda u, r, x: gamelogic._award(u, r, x)),
+            ("award_xp", gamelogic.award_xp),
+        ]
+        users = []
+        try:
+            self.stdout.write(f"{'impl':<10} {'ops/award (first)':>18} {'ops/award (steady)':>19} {'awards/sec':>11} {'xp ok':>6}")
+            for name, fn in impls:
+                probe = f"bench-{uuid.uuid4()}"
+                users.append(probe)
+                first_ops = counter.measure(lambda: fn(probe, "bench", 10))
+                steady_ops = counter.measure(lambda: fn(probe, "bench", 10))
+
+                pool_users = [f"bench-{uuid.uuid4()}" for _ in range(max(options["users"], 1))]
+                users.extend(pool_users)
+                n = max(options["awards"], 1)
+                t0 = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=max(options["threads"], 1)) as ex:
+                    list(ex.map(lambda i: fn(pool_users[i % len(pool_users)], "bench", 10), range(n)))
+                elapsed = time.perf_counter() - t0
+                total_xp = sum(p.get("xp", 0) for p in db["profiles"].find({"user_id": {"$in": pool_users}}, {"xp": 1}))
+                levels_ok = all(
+                    p.get("level") == compute_level_from_xp(p.get("xp", 0))
+                    for p in db["profiles"].find({"user_id": {"$in": pool_users}}, {"xp": 1, "level": 1})
+                )
+                self.stdout.write(
+                    f"{name:<10} {first_ops:>18} {steady_ops:>19} {n / elapsed:>11.1f} "
+                    f"{str(total_xp == n * 10 and levels_ok):>6}"
+                )
+        finally:
+            for coll in ("xp_log", "profiles"):
+                db[coll].delete_many({"user_id": {"$in": users}})
@@ -0,0 +1,74 @@
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from django.core.management.base import BaseCommand
+from rest_framework.test import APIRequestFactory
+from core import outbox, rollups
+from core.mongo import get_db
+from core.views import TransactionViewSet
+
+
+def _payloads(user_id, n):
+    now = datetime.now(timezone.utc)
+    return [
+        {
+            "user_id": user_id,
+            "type": "expense",
+            "amount": f"{random.uniform(1, 200):.2f}",
+            "currency": "USD",
+            "category": random.choice(["Food", "Transport", "Shopping"]),
+            "description": f"bench #{i}",
+            "occurred_at": (now - timedelta(minutes=i)).isoformat(),
+        }
+        for i in range(n)
+    ]
+
+
+class Command(BaseCommand):
+    help = "Benchmark POST /api/transactions/bulk/ against N sequential POST /api/transactions/ creates."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=500)
+
+    def _cleanup(self, db, user_id):
+        for coll in ("transactions", "xp_log", "profiles", rollups.COLLECTION, outbox.COLLECTION):
+            db[coll].delete_many({"user_id": user_id})
+
+    def handle(self, *args, **options):
+        n = max(options["count"], 1)
+        db = get_db()
+        factory = APIRequestFactory()
+        create = TransactionViewSet.as_view({"post": "create"})
+        bulk = TransactionViewSet.as_view({"post": "bulk"})
+
+        seq_user = str(uuid.uuid4())
+        bulk_user = str(uuid.uuid4())
+        try:
+            items = _payloads(seq_user, n)
+            t0 = time.perf_counter()
+            for item in items:
+                resp = create(factory.post("/api/transactions/", item, format="json", HTTP_X_USER_ID=seq_user))
+                if resp.status_code != 201:
+                    raise RuntimeError(f"sequential create failed: {resp.data}")
+            seq_s = time.perf_counter() - t0
+
+            items = _payloads(bulk_user, n)
+            t0 = time.perf_counter()
+            resp = bulk(factory.post("/api/transactions/bulk/", items, format="json", HTTP_X_USER_ID=bulk_user))
+            bulk_s = time.perf_counter() - t0
+            if resp.status_code != 201 or resp.data["errors"]:
+                raise RuntimeError(f"bulk create failed: {resp.data}")
+
+            # XP is applied by the outbox worker when it is enabled
+            if outbox.enabled():
+                outbox.drain()
+            seq_xp = sum(d["xp_delta"] for d in db["xp_log"].find({"user_id": seq_user}))
+            bulk_xp = sum(d["xp_delta"] for d in db["xp_log"].find({"user_id": bulk_user}))
+            self.stdout.write(f"{'mode':<12} {'seconds':>9} {'rows/sec':>10} {'xp':>7}")
+            self.stdout.write(f"{'sequential':<12} {seq_s:>9.3f} {n / seq_s:>10.1f} {seq_xp:>7}")
+            self.stdout.write(f"{'bulk':<12} {bulk_s:>9.3f} {n / bulk_s:>10.1f} {bulk_xp:>7}")
+            self.stdout.write(self.style.SUCCESS(f"bulk speedup: {seq_s / max(bulk_s, 1e-9):.1f}x for {n} transactions"))
+        finally:
+            self._cleanup(db, seq_user)
+            self._cleanup(db, bulk_user)
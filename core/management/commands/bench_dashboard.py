@@ -0,0 +1,95 @@
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from core import dashboard_views, dataversion, rollups
+from core.dashboard_views import LOADERS, SECTIONS, dashboard_summary
+from core.mongo import get_db
+
+
+class Command(BaseCommand):
+    help = "Time each GET /api/dashboard/summary/ section on its own against the whole summary (sections run concurrently) for a synthetic user."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--transactions", type=int, default=100_000)
+        parser.add_argument("--goals", type=int, default=200)
+        parser.add_argument("--rules", type=int, default=50)
+        parser.add_argument("--repeat", type=int, default=10)
+
+    def _seed(self, db, user_id, n, goals, rules, batch=10_000):
+        now = datetime.now(timezone.utc)
+        db["profiles"].insert_one({"id": str(uuid.uuid4()), "user_id": user_id, "xp": 0, "level": 1, "badges": [], "is_deleted": False})
+        for offset in range(0, n, batch):
+            docs = [
+                {
+                    "id": str(uuid.uuid4()), "user_id": user_id, "type": "expense" if i % 5 else "income",
+                    "amount": round(5 + (i % 997) * 0.37, 2), "currency": "USD", "category": f"cat{i % 12}",
+                    "description": None, "occurred_at": now - timedelta(minutes=i % (90 * 24 * 60)),
+                    "created_at": now, "updated_at": now, "is_deleted": False,
+                }
+                for i in range(offset, min(offset + batch, n))
+            ]
+            db["transactions"].insert_many(docs)
+            rollups.apply_changes(db, [(None, d) for d in docs])
+        goal_ids = [str(uuid.uuid4()) for _ in range(goals)]
+        if goal_ids:
+            db["goals"].insert_many([
+                {
+                    "id": gid, "user_id": user_id, "name": f"goal {i}", "target_amount": 1000.0 + i, "current_amount": float(i % 900),
+                    "deadline": now + timedelta(days=30 + i), "status": "active",
+                    "created_at": now - timedelta(days=120), "updated_at": now, "is_deleted": False,
+                }
+                for i, gid in enumerate(goal_ids)
+            ])
+            db["savings_plans"].insert_many([
+                {
+                    "id": str(uuid.uuid4()), "user_id": user_id, "goal_id": gid, "amount_per_interval": 25.0, "interval": "weekly",
+                    "next_run": now + timedelta(days=7), "anchor_day": now.day, "active": True, "created_at": now, "updated_at": now, "is_deleted": False,
+                }
+                for gid in goal_ids
+            ])
+        if rules:
+            db["recurring_rules"].insert_many([
+                {
+                    "id": str(uuid.uuid4()), "user_id": user_id, "name": f"rule {i}", "amount": 9.99, "currency": "USD",
+                    "category": "subscriptions", "description": None, "type": "expense", "cadence": "monthly",
+                    "next_run": now + timedelta(days=i % 28), "anchor_day": now.day, "active": True,
+                    "created_at": now, "updated_at": now, "is_deleted": False,
+                }
+                for i in range(rules)
+            ])
+
+    def handle(self, *args, **options):
+        repeat = max(options["repeat"], 1)
+        db = get_db()
+        user_id = str(uuid.uuid4())
+        request = RequestFactory().get("/api/dashboard/summary/", HTTP_X_USER_ID=user_id)
+        try:
+            self._seed(db, user_id, max(options["transactions"], 0), options["goals"], options["rules"])
+            _, params = dashboard_views.parse(request)
+            self.stdout.write(f"{'section':<18} {'p50 ms':>9}")
+            medians = {}
+            for name in SECTIONS:
+                samples = []
+                for _ in range(repeat):
+                    t0 = time.perf_counter()
+                    LOADERS[name](user_id, None, params)
+                    samples.append((time.perf_counter() - t0) * 1000.0)
+                medians[name] = statistics.median(samples)
+                self.stdout.write(f"{name:<18} {medians[name]:>9.2f}")
+            samples = []
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                response = dashboard_summary(request)
+                samples.append((time.perf_counter() - t0) * 1000.0)
+                if response.status_code != 200 or b'"errors"' in response.content:
+                    raise CommandError(f"summary failed: {response.status_code} {response.content[:200]!r}")
+            self.stdout.write(f"{'sum of sections':<18} {sum(medians.values()):>9.2f}")
+            self.stdout.write(f"{'slowest section':<18} {max(medians.values()):>9.2f}")
+            self.stdout.write(f"{'summary':<18} {statistics.median(samples):>9.2f}")
+        finally:
+            for coll in ("transactions", "goals", "savings_plans", "recurring_rules", "profiles", rollups.COLLECTION, dataversion.COLLECTION):
+                db[coll].delete_many({"user_id": user_id})
+        self.stdout.write(self.style.SUCCESS("done"))
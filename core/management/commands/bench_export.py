@@ -0,0 +1,86 @@
+import os
+import resource
+import time
+import uuid
+import zlib
+from datetime import datetime, timedelta, timezone
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from core.export_views import export_transactions
+from core.mongo import get_db
+
+
+def _rss_mb() -> float:
+    """Current resident set size; falls back to the peak where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Command(BaseCommand):
+    help = "Export N seeded transactions through GET /api/transactions/export/ and check that RSS stays bounded."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1_000_000)
+        parser.add_argument("--formats", default="csv,ndjson")
+        parser.add_argument("--gzip", action="store_true", help="Send Accept-Encoding: gzip")
+        parser.add_argument("--max-rss-mb", type=float, default=64.0, help="Fail if RSS grows more than this during an export")
+
+    def _seed(self, db, user_id, n, batch=10_000):
+        now = datetime.now(timezone.utc)
+        for offset in range(0, n, batch):
+            db["transactions"].insert_many([
+                {
+                    "id": str(uuid.uuid4()), "user_id": user_id, "type": "expense" if i % 5 else "income",
+                    "amount": round(5 + (i % 997) * 0.37, 2), "currency": "USD", "category": f"cat{i % 12}",
+                    "description": f"bench #{i}", "occurred_at": now - timedelta(minutes=i),
+                    "created_at": now, "updated_at": now, "is_deleted": False,
+                }
+                for i in range(offset, min(offset + batch, n))
+            ])
+
+    def _export(self, user_id, fmt, gzip):
+        headers = {"HTTP_X_USER_ID": user_id}
+        if gzip:
+            headers["HTTP_ACCEPT_ENCODING"] = "gzip"
+        response = export_transactions(RequestFactory().get("/api/transactions/export/", {"format": fmt}, **headers))
+        if response.status_code != 200:
+            raise CommandError(f"export returned {response.status_code}")
+        inflate = zlib.decompressobj(31) if gzip else None
+        wire = lines = 0
+        base = peak = _rss_mb()
+        t0 = time.perf_counter()
+        for i, chunk in enumerate(response.streaming_content):
+            wire += len(chunk)
+            lines += (inflate.decompress(chunk) if inflate else chunk).count(b"\n")
+            if i % 16 == 0:
+                peak = max(peak, _rss_mb())
+        elapsed = time.perf_counter() - t0
+        rows = lines - 1 if fmt == "csv" else lines
+        return rows, wire, elapsed, max(peak, _rss_mb()) - base
+
+    def handle(self, *args, **options):
+        n = max(options["rows"], 1)
+        formats = [f.strip() for f in options["formats"].split(",") if f.strip()]
+        db = get_db()
+        user_id = str(uuid.uuid4())
+        try:
+            t0 = time.perf_counter()
+            self._seed(db, user_id, n)
+            self.stdout.write(f"seeded {n:,} transactions in {time.perf_counter() - t0:.1f}s")
+            self.stdout.write(f"{'format':<8} {'gzip':>5} {'rows':>10} {'MB':>8} {'s':>7} {'rows/s':>9} {'RSS +MB':>8}")
+            for fmt in formats:
+                rows, wire, elapsed, grown = self._export(user_id, fmt, options["gzip"])
+                self.stdout.write(
+                    f"{fmt:<8} {'yes' if options['gzip'] else 'no':>5} {rows:>10,} {wire / 2**20:>8.1f} "
+                    f"{elapsed:>7.1f} {rows / elapsed:>9,.0f} {grown:>8.1f}"
+                )
+                if rows != n:
+                    raise CommandError(f"{fmt}: exported {rows} rows, expected {n}")
+                if grown > options["max_rss_mb"]:
+                    raise CommandError(f"{fmt}: RSS grew {grown:.1f} MB (limit {options['max_rss_mb']} MB)")
+        finally:
+            db["transactions"].delete_many({"user_id": user_id})
+        self.stdout.write(self.style.SUCCESS("done"))
@@ -0,0 +1,97 @@
+import random
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from django.core.management.base import BaseCommand, CommandError
+from core import forecast
+from core.mongo import get_db
+
+
+def _legacy_goal_progress(db, user_id, now):
+    """The pre-forecast implementation: one linear rate per goal in a Python loop."""
+    out = []
+    for g in db["goals"].find({"user_id": user_id, "is_deleted": {"$ne": True}}):
+        tgt = float(g.get("target_amount") or 0)
+        cur = float(g.get("current_amount") or 0)
+        created_at = forecast.parse_dt(g.get("created_at"), now)
+        days = max((now - created_at).days, 1)
+        rate_per_day = cur / days
+        forecast_date = None
+        if rate_per_day > 0 and tgt > cur:
+            forecast_date = (now + timedelta(days=(tgt - cur) / rate_per_day)).date().isoformat()
+        out.append({"id": g.get("id"), "forecast_date": forecast_date})
+    return out
+
+
+class Command(BaseCommand):
+    help = "Benchmark goal-progress forecasting (legacy loop vs forecast module with/without NumPy) at several goal counts."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="100,500,1000", help="Comma-separated goal counts per user")
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def _seed(self, db, user_id, n, now):
+        goals, plans, contributions = [], [], []
+        for i in range(n):
+            gid = str(uuid.uuid4())
+            created = now - timedelta(days=random.randint(1, 720))
+            goals.append({
+                "id": gid, "user_id": user_id, "name": f"goal {i}",
+                "target_amount": random.uniform(500, 50_000), "current_amount": random.uniform(0, 5_000),
+                "deadline": (now + timedelta(days=random.randint(30, 1500))).date().isoformat(),
+                "status": "active", "created_at": created, "updated_at": now, "is_deleted": False,
+            })
+            if i % 2 == 0:
+                plans.append({
+                    "id": str(uuid.uuid4()), "user_id": user_id, "goal_id": gid,
+                    "amount_per_interval": random.uniform(10, 500), "interval": random.choice(["weekly", "monthly"]),
+                    "next_run": now, "active": True, "created_at": created, "updated_at": now, "is_deleted": False,
+                })
+            for k in range(4):
+                contributions.append({
+                    "id": str(uuid.uuid4()), "user_id": user_id, "plan_id": str(uuid.uuid4()), "goal_id": gid,
+                    "amount": random.uniform(10, 500), "scheduled_for": now - timedelta(days=20 * k),
+                    "applied": True, "created_at": now,
+                })
+        db["goals"].insert_many(goals)
+        if plans:
+            db["savings_plans"].insert_many(plans)
+        db["savings_contributions"].insert_many(contributions)
+
+    def _time(self, fn, repeat):
+        samples = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - t0) * 1000)
+        return statistics.median(samples)
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(s) for s in options["sizes"].split(",") if s.strip()]
+        except ValueError:
+            raise CommandError("--sizes must be comma-separated integers")
+        db = get_db()
+        now = datetime.now(timezone.utc)
+        repeat = max(options["repeat"], 1)
+        self.stdout.write(f"numpy: {'available' if forecast.np is not None else 'not installed (python fallback only)'}")
+        self.stdout.write(f"{'goals':>7} {'legacy ms':>10} {'load ms':>9} {'python ms':>10} {'numpy ms':>9}")
+        for n in sizes:
+            user_id = str(uuid.uuid4())
+            try:
+                self._seed(db, user_id, n, now)
+                legacy = self._time(lambda: _legacy_goal_progress(db, user_id, now), repeat)
+                load = self._time(lambda: forecast.load(db, user_id, now, 90), repeat)
+                data = forecast.load(db, user_id, now, 90)
+                py = self._time(lambda: forecast.project(data, now, use_numpy=False), repeat)
+                vec = "-"
+                if forecast.np is not None:
+                    vec = f"{self._time(lambda: forecast.project(data, now, use_numpy=True), repeat):.2f}"
+                    if forecast.project(data, now, use_numpy=True) != forecast.project(data, now, use_numpy=False):
+                        raise CommandError("numpy and python forecasts disagree")
+                self.stdout.write(f"{n:>7} {legacy:>10.2f} {load:>9.2f} {py:>10.2f} {vec:>9}")
+            finally:
+                for coll in ("goals", "savings_plans", "savings_contributions"):
+                    db[coll].delete_many({"user_id": user_id})
+        self.stdout.write(self.style.SUCCESS("done"))
@@ -0,0 +1,95 @@
+import os
+import resource
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from django.core.management.base import BaseCommand, CommandError
+from core import dataversion, rollups
+from core.import_views import import_file
+from core.mongo import get_db
+
+
+def _rss_mb() -> float:
+    """Current resident set size; falls back to the peak where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class _PeakRSS(threading.Thread):
+    def __init__(self, interval=0.02):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.base = self.peak = _rss_mb()
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            self.peak = max(self.peak, _rss_mb())
+
+    def stop(self) -> float:
+        self._done.set()
+        self.join()
+        return max(self.peak, _rss_mb()) - self.base
+
+
+def _write_csv(f, n, start):
+    f.write(b"Date,Description,Amount,Category\n")
+    for i in range(n):
+        amount = f"{-(5 + (i % 997) * 0.37):.2f}" if i % 5 else f"{1000 + i % 50:.2f}"
+        f.write(f"{(start + timedelta(minutes=i)).date().isoformat()},Merchant {i % 1500},{amount},cat{i % 12}\n".encode())
+
+
+def _write_ofx(f, n, start):
+    f.write(b"OFXHEADER:100\nDATA:OFXSGML\n\n<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><CURDEF>USD\n<BANKTRANLIST>\n")
+    for i in range(n):
+        amount = f"{-(5 + (i % 997) * 0.37):.2f}" if i % 5 else f"{1000 + i % 50:.2f}"
+        posted = (start + timedelta(minutes=i)).strftime("%Y%m%d%H%M%S")
+        f.write(f"<STMTTRN><TRNTYPE>OTHER<DTPOSTED>{posted}<TRNAMT>{amount}<FITID>F{i}<NAME>Merchant {i % 1500}</STMTTRN>\n".encode())
+    f.write(b"</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>\n")
+
+
+class Command(BaseCommand):
+    help = "Import a generated N-row CSV/OFX statement twice (fresh, then as a re-import) and report rows/sec and peak RSS growth."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=200_000)
+        parser.add_argument("--format", choices=["csv", "ofx"], default="csv")
+        parser.add_argument("--chunk-size", type=int, default=None, help="Rows per insert_many (default IMPORT_CHUNK_SIZE)")
+
+    def handle(self, *args, **options):
+        n = max(options["rows"], 1)
+        fmt = options["format"]
+        db = get_db()
+        user_id = str(uuid.uuid4())
+        start = datetime.now(timezone.utc) - timedelta(minutes=n)
+        with tempfile.TemporaryFile() as f:
+            (_write_csv if fmt == "csv" else _write_ofx)(f, n, start)
+            size = f.tell()
+            self.stdout.write(f"{fmt} file: {n:,} rows, {size / 2**20:.1f} MB")
+            self.stdout.write(f"{'run':<10} {'inserted':>9} {'dupes':>9} {'invalid':>8} {'s':>7} {'rows/s':>9} {'RSS +MB':>8}")
+            try:
+                for label in ("fresh", "re-import"):
+                    f.seek(0)
+                    sampler = _PeakRSS()
+                    sampler.start()
+                    t0 = time.perf_counter()
+                    summary = import_file(db, user_id, f, fmt, chunk_size=options["chunk_size"])
+                    elapsed = time.perf_counter() - t0
+                    grown = sampler.stop()
+                    self.stdout.write(
+                        f"{label:<10} {summary['inserted']:>9,} {summary['duplicates']:>9,} {summary['invalid']:>8,} "
+                        f"{elapsed:>7.1f} {summary['rows'] / elapsed:>9,.0f} {grown:>8.1f}"
+                    )
+                    if summary["invalid"]:
+                        raise CommandError(f"unexpected invalid rows: {summary['errors'][:3]}")
+                if db["transactions"].count_documents({"user_id": user_id}) != n:
+                    raise CommandError("re-import changed the number of stored transactions")
+            finally:
+                for coll in ("transactions", "profiles", rollups.COLLECTION, dataversion.COLLECTION):
+                    db[coll].delete_many({"user_id": user_id})
+        self.stdout.write(self.style.SUCCESS("done"))
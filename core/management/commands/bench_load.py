@@ -0,0 +1,134 @@
+import asyncio
+import statistics
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+from django.core.management.base import BaseCommand, CommandError
+from core.management.commands.bench_auth import Command as BenchAuth, _pct
+
+
+async def _read_response(reader):
+    """Read one response off a keep-alive connection; returns (status, whether the server closes it)."""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("connection closed")
+    status = int(status_line.split()[1])
+    length, chunked, close = 0, False, status_line.startswith(b"HTTP/1.0")
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        name, value = name.strip().lower(), value.strip().lower()
+        if name == "content-length":
+            length = int(value)
+        elif name == "transfer-encoding" and "chunked" in value:
+            chunked = True
+        elif name == "connection":
+            close = value == "close"
+    if chunked:
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif length:
+        await reader.readexactly(length)
+    return status, close
+
+
+class Command(BaseCommand):
+    help = (
+        "HTTP load test: N concurrent keep-alive clients hit one URL for a fixed time; reports req/sec, "
+        "p50/p95/p99 latency and errors. Run it against the WSGI and the ASGI server to compare them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", required=True, help="e.g. http://127.0.0.1:8000/api/analytics/spend-by-category/")
+        parser.add_argument("--concurrency", type=int, default=500)
+        parser.add_argument("--duration", type=float, default=30.0, help="Seconds to run")
+        parser.add_argument("--token", default="", help="Sent as Authorization: Bearer <token>")
+        parser.add_argument("--header", action="append", default=[], help='Extra header, e.g. "X-User-Id: <uuid>" (repeatable)')
+        parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout in seconds")
+        parser.add_argument(
+            "--stub-verifier", type=float, default=None, metavar="DELAY",
+            help="Also serve a stub token verifier that answers after DELAY seconds; point the server's AUTH_VERIFY_URL at it",
+        )
+        parser.add_argument("--stub-port", type=int, default=8099)
+        parser.add_argument("--stub-user-id", default="", help="User id the stub verifier returns")
+
+    def _request_bytes(self, url, options) -> bytes:
+        path = url.path or "/"
+        if url.query:
+            path += "?" + url.query
+        lines = [f"GET {path} HTTP/1.1", f"Host: {url.netloc}", "Accept: application/json", "Connection: keep-alive"]
+        if options["token"]:
+            lines.append(f"Authorization: Bearer {options['token']}")
+        for header in options["header"]:
+            if ":" not in header:
+                raise CommandError(f"bad --header {header!r}; expected 'Name: value'")
+            lines.append(header.strip())
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+    async def _client(self, host, port, request, deadline, timeout, samples, statuses, errors):
+        reader = writer = None
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            try:
+                if writer is None:
+                    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+                writer.write(request)
+                status, close = await asyncio.wait_for(_read_response(reader), timeout)
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError, IndexError) as e:
+                errors[type(e).__name__] += 1
+                if writer is not None:
+                    writer.close()
+                reader = writer = None
+                continue
+            samples.append((time.perf_counter() - t0) * 1000.0)
+            statuses[status] += 1
+            if close:
+                writer.close()
+                reader = writer = None
+        if writer is not None:
+            writer.close()
+
+    async def _load(self, url, options):
+        if url.scheme != "http":
+            raise CommandError("only http:// URLs are supported")
+        host, port = url.hostname, url.port or 80
+        request = self._request_bytes(url, options)
+        samples, statuses, errors = [], Counter(), Counter()
+        t0 = time.perf_counter()
+        deadline = t0 + options["duration"]
+        await asyncio.gather(*(
+            self._client(host, port, request, deadline, options["timeout"], samples, statuses, errors)
+            for _ in range(max(options["concurrency"], 1))
+        ))
+        return samples, statuses, errors, time.perf_counter() - t0
+
+    def handle(self, *args, **options):
+        url = urlsplit(options["url"])
+        stub = None
+        if options["stub_verifier"] is not None:
+            stub, stub_url = BenchAuth()._start_stub(options["stub_verifier"], options["stub_user_id"] or None, options["stub_port"])
+            self.stdout.write(f"stub verifier at {stub_url} ({options['stub_verifier'] * 1000:.0f} ms per call)")
+        try:
+            samples, statuses, errors, elapsed = asyncio.run(self._load(url, options))
+        finally:
+            if stub:
+                stub.shutdown()
+        ok = sum(n for code, n in statuses.items() if code < 400)
+        self.stdout.write(f"{'clients':>7} {'requests':>9} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9} {'errors':>7}")
+        if not samples:
+            raise CommandError(f"no responses; errors: {dict(errors)}")
+        self.stdout.write(
+            f"{options['concurrency']:>7} {len(samples):>9,} {len(samples) / elapsed:>9,.0f} {statistics.median(samples):>9.1f} "
+            f"{_pct(samples, 95):>9.1f} {_pct(samples, 99):>9.1f} {max(samples):>9.1f} {sum(errors.values()):>7,}"
+        )
+        self.stdout.write("status: " + ", ".join(f"{code}={n:,}" for code, n in sorted(statuses.items())))
+        if errors:
+            self.stdout.write("errors: " + ", ".join(f"{name}={n:,}" for name, n in errors.most_common()))
+        if ok < len(samples):
+            self.stdout.write(self.style.WARNING(f"{len(samples) - ok:,} responses had status >= 400"))
+        self.stdout.write(self.style.SUCCESS("done"))
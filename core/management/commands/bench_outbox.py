@@ -0,0 +1,49 @@
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand
+from core import outbox
+from core.mongo import get_db
+
+
+class Command(BaseCommand):
+    help = "Enqueue N award events across U users and measure how fast the outbox worker drains them."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--events", type=int, default=100_000)
+        parser.add_argument("--users", type=int, default=1_000)
+        parser.add_argument("--batch", type=int, default=1_000)
+        parser.add_argument("--workers", type=int, default=4, help="Concurrent drain loops (each claims under its own lease)")
+
+    def handle(self, *args, **options):
+        n = max(options["events"], 1)
+        users = [str(uuid.uuid4()) for _ in range(max(options["users"], 1))]
+        db = get_db()
+        try:
+            t0 = time.perf_counter()
+            chunk = []
+            for i in range(n):
+                chunk.append(outbox.award_event(users[i % len(users)], "bench_outbox", 10, {"tx_count": 1}, entity_type="bench"))
+                if len(chunk) >= 10_000:
+                    outbox.enqueue(chunk)
+                    chunk = []
+            outbox.enqueue(chunk)
+            enqueue_s = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=max(options["workers"], 1)) as pool:
+                results = list(pool.map(lambda _: outbox.drain(batch=options["batch"]), range(max(options["workers"], 1))))
+            drain_s = time.perf_counter() - t0
+
+            done = sum(r["done"] for r in results)
+            xp = sum(d["xp_delta"] for d in db["xp_log"].find({"user_id": {"$in": users}}, {"_id": 0, "xp_delta": 1}))
+            self.stdout.write(f"enqueue: {n} events in {enqueue_s:.2f}s ({n / enqueue_s:,.0f}/s)")
+            self.stdout.write(f"drain:   {done} events in {drain_s:.2f}s ({done / max(drain_s, 1e-9):,.0f}/s), "
+                              f"{sum(r['batches'] for r in results)} batches, retried={sum(r['retried'] for r in results)}, "
+                              f"dead={sum(r['dead'] for r in results)}")
+            if xp != 10 * n:
+                raise RuntimeError(f"xp applied {xp} != expected {10 * n}")
+            self.stdout.write(self.style.SUCCESS(f"all {n} events applied exactly once across {len(users)} users"))
+        finally:
+            for coll in ("xp_log", "profiles", outbox.COLLECTION):
+                db[coll].delete_many({"user_id": {"$in": users}})
@@ -0,0 +1,67 @@
+import json
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from django.core.management.base import BaseCommand, CommandError
+from django.http import JsonResponse
+from rest_framework.renderers import JSONRenderer
+from core import renderers
+from core.compiled_serializers import compile_serializer
+from core.renderers import FastJSONRenderer, FastJsonResponse
+from core.serializers import TransactionSerializer
+
+
+def _raw_transactions(n):
+    """Transaction documents as pymongo returns them (naive UTC datetimes, float amounts)."""
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    user_id = str(uuid.uuid4())
+    return [
+        {
+            "id": str(uuid.uuid4()), "user_id": user_id, "type": "expense", "amount": 12.34 + i, "currency": "USD",
+            "category": "Food", "description": f"lunch #{i} — café", "occurred_at": now - timedelta(minutes=i),
+            "created_at": now, "updated_at": now, "is_deleted": False,
+        }
+        for i in range(n)
+    ]
+
+
+class Command(BaseCommand):
+    help = "Benchmark JSON rendering (bytes/sec) of an N-item transaction list: DRF/Django encoders vs core.renderers."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=10_000)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def _rate(self, fn, repeat):
+        best = None
+        size = 0
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            size = len(fn())
+            elapsed = time.perf_counter() - t0
+            best = elapsed if best is None else min(best, elapsed)
+        return size, best
+
+    def handle(self, *args, **options):
+        n = max(options["count"], 1)
+        repeat = max(options["repeat"], 1)
+        raw = _raw_transactions(n)
+        to_representation = compile_serializer(TransactionSerializer)
+        serialized = [to_representation(d) for d in raw]
+
+        drf, fast = JSONRenderer(), FastJSONRenderer()
+        if json.loads(drf.render(serialized)) != json.loads(fast.render(serialized)):
+            raise CommandError("FastJSONRenderer output differs from JSONRenderer")
+
+        cases = [
+            ("DRF JSONRenderer", lambda: drf.render(serialized)),
+            ("FastJSONRenderer", lambda: fast.render(serialized)),
+            ("JsonResponse (raw docs)", lambda: JsonResponse({"items": raw}).content),
+            ("FastJsonResponse (raw docs)", lambda: FastJsonResponse({"items": raw}).content),
+        ]
+        self.stdout.write(f"encoder: {'orjson' if renderers.orjson is not None else 'stdlib (orjson not installed)'}; {n} transactions")
+        self.stdout.write(f"{'renderer':<30} {'bytes':>11} {'ms':>8} {'MB/s':>8}")
+        for label, fn in cases:
+            size, seconds = self._rate(fn, repeat)
+            self.stdout.write(f"{label:<30} {size:>11,} {seconds * 1000:>8.1f} {size / seconds / 1e6:>8.1f}")
+        self.stdout.write(self.style.SUCCESS("done"))
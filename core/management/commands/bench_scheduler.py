@@ -0,0 +1,70 @@
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from django.core.management.base import BaseCommand
+from core import rollups, scheduler
+from core.mongo import get_db
+from core.outbox import worker_id
+
+
+class Command(BaseCommand):
+    help = "Seed N due recurring rules across U users and measure how fast parallel schedulers fire them."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rules", type=int, default=1_000_000)
+        parser.add_argument("--users", type=int, default=10_000)
+        parser.add_argument("--batch", type=int, default=1_000)
+        parser.add_argument("--workers", type=int, default=4, help="Concurrent scheduler loops, each with its own lease owner")
+
+    def _seed(self, db, users, n):
+        past = datetime.now(timezone.utc) - timedelta(hours=1)
+        chunk = []
+        for i in range(n):
+            chunk.append({
+                "id": str(uuid.uuid4()),
+                "user_id": users[i % len(users)],
+                "name": f"bench #{i}",
+                "amount": 9.99,
+                "currency": "USD",
+                "category": "Subscriptions",
+                "type": "expense",
+                "cadence": "monthly",
+                "next_run": past,
+                "active": True,
+                "created_at": past,
+                "updated_at": past,
+                "is_deleted": False,
+            })
+            if len(chunk) >= 10_000:
+                db[scheduler.RECURRING].insert_many(chunk, ordered=False)
+                chunk = []
+        if chunk:
+            db[scheduler.RECURRING].insert_many(chunk, ordered=False)
+
+    def _worker(self, db, batch):
+        return sum(len(docs) for docs, _ in scheduler.run_due(db, scheduler.RECURRING, worker_id(), batch, 300))
+
+    def handle(self, *args, **options):
+        n = max(options["rules"], 1)
+        workers = max(options["workers"], 1)
+        users = [str(uuid.uuid4()) for _ in range(max(options["users"], 1))]
+        db = get_db()
+        try:
+            t0 = time.perf_counter()
+            self._seed(db, users, n)
+            self.stdout.write(f"seeded {n} rules for {len(users)} users in {time.perf_counter() - t0:.1f}s")
+
+            t0 = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                fired = sum(pool.map(lambda _: self._worker(db, options["batch"]), range(workers)))
+            elapsed = time.perf_counter() - t0
+
+            txs = db["transactions"].count_documents({"user_id": {"$in": users}})
+            self.stdout.write(f"{fired} rules in {elapsed:.2f}s ({fired / max(elapsed, 1e-9):,.0f} rules/sec, {workers} workers)")
+            if txs != n or fired != n:
+                raise RuntimeError(f"expected {n} transactions, got {txs} (fired {fired})")
+            self.stdout.write(self.style.SUCCESS("every rule fired exactly once"))
+        finally:
+            for coll in (scheduler.RECURRING, "transactions", "profiles", rollups.COLLECTION):
+                db[coll].delete_many({"user_id": {"$in": users}})
@@ -0,0 +1,55 @@
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from django.core.management.base import BaseCommand, CommandError
+from core.compiled_serializers import SERIALIZERS, compile_serializer
+from core.serializers import GoalSerializer, ProfileSerializer, TransactionSerializer, XPLogSerializer
+
+
+def _docs(serializer_class, n):
+    """Documents shaped like what the list endpoints read back from Mongo (naive UTC datetimes)."""
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    base = {"user_id": str(uuid.uuid4()), "created_at": now, "updated_at": now, "is_deleted": False}
+    out = []
+    for i in range(n):
+        doc = {**base, "id": str(uuid.uuid4())}
+        if serializer_class is ProfileSerializer:
+            doc.update(xp=i * 10, level=i // 10 + 1, badges=[{"code": "first_tx", "awarded_at": now.isoformat()}])
+        elif serializer_class is TransactionSerializer:
+            doc.update(type="expense", amount=12.34 + i, currency="USD", category="Food", description=f"item {i}",
+                       occurred_at=now - timedelta(minutes=i))
+        elif serializer_class is GoalSerializer:
+            doc.update(name=f"goal {i}", target_amount=1000.0, current_amount=float(i), deadline="2027-01-01", status="active")
+        elif serializer_class is XPLogSerializer:
+            doc.update(xp_delta=10, reason="add_transaction", related_entity_type=None, related_entity_id=None)
+        out.append(doc)
+    return out
+
+
+class Command(BaseCommand):
+    help = "Microbenchmark: documents/sec for DRF serializers vs their compiled read-only fast path."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        n = max(options["count"], 1)
+        self.stdout.write(f"{'serializer':<24} {'drf docs/s':>12} {'compiled docs/s':>16} {'speedup':>8}")
+        for serializer_class in SERIALIZERS:
+            docs = _docs(serializer_class, n)
+            fast = compile_serializer(serializer_class)
+
+            t0 = time.perf_counter()
+            drf = [serializer_class(instance=d).data for d in docs]
+            drf_s = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            compiled = [fast(d) for d in docs]
+            fast_s = time.perf_counter() - t0
+
+            if [dict(d) for d in drf] != compiled:
+                raise CommandError(f"{serializer_class.__name__}: compiled output differs from DRF")
+            self.stdout.write(
+                f"{serializer_class.__name__:<24} {n / drf_s:>12,.0f} {n / fast_s:>16,.0f} {drf_s / max(fast_s, 1e-9):>7.1f}x"
+            )
+        self.stdout.write(self.style.SUCCESS(f"outputs identical for {n} documents per serializer"))
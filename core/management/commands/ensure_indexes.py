@@ -0,0 +1,74 @@
+from django.core.management.base import BaseCommand, CommandError
+from pymongo.errors import OperationFailure
+from core.indexes import INDEXES, plan_stages, query_shapes, unique_conflicts
+from core.mongo import get_db
+
+
+class Command(BaseCommand):
+    help = "Create the Mongo indexes declared in core/indexes.py; with --check, explain() every view query shape and fail on COLLSCAN."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--check", action="store_true", help="Only explain view query shapes; exit non-zero if any uses COLLSCAN")
+        parser.add_argument("--collection", action="append", default=None, help="Limit to a collection (repeatable)")
+
+    def handle(self, *args, **options):
+        only = set(options["collection"] or [])
+        db = get_db()
+        if options["check"]:
+            self._check(db, only)
+            return
+        failures = 0
+        for coll, models in INDEXES.items():
+            if only and coll not in only:
+                continue
+            models, blocked = self._buildable(db, coll, models)
+            failures += blocked
+            if not models:
+                continue
+            try:
+                names = db[coll].create_indexes(models)
+                self.stdout.write(f"{coll}: {', '.join(names)}")
+            except OperationFailure as e:
+                # Usually an existing index with the same name/keys but different options
+                failures += 1
+                self.stderr.write(self.style.ERROR(f"{coll}: {e}"))
+        if failures:
+            raise CommandError(f"{failures} index build(s) failed")
+        self.stdout.write(self.style.SUCCESS("Indexes ensured."))
+
+    def _buildable(self, db, coll, models):
+        """(models, blocked): drop new unique indexes that existing duplicates would fail,
+        reporting the duplicated keys so they can be cleaned up first."""
+        existing = set(db[coll].index_information())
+        keep, blocked = [], 0
+        for model in models:
+            name = model.document["name"]
+            if model.document.get("unique") and name not in existing:
+                conflicts = unique_conflicts(db, coll, model)
+                if conflicts:
+                    blocked += 1
+                    self.stderr.write(self.style.ERROR(f"{coll}: {name} not created, duplicate keys (first {len(conflicts)}):"))
+                    for c in conflicts:
+                        self.stderr.write(f"  {c['key']} x{c['count']}: ids {', '.join(map(str, c['ids']))}")
+                    continue
+            keep.append(model)
+        return keep, blocked
+
+    def _check(self, db, only):
+        scans = []
+        for label, coll, filt, sort in query_shapes():
+            if only and coll not in only:
+                continue
+            cursor = db[coll].find(filt)
+            if sort:
+                cursor = cursor.sort(sort)
+            plan = cursor.explain().get("queryPlanner", {}).get("winningPlan", {})
+            stages = plan_stages(plan)
+            if "COLLSCAN" in stages:
+                scans.append(label)
+                self.stdout.write(self.style.ERROR(f"COLLSCAN  {label} ({coll})"))
+            else:
+                self.stdout.write(f"ok        {label} ({coll}): {'/'.join(sorted(stages))}")
+        if scans:
+            raise CommandError(f"{len(scans)} query shape(s) fall back to COLLSCAN: {', '.join(scans)}")
+        self.stdout.write(self.style.SUCCESS("All view query shapes are index-backed."))
@@ -0,0 +1,123 @@
+from datetime import datetime, timezone
+from django.core.management.base import BaseCommand
+from pymongo import DeleteOne, UpdateOne
+from core import rollups
+from core.mongo import get_db, run_in_transaction
+
+
+class Command(BaseCommand):
+    help = "Recompute monthly_rollups from raw transactions, report drift, and (unless --verify) repair drifted users."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=str, default=None, help="Only this user_id")
+        parser.add_argument("--verify", action="store_true", help="Report drift without writing")
+        parser.add_argument("--tolerance", type=float, default=0.005, help="Allowed absolute difference in totals")
+        parser.add_argument("--attempts", type=int, default=3, help="Repair passes per user before giving up on concurrent writes")
+
+    def _key(self, r):
+        return (r["month"], r["category"], r["type"])
+
+    def _differs(self, e, a, tolerance):
+        return e["count"] != a.get("count", 0) or abs(e["total"] - a.get("total", 0.0)) > tolerance
+
+    def _drift(self, expected, actual, tolerance):
+        diffs = []
+        for key in sorted(set(expected) | set(actual)):
+            e = expected.get(key, {"total": 0.0, "count": 0})
+            a = actual.get(key, {"total": 0.0, "count": 0})
+            if self._differs(e, a, tolerance):
+                diffs.append((key, e, a))
+        return diffs
+
+    def _actual(self, db, user_id, session=None):
+        return {self._key(r): r for r in db[rollups.COLLECTION].find({"user_id": user_id, "count": {"$ne": 0}}, session=session)}
+
+    def _repair(self, db, user_id, tolerance):
+        """Recompute the user's rollups and write them as compare-and-set updates.
+
+        Each write only applies if the row still holds what was read, so a concurrent
+        ``$inc`` from a write path is never overwritten: the update misses instead, and
+        the next pass recomputes. Inside a transaction (replica sets) a conflicting write
+        retries the whole pass."""
+        coll = db[rollups.COLLECTION]
+
+        def write(session):
+            expected = rollups.user_rollups(db, user_id, session=session)
+            actual = {self._key(r): r for r in coll.find({"user_id": user_id}, session=session)}
+            now = datetime.now(timezone.utc)
+            ops = []
+            for key, a in actual.items():
+                unchanged = {"_id": a["_id"], "total": a.get("total"), "count": a.get("count")}
+                e = expected.get(key)
+                if e is None:
+                    ops.append(DeleteOne(unchanged))
+                elif self._differs(e, a, tolerance):
+                    ops.append(UpdateOne(unchanged, {"$set": {**e, "updated_at": now}}))
+            for (month, category, tx_type), e in expected.items():
+                if (month, category, tx_type) not in actual:
+                    key = {"user_id": user_id, "month": month, "category": category, "type": tx_type}
+                    ops.append(UpdateOne(key, {"$setOnInsert": {**e, "updated_at": now}}, upsert=True))
+            if ops:
+                coll.bulk_write(ops, ordered=False, session=session)
+
+        run_in_transaction(write)
+        return self._drift(rollups.user_rollups(db, user_id), self._actual(db, user_id), tolerance)
+
+    def _reconcile(self, db, user_id, expected, options):
+        diffs = self._drift(expected, self._actual(db, user_id), options["tolerance"])
+        for (month, category, tx_type), e, a in diffs:
+            self.stdout.write(
+                f"drift user={user_id} {month} {category!r} {tx_type}: "
+                f"expected {e['total']:.2f}/{e['count']} got {a.get('total', 0.0):.2f}/{a.get('count', 0)}"
+            )
+        if diffs and not options["verify"]:
+            # Re-verify after each pass: writes that landed since the scan show up as new drift
+            for _ in range(max(options["attempts"], 1)):
+                remaining = self._repair(db, user_id, options["tolerance"])
+                if not remaining:
+                    break
+            else:
+                self.stderr.write(self.style.WARNING(
+                    f"user={user_id}: {len(remaining)} rollup row(s) still drifting after {options['attempts']} pass(es); re-run the command"
+                ))
+        return len(diffs)
+
+    def handle(self, *args, **options):
+        db = get_db()
+        users_checked = 0
+        users_drifted = 0
+        rows_drifted = 0
+        seen = set()
+        current, expected = None, {}
+
+        def flush():
+            nonlocal users_checked, users_drifted, rows_drifted
+            if current is None:
+                return
+            n = self._reconcile(db, current, expected, options)
+            users_checked += 1
+            users_drifted += 1 if n else 0
+            rows_drifted += n
+
+        for row in rollups.expected_rollups(db, options["user"]):
+            if row["user_id"] != current:
+                flush()
+                current, expected = row["user_id"], {}
+                seen.add(current)
+            expected[self._key(row)] = {"total": row["total"], "count": row["count"], "first_seen": row["first_seen"]}
+        flush()
+
+        # Users whose rollups remain but who no longer have any live transactions
+        stale_filter = {"count": {"$ne": 0}}
+        if options["user"]:
+            stale_filter["user_id"] = options["user"]
+        for user_id in db[rollups.COLLECTION].distinct("user_id", stale_filter):
+            if user_id in seen:
+                continue
+            current, expected = user_id, {}
+            flush()
+
+        verb = "found" if options["verify"] else "repaired"
+        self.stdout.write(self.style.SUCCESS(
+            f"Checked {users_checked} user(s); {verb} drift in {rows_drifted} rollup row(s) across {users_drifted} user(s)."
+        ))
@@ -0,0 +1,35 @@
+import time
+from django.core.management.base import BaseCommand
+from core import outbox
+
+
+class Command(BaseCommand):
+    help = "Claim pending outbox events under a lease and apply them (XP awards, counters, badges)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch", type=int, default=500, help="Events claimed per lease")
+        parser.add_argument("--lease", type=float, default=60.0, help="Lease length in seconds; expired leases are reclaimed")
+        parser.add_argument("--poll", type=float, default=1.0, help="Sleep between polls when nothing is due")
+        parser.add_argument("--max-attempts", type=int, default=8, help="Failures before an event is marked dead")
+        parser.add_argument("--once", action="store_true", help="Drain what is due now and exit")
+
+    def handle(self, *args, **options):
+        owner = outbox.worker_id()
+        batch = max(options["batch"], 1)
+        self.stdout.write(f"outbox worker {owner} (batch={batch}, lease={options['lease']}s)")
+        if options["once"]:
+            totals = outbox.drain(owner, batch, options["lease"], options["max_attempts"])
+            self.stdout.write(self.style.SUCCESS(
+                f"done={totals['done']} retried={totals['retried']} dead={totals['dead']} batches={totals['batches']}"
+            ))
+            return
+        try:
+            while True:
+                events = outbox.claim(owner, batch, options["lease"])
+                if not events:
+                    time.sleep(options["poll"])
+                    continue
+                stats = outbox.process(events, max_attempts=options["max_attempts"])
+                self.stdout.write(f"claimed={len(events)} done={stats['done']} retried={stats['retried']} dead={stats['dead']}")
+        except KeyboardInterrupt:
+            self.stdout.write("stopping; unfinished leases expire and are reclaimed")
@@ -0,0 +1,45 @@
+import time
+from django.core.management.base import BaseCommand
+from core import scheduler
+from core.mongo import get_db
+from core.outbox import worker_id
+
+
+class Command(BaseCommand):
+    help = "Run due recurring rules and savings plans for all users. Safe to run several processes in parallel."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch", type=int, default=500, help="Rules/plans claimed per lease")
+        parser.add_argument("--lease", type=float, default=60.0, help="Lease length in seconds; expired leases are reclaimed")
+        parser.add_argument("--poll", type=float, default=5.0, help="Sleep between polls when nothing is due")
+        parser.add_argument("--once", action="store_true", help="Run what is due now and exit")
+
+    def _tick(self, db, owner, batch, lease):
+        counts = {}
+        for coll_name in (scheduler.RECURRING, scheduler.SAVINGS):
+            counts[coll_name] = sum(len(docs) for docs, _ in scheduler.run_due(db, coll_name, owner, batch, lease))
+        return counts
+
+    def handle(self, *args, **options):
+        db = get_db()
+        owner = worker_id()
+        batch = max(options["batch"], 1)
+        self.stdout.write(f"scheduler {owner} (batch={batch}, lease={options['lease']}s)")
+        try:
+            while True:
+                t0 = time.perf_counter()
+                counts = self._tick(db, owner, batch, options["lease"])
+                total = sum(counts.values())
+                if total:
+                    elapsed = time.perf_counter() - t0
+                    self.stdout.write(
+                        f"recurring={counts[scheduler.RECURRING]} savings={counts[scheduler.SAVINGS]} "
+                        f"in {elapsed:.2f}s ({total / max(elapsed, 1e-9):,.0f}/s)"
+                    )
+                if options["once"]:
+                    self.stdout.write(self.style.SUCCESS(f"processed {total}"))
+                    return
+                if not total:
+                    time.sleep(options["poll"])
+        except KeyboardInterrupt:
+            self.stdout.write("stopping; unfinished leases expire and are reclaimed")
@@ -3,6 +3,7 @@ from datetime import datetime, timedelta, timezone, date
 import random
 from django.core.management.base import BaseCommand
 from core.mongo import get_db
+from core import rollups
 from core.auth_views import _hash_password
 
 class Command(BaseCommand):
@@ -56,6 +57,7 @@ class Command(BaseCommand):
 
         categories = ["Food", "Transport", "Utilities", "Shopping", "Health", "Entertainment"]
         currencies = ["USD", "INR", "EUR"]
+        seeded_tx = []
         for i in range(20):
             occurred = now - timedelta(days=random.randint(0, 45), hours=random.randint(0, 23))
             doc = {
@@ -71,6 +73,8 @@ class Command(BaseCommand):
                 "is_deleted": False,
             }
             transactions.update_one({"id": doc["id"]}, {"$set": doc}, upsert=True)
+            seeded_tx.append(doc)
+        rollups.apply_changes(db, [(None, doc) for doc in seeded_tx])
 
         goal_defs = [
             ("Emergency Fund", 1000, 600, "active"),
@@ -0,0 +1,233 @@
+"""In-process request metrics, exposed in Prometheus text format at /metrics.
+
+MetricsMiddleware (core/middleware/metrics_middleware.py) opens a per-request
+record in a context variable. The PyMongo command listener registered on every
+client (core/mongo.py) adds to it, so Mongo commands are attributed to the route
+that issued them, including work done in sync_to_async threads, asyncio tasks and
+the dashboard pool (which copy the context). When the request ends the record is
+folded into the histograms below under one lock. Token verification is timed per
+verifier by the auth middleware (``observe_auth``), apart from request latency.
+
+Metrics are per process: with several workers each one reports its own.
+"""
+import bisect
+import contextvars
+import hmac
+import re
+import threading
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.urls import Resolver404, resolve
+from pymongo import monitoring
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+COMMAND_COUNT_BUCKETS = (0, 1, 2, 3, 4, 5, 6, 8, 10, 15, 20, 30, 50, 100)
+COMMAND_LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+METHODS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"}
+
+_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    return getattr(settings, "METRICS_ENABLED", False)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple):
+        self.name, self.help, self.labels = name, help, labels
+        self._values = {}
+
+    def inc(self, values: tuple, amount: float = 1) -> None:
+        """Caller holds _lock."""
+        self._values[values] = self._values.get(values, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for values, total in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.labels, values)} {total}")
+        return lines
+
+    def clear(self) -> None:
+        self._values.clear()
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple, buckets: tuple):
+        self.name, self.help, self.labels, self.buckets = name, help, labels, buckets
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._series = {}
+
+    def observe(self, values: tuple, value: float) -> None:
+        """Caller holds _lock."""
+        series = self._series.get(values)
+        if series is None:
+            series = self._series[values] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for values, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets + ("+Inf",), series):
+                cumulative += n
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labels, values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, values)} {series[-1]}")
+            lines.append(f"{self.name}_count{_labels(self.labels, values)} {cumulative}")
+        return lines
+
+    def clear(self) -> None:
+        self._series.clear()
+
+
+requests_total = Counter("http_requests_total", "Requests by route, method and status.", ("route", "method", "status"))
+request_duration = Histogram(
+    "http_request_duration_seconds", "Request latency, auth included.", ("route", "method"), LATENCY_BUCKETS
+)
+response_size = Histogram(
+    "http_response_size_bytes", "Response body size (streaming responses excluded).", ("route",), SIZE_BUCKETS
+)
+mongo_commands = Histogram(
+    "mongodb_commands_per_request", "Mongo commands issued while serving one request.", ("route",), COMMAND_COUNT_BUCKETS
+)
+mongo_duration = Histogram(
+    "mongodb_command_duration_seconds", "Mongo command latency, by issuing route.", ("route", "command"), COMMAND_LATENCY_BUCKETS
+)
+auth_duration = Histogram(
+    "auth_verify_duration_seconds", "Token verification latency per verifier.", ("verifier", "result"), LATENCY_BUCKETS
+)
+REGISTRY = (requests_total, request_duration, response_size, mongo_commands, mongo_duration, auth_duration)
+
+
+class RequestMetrics:
+    """What one request did; filled from any thread or task that shares its context."""
+
+    __slots__ = ("commands", "_lock")
+
+    def __init__(self):
+        self.commands = []  # (command name, seconds)
+        self._lock = threading.Lock()
+
+    def add_command(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.commands.append((name, seconds))
+
+
+_current = contextvars.ContextVar("request_metrics", default=None)
+
+
+def current():
+    return _current.get()
+
+
+def begin():
+    """Start recording for the current context; returns the token for finish()."""
+    return _current.set(RequestMetrics())
+
+
+_route_cache = {}
+_group = re.compile(r"\(\?P<(\w+)>[^)]*\)")
+
+
+def _clean_route(route: str) -> str:
+    cleaned = _route_cache.get(route)
+    if cleaned is None:
+        # DRF router patterns are regexes: 'api/^transactions/(?P<pk>[^/.]+)/$' -> '/api/transactions/<pk>/'
+        cleaned = "/" + _group.sub(r"<\1>", route).replace("^", "").replace("$", "").replace("\\", "")
+        _route_cache[route] = cleaned
+    return cleaned
+
+
+def route_of(request) -> str:
+    """The URL pattern that served the request (low-cardinality label), 'unmatched' for 404s."""
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        # The request ended before URL resolution (e.g. a 401 from the auth middleware)
+        try:
+            match = resolve(request.path_info)
+        except (Resolver404, Http404):
+            return "unmatched"
+    return _clean_route(match.route)
+
+
+def finish(token, request, response, seconds: float) -> None:
+    record = _current.get()
+    _current.reset(token)
+    route = route_of(request)
+    method = request.method if request.method in METHODS else "other"
+    size = None if response.streaming else len(response.content)
+    commands = list(record.commands) if record is not None else []
+    with _lock:
+        requests_total.inc((route, method, str(response.status_code)))
+        request_duration.observe((route, method), seconds)
+        if size is not None:
+            response_size.observe((route,), size)
+        mongo_commands.observe((route,), len(commands))
+        for name, elapsed in commands:
+            mongo_duration.observe((route, name), elapsed)
+
+
+def observe_auth(verifier: str, ok: bool, seconds: float) -> None:
+    with _lock:
+        auth_duration.observe((verifier, "ok" if ok else "fail"), seconds)
+
+
+class CommandListener(monitoring.CommandListener):
+    """Attributes each Mongo command to the request in whose context it ran."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        record = _current.get()
+        if record is not None:
+            record.add_command(event.command_name, event.duration_micros / 1e6)
+
+    def failed(self, event):
+        self.succeeded(event)
+
+
+command_listener = CommandListener()
+
+
+def render() -> str:
+    with _lock:
+        lines = [line for metric in REGISTRY for line in metric.render()]
+    return "\n".join(lines) + "\n"
+
+
+def reset() -> None:
+    with _lock:
+        for metric in REGISTRY:
+            metric.clear()
+
+
+def metrics_view(request):
+    """GET /metrics (exempt from ExternalAuthMiddleware). METRICS_TOKEN is required as a
+    bearer token; with none set the endpoint only answers under DEBUG."""
+    if not enabled():
+        return HttpResponse(status=404)
+    expected = getattr(settings, "METRICS_TOKEN", "")
+    if not expected:
+        if not settings.DEBUG:
+            return HttpResponse(status=404)
+    else:
+        auth = request.META.get("HTTP_AUTHORIZATION", "")
+        given = auth.split(" ", 1)[1].strip() if auth.lower().startswith("bearer ") else ""
+        if not hmac.compare_digest(given.encode(), expected.encode()):
+            return HttpResponse(status=401)
+    return HttpResponse(render(), content_type="text/plain; version=0.0.4; charset=utf-8")
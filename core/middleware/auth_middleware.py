@@ -1,11 +1,140 @@
+import asyncio
+import hashlib
 import json
+import threading
+import time
+import weakref
 from typing import Optional
 import requests
+from requests.adapters import HTTPAdapter
+from asgiref.sync import sync_to_async
 from django.http import JsonResponse
 from django.utils.deprecation import MiddlewareMixin
 from django.conf import settings
-from pymongo import MongoClient
 import jwt
+from core import metrics
+from core.cache import LRUTTLCache
+from core.mongo import get_async_client, get_client
+
+try:
+    import httpx
+except ImportError:  # optional: pip install httpx; otherwise async requests verify in a thread
+    httpx = None
+
+
+# Verified token -> (auth_user, mongodb_user). Shared by every middleware instance
+# in the process so repeat requests skip both verification and the users lookup.
+# Entries are never invalidated: a user soft-deleted (or changed) after their token
+# was cached keeps the cached view for up to AUTH_CACHE_TTL, in every worker.
+auth_cache = LRUTTLCache(
+    max_entries=getattr(settings, "AUTH_CACHE_MAX_ENTRIES", 10000),
+    ttl=getattr(settings, "AUTH_CACHE_TTL", 60),
+)
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: after ``threshold`` failures the call is skipped
+    for ``cooldown`` seconds, then a single trial call decides whether to close again."""
+
+    def __init__(self, threshold: int = 5, cooldown: float = 30.0, clock=time.monotonic):
+        self.threshold = max(int(threshold), 1)
+        self.cooldown = float(cooldown)
+        self._clock = clock
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if self._clock() - self._opened_at >= self.cooldown:
+                return "half_open"
+            return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._clock() - self._opened_at < self.cooldown or self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._opened_at is not None or self._failures >= self.threshold:
+                self._opened_at = self._clock()
+
+
+# Keep-alive connection pool to AUTH_VERIFY_URL shared across requests/threads
+_verify_session = requests.Session()
+_verify_session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=getattr(settings, "AUTH_VERIFY_POOL_SIZE", 20)))
+_verify_session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=getattr(settings, "AUTH_VERIFY_POOL_SIZE", 20)))
+
+# Async counterpart of _verify_session, one per event loop: loop -> httpx.AsyncClient
+_async_verify_clients = weakref.WeakKeyDictionary()
+
+
+def _async_verify_client():
+    loop = asyncio.get_running_loop()
+    client = _async_verify_clients.get(loop)
+    if client is None:
+        # Like the requests pool: keep AUTH_VERIFY_POOL_SIZE connections alive, never block for one
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=getattr(settings, "AUTH_VERIFY_POOL_SIZE", 20))
+        client = _async_verify_clients[loop] = httpx.AsyncClient(limits=limits)
+    return client
+
+
+verify_breaker = CircuitBreaker(
+    threshold=getattr(settings, "AUTH_BREAKER_THRESHOLD", 5),
+    cooldown=getattr(settings, "AUTH_BREAKER_COOLDOWN", 30),
+)
+
+
+def _local_key_configured() -> bool:
+    return bool(getattr(settings, "JWT_SECRET", None) or getattr(settings, "JWT_PUBLIC_KEY", None))
+
+
+def verify_order() -> list:
+    """Verifier names in the order they are tried: settings.AUTH_VERIFY_ORDER if set,
+    otherwise local JWT first whenever a secret or public key is configured."""
+    configured = getattr(settings, "AUTH_VERIFY_ORDER", None)
+    if configured:
+        if isinstance(configured, str):
+            configured = configured.split(",")
+        return [v.strip().lower() for v in configured if v and v.strip().lower() in ("local", "external")]
+    return ["local", "external"] if _local_key_configured() else ["external", "local"]
+
+
+def _token_key(token: str) -> str:
+    # Never keep raw bearer tokens in memory longer than the request needs them
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def _token_ttl(token: str) -> Optional[float]:
+    """Seconds until the token's ``exp`` claim, or None if it carries none."""
+    try:
+        payload = jwt.decode(token, options={"verify_signature": False})
+    except Exception:
+        return None
+    exp = payload.get("exp") if isinstance(payload, dict) else None
+    if exp is None:
+        return None
+    try:
+        return float(exp) - time.time()
+    except (TypeError, ValueError):
+        return None
 
 
 class ExternalAuthMiddleware(MiddlewareMixin):
@@ -17,6 +146,13 @@ class ExternalAuthMiddleware(MiddlewareMixin):
         request.auth_user = {"id": str, "email": str}
         request.mongodb_user = user document from Mongo (db.users)
     - On failure, returns 401 JSON
+    The verifier order comes from verify_order(); calls to AUTH_VERIFY_URL reuse a
+    pooled session and are skipped while ``verify_breaker`` is open.
+    Under ASGI the middleware runs natively async (``__acall__``): the verifier is
+    called with httpx and the user is loaded with the async Mongo driver, each
+    falling back to the sync code in a worker thread when unavailable.
+    Successful verifications are cached (see ``auth_cache``) until the sooner of
+    settings.AUTH_CACHE_TTL and the token's ``exp`` claim.
     """
 
     def _extract_bearer(self, request) -> Optional[str]:
@@ -27,28 +163,61 @@ class ExternalAuthMiddleware(MiddlewareMixin):
 
     def _verify_external(self, token: str) -> Optional[dict]:
         url = getattr(settings, "AUTH_VERIFY_URL", None)
-        if not url:
+        if not url or not verify_breaker.allow():
             return None
         try:
             # Send token as Bearer, or you can post json {token: ...}
-            resp = requests.get(
+            resp = _verify_session.get(
                 url,
                 headers={"Authorization": f"Bearer {token}", "Accept": "application/json"},
-                timeout=5,
+                timeout=getattr(settings, "AUTH_VERIFY_TIMEOUT", 5),
             )
-            if resp.status_code != 200:
-                return None
-            data = resp.json()
-            if not isinstance(data, dict) or not data.get("id"):
-                return None
-            return {"id": str(data.get("id")), "email": data.get("email")}
-        except requests.Timeout:
+        except Exception:
+            # Timeouts and connection errors count against the verifier
+            verify_breaker.record_failure()
             return None
+        return self._external_verdict(resp)
+
+    async def _averify_external(self, token: str) -> Optional[dict]:
+        if httpx is None:
+            return await sync_to_async(self._verify_external, thread_sensitive=False)(token)
+        url = getattr(settings, "AUTH_VERIFY_URL", None)
+        if not url or not verify_breaker.allow():
+            return None
+        try:
+            resp = await _async_verify_client().get(
+                url,
+                headers={"Authorization": f"Bearer {token}", "Accept": "application/json"},
+                timeout=getattr(settings, "AUTH_VERIFY_TIMEOUT", 5),
+            )
+        except Exception:
+            verify_breaker.record_failure()
+            return None
+        return self._external_verdict(resp)
+
+    def _external_verdict(self, resp) -> Optional[dict]:
+        """User info from a verifier response (requests or httpx), updating the breaker."""
+        if resp.status_code >= 500:
+            verify_breaker.record_failure()
+            return None
+        # The verifier answered; a 401/403 is a verdict on the token, not an outage
+        verify_breaker.record_success()
+        if resp.status_code != 200:
+            return None
+        try:
+            data = resp.json()
         except Exception:
             return None
+        if not isinstance(data, dict) or not data.get("id"):
+            return None
+        return {"id": str(data.get("id")), "email": data.get("email")}
 
     def _verify_local_jwt(self, token: str) -> Optional[dict]:
-        secret = getattr(settings, "JWT_SECRET", None) or getattr(settings, "SECRET_KEY", None)
+        secret = (
+            getattr(settings, "JWT_PUBLIC_KEY", None)
+            or getattr(settings, "JWT_SECRET", None)
+            or getattr(settings, "SECRET_KEY", None)
+        )
         alg = getattr(settings, "JWT_ALGORITHM", "HS256")
         if not secret:
             return None
@@ -62,37 +231,103 @@ class ExternalAuthMiddleware(MiddlewareMixin):
         except Exception:
             return None
 
-    def _get_mongo_user(self, user_id: str) -> Optional[dict]:
+    def _verify_token(self, token: str) -> Optional[dict]:
+        verifiers = {"local": self._verify_local_jwt, "external": self._verify_external}
+        for name in verify_order():
+            t0 = time.perf_counter()
+            user_info = verifiers[name](token)
+            metrics.observe_auth(name, bool(user_info), time.perf_counter() - t0)
+            if user_info:
+                return user_info
+        return None
+
+    async def _averify_token(self, token: str) -> Optional[dict]:
+        for name in verify_order():
+            t0 = time.perf_counter()
+            if name == "local":
+                user_info = self._verify_local_jwt(token)
+            else:
+                user_info = await self._averify_external(token)
+            metrics.observe_auth(name, bool(user_info), time.perf_counter() - t0)
+            if user_info:
+                return user_info
+        return None
+
+    def _users_db_name(self) -> Optional[str]:
         mongo_uri = getattr(settings, "MONGO_URI", None) or getattr(settings, "MONGODB_URI", None)
         mongo_db = getattr(settings, "MONGO_DB_NAME", None) or getattr(settings, "MONGODB_DB", None)
-        if not mongo_uri or not mongo_db:
+        return mongo_db if mongo_uri and mongo_db else None
+
+    def _get_mongo_user(self, user_id: str) -> Optional[dict]:
+        mongo_db = self._users_db_name()
+        if not mongo_db:
             return None
-        client = MongoClient(mongo_uri)
-        db = client[mongo_db]
+        db = get_client()[mongo_db]
         # Assuming user documents store id under field "id" (string UUID)
         # If your schema uses _id, adapt accordingly.
         doc = db.users.find_one({"id": user_id, "is_deleted": {"$ne": True}})
         return doc
 
-    def process_request(self, request):
+    async def _aget_mongo_user(self, user_id: str) -> Optional[dict]:
+        mongo_db = self._users_db_name()
+        if not mongo_db:
+            return None
+        client = get_async_client()
+        if client is None:
+            return await sync_to_async(self._get_mongo_user, thread_sensitive=False)(user_id)
+        return await client[mongo_db].users.find_one({"id": user_id, "is_deleted": {"$ne": True}})
+
+    def _begin(self, request):
+        """(response, token): a response ends the request, a token still needs verifying,
+        and (None, None) lets the request through (exempt path or cached token)."""
         path = request.path or ""
         # Bypass auth for auth endpoints and health/admin
-        if path.startswith("/api/auth/") or path.startswith("/health") or path.startswith("/admin"):
-            return None
+        if path.startswith("/api/auth/") or path.startswith("/health") or path.startswith("/admin") or path == "/metrics":
+            return None, None
 
         token = self._extract_bearer(request)
         if not token:
+            return JsonResponse({"error": "Unauthorized"}, status=401), None
+
+        cached = auth_cache.get(_token_key(token))
+        if cached is not None:
+            request.auth_user, request.mongodb_user = cached
+            return None, None
+        return None, token
+
+    def _attach(self, request, token: str, user_info: dict, user_doc: Optional[dict]):
+        if not user_doc:
             return JsonResponse({"error": "Unauthorized"}, status=401)
+        auth_cache.set(_token_key(token), (user_info, user_doc), ttl=_token_ttl(token))
+        request.mongodb_user = user_doc
+        return None
+
+    def process_request(self, request):
+        response, token = self._begin(request)
+        if token is None:
+            return response
 
-        # Try external verify; fallback to local JWT
-        user_info = self._verify_external(token) or self._verify_local_jwt(token)
+        user_info = self._verify_token(token)
         if not user_info:
             return JsonResponse({"error": "Unauthorized"}, status=401)
 
         request.auth_user = user_info
-        user_doc = self._get_mongo_user(user_info.get("id"))
-        if not user_doc:
+        return self._attach(request, token, user_info, self._get_mongo_user(user_info.get("id")))
+
+    async def aprocess_request(self, request):
+        response, token = self._begin(request)
+        if token is None:
+            return response
+
+        user_info = await self._averify_token(token)
+        if not user_info:
             return JsonResponse({"error": "Unauthorized"}, status=401)
 
-        request.mongodb_user = user_doc
-        return None
+        request.auth_user = user_info
+        return self._attach(request, token, user_info, await self._aget_mongo_user(user_info.get("id")))
+
+    async def __acall__(self, request):
+        # MiddlewareMixin would run process_request in the single sync thread;
+        # verifying natively keeps slow verifier calls from serializing requests
+        response = await self.aprocess_request(request)
+        return response or await self.get_response(request)
@@ -0,0 +1,40 @@
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.core.exceptions import MiddlewareNotUsed
+from core import metrics
+
+
+class MetricsMiddleware:
+    """
+    Records latency, status and response size per route, and the Mongo commands
+    each request issued (see core/metrics.py). List it first in MIDDLEWARE so the
+    timing covers the auth middleware too. Works under WSGI and ASGI; removed
+    entirely when settings.METRICS_ENABLED is off.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not metrics.enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = metrics.begin()
+        t0 = time.perf_counter()
+        response = self.get_response(request)
+        metrics.finish(token, request, response, time.perf_counter() - t0)
+        return response
+
+    async def __acall__(self, request):
+        token = metrics.begin()
+        t0 = time.perf_counter()
+        response = await self.get_response(request)
+        metrics.finish(token, request, response, time.perf_counter() - t0)
+        return response
@@ -0,0 +1,38 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from core.query_audit import capture, check_request
+
+
+class QueryAuditMiddleware:
+    """
+    Dev/staging only (settings.QUERY_AUDIT): records the Mongo commands of each
+    request, so slow ones are logged with the calling view and shapes repeated past
+    QUERY_REPEAT_LIMIT are reported as N+1 (see core/query_audit.py). Removed
+    entirely when QUERY_AUDIT is off.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, "QUERY_AUDIT", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        with capture(request) as log:
+            response = self.get_response(request)
+        check_request(log)
+        return response
+
+    async def __acall__(self, request):
+        with capture(request) as log:
+            response = await self.get_response(request)
+        check_request(log)
+        return response
@@ -1,27 +1,161 @@
+import asyncio
+import os
+import threading
+import weakref
 from pymongo import MongoClient
+from pymongo.errors import OperationFailure
+from pymongo.read_preferences import make_read_preference, read_pref_mode_from_name
 from django.conf import settings
+from core import metrics, query_audit
 
-_client = None
-_db = None
+try:
+    from pymongo import AsyncMongoClient
+except ImportError:  # PyMongo < 4.13: async views run the sync driver in threads instead
+    AsyncMongoClient = None
 
+# Process-local handle caches. Keyed by handle name (see settings.MONGODB_HANDLES);
+# "default" is the read/write primary handle used by the views.
+_clients = {}
+_dbs = {}
+_pid = os.getpid()
+_lock = threading.Lock()
+# Async clients are bound to the event loop that created them: loop -> {name: client}
+_async_clients = weakref.WeakKeyDictionary()
 
-def get_client():
-    global _client
-    if _client is not None:
-        return _client
-    uri = settings.MONGODB_URI
+
+def _reset_after_fork():
+    """Forget clients inherited from the parent; the child builds its own on first use."""
+    global _pid
+    _clients.clear()
+    _dbs.clear()
+    _async_clients.clear()
+    _pid = os.getpid()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _check_pid():
+    # Belt and braces for fork paths that bypass register_at_fork hooks
+    if os.getpid() != _pid:
+        _reset_after_fork()
+
+
+def _handle_config(name: str) -> dict:
+    handles = getattr(settings, "MONGODB_HANDLES", None) or {}
+    if name != "default" and name not in handles:
+        raise RuntimeError(f"Unknown Mongo handle '{name}'; declare it in settings.MONGODB_HANDLES")
+    return handles.get(name) or {}
+
+
+def _client_options() -> dict:
+    opts = {
+        "maxPoolSize": getattr(settings, "MONGODB_MAX_POOL_SIZE", 100),
+        "minPoolSize": getattr(settings, "MONGODB_MIN_POOL_SIZE", 0),
+    }
+    wait_ms = getattr(settings, "MONGODB_WAIT_QUEUE_TIMEOUT_MS", None)
+    if wait_ms:
+        opts["waitQueueTimeoutMS"] = wait_ms
+    compressors = getattr(settings, "MONGODB_COMPRESSORS", "")
+    if compressors:
+        opts["compressors"] = compressors
+    read_pref = getattr(settings, "MONGODB_READ_PREFERENCE", "")
+    if read_pref:
+        opts["readPreference"] = read_pref
+    # Shapes commands for the slow-query log and query budgets; idle unless one is active
+    opts["event_listeners"] = [query_audit.command_listener]
+    if metrics.enabled():
+        # Attributes command counts/latency to the request that issued them (/metrics)
+        opts["event_listeners"].append(metrics.command_listener)
+    return opts
+
+
+def _uri(cfg: dict) -> str:
+    uri = cfg.get("uri") or settings.MONGODB_URI
     if not uri:
         raise RuntimeError("MONGODB_URI must be set in settings/.env for Mongo access")
-    _client = MongoClient(uri)
-    return _client
+    return uri
 
 
-def get_db():
-    global _db
-    if _db is not None:
-        return _db
+def _database_args(name: str):
+    """(database name, get_database kwargs) for a named handle."""
     dbname = settings.MONGODB_DB
     if not dbname:
         raise RuntimeError("MONGODB_DB must be set in settings/.env for Mongo access")
-    _db = get_client()[dbname]
-    return _db
+    cfg = _handle_config(name)
+    kwargs = {}
+    if cfg.get("read_preference"):
+        kwargs["read_preference"] = make_read_preference(read_pref_mode_from_name(cfg["read_preference"]), None)
+    return cfg.get("db") or dbname, kwargs
+
+
+def get_client(name: str = "default"):
+    _check_pid()
+    client = _clients.get(name)
+    if client is not None:
+        return client
+    cfg = _handle_config(name)
+    if name != "default" and not cfg.get("uri"):
+        # Handles without their own URI share the default client's connection pool
+        client = get_client("default")
+        _clients[name] = client
+        return client
+    uri = _uri(cfg)
+    with _lock:
+        client = _clients.get(name)
+        if client is None:
+            client = MongoClient(uri, **{**_client_options(), **cfg.get("options", {})})
+            _clients[name] = client
+    return client
+
+
+def get_db(name: str = "default"):
+    """Database handle for a named connection. Named handles may override
+    ``read_preference`` (e.g. the "analytics" handle reads from secondaries)."""
+    _check_pid()
+    db = _dbs.get(name)
+    if db is not None:
+        return db
+    dbname, kwargs = _database_args(name)
+    db = get_client(name).get_database(dbname, **kwargs)
+    _dbs[name] = db
+    return db
+
+
+def get_async_client(name: str = "default"):
+    """AsyncMongoClient for the running event loop, or None without PyMongo's async API."""
+    if AsyncMongoClient is None:
+        return None
+    _check_pid()
+    clients = _async_clients.setdefault(asyncio.get_running_loop(), {})
+    client = clients.get(name)
+    if client is None:
+        cfg = _handle_config(name)
+        if name != "default" and not cfg.get("uri"):
+            client = get_async_client("default")
+        else:
+            client = AsyncMongoClient(_uri(cfg), **{**_client_options(), **cfg.get("options", {})})
+        clients[name] = client
+    return client
+
+
+def get_async_db(name: str = "default"):
+    """Async counterpart of get_db(); None when the async driver is unavailable."""
+    client = get_async_client(name)
+    if client is None:
+        return None
+    dbname, kwargs = _database_args(name)
+    return client.get_database(dbname, **kwargs)
+
+
+def run_in_transaction(fn):
+    """Run ``fn(session)`` inside a transaction on the default client. Standalone
+    servers cannot run transactions; there ``fn(None)`` runs without one."""
+    try:
+        with get_client().start_session() as session:
+            return session.with_transaction(fn)
+    except OperationFailure as exc:
+        if exc.code != 20:  # IllegalOperation: standalone server, no transactions
+            raise
+    return fn(None)
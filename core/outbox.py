@@ -0,0 +1,169 @@
+"""Transactional outbox for side effects that should not run inside the request.
+
+Write paths insert their entity and an ``outbox`` event together (in one session
+transaction where the cluster supports it). ``manage.py run_outbox_worker`` claims
+pending events in batches under a lease, applies them idempotently and retries
+failures with exponential backoff.
+"""
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+from django.conf import settings
+from .gamelogic import award_xp_events
+from .mongo import get_db, run_in_transaction
+
+COLLECTION = "outbox"
+
+PENDING = "pending"
+PROCESSING = "processing"
+DONE = "done"
+DEAD = "dead"
+
+AWARD_XP = "award_xp"
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def enabled() -> bool:
+    return getattr(settings, "XP_OUTBOX_ENABLED", False)
+
+
+def make_event(event_type: str, user_id: str, payload: Dict, entity_type: str | None = None, entity_id: str | None = None) -> Dict:
+    now = _now()
+    return {
+        "id": str(uuid.uuid4()),
+        "type": event_type,
+        "user_id": user_id,
+        "payload": payload,
+        "entity_type": entity_type,
+        "entity_id": entity_id,
+        "status": PENDING,
+        "attempts": 0,
+        "available_at": now,
+        "lease_owner": None,
+        "lease_until": None,
+        "last_error": None,
+        "created_at": now,
+        "processed_at": None,
+    }
+
+
+def award_event(user_id: str, reason: str, xp_amount: int, counters: Dict | None = None, entity_type=None, entity_id=None) -> Dict:
+    return make_event(
+        AWARD_XP,
+        user_id,
+        {"reason": reason, "xp_amount": int(xp_amount), "counters": counters or {}},
+        entity_type=entity_type,
+        entity_id=entity_id,
+    )
+
+
+def pending_marker(event: Dict) -> Dict:
+    """What a request returns in place of the synchronous award result."""
+    return {"status": "pending", "event_id": event["id"], "xp_awarded": event["payload"].get("xp_amount")}
+
+
+def insert_with_events(coll, doc: Dict, events: List[Dict]) -> None:
+    """Insert ``doc`` and its outbox events atomically when transactions are available."""
+    outbox = get_db()[COLLECTION]
+
+    def write(session):
+        coll.insert_one(doc, session=session)
+        if events:
+            outbox.insert_many(events, session=session)
+
+    run_in_transaction(write)
+
+
+def enqueue(events: Iterable[Dict], session=None) -> None:
+    events = list(events)
+    if events:
+        get_db()[COLLECTION].insert_many(events, session=session)
+
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def claim(owner: str, batch: int, lease_seconds: float) -> List[Dict]:
+    """Lease up to ``batch`` due events (pending, or processing with an expired lease) to ``owner``."""
+    coll = get_db()[COLLECTION]
+    now = _now()
+    due = {"$or": [
+        {"status": PENDING, "available_at": {"$lte": now}},
+        {"status": PROCESSING, "lease_until": {"$lt": now}},
+    ]}
+    ids = [d["id"] for d in coll.find(due, {"_id": 0, "id": 1}).sort("available_at", 1).limit(batch)]
+    if not ids:
+        return []
+    # Re-check the predicate so concurrent workers cannot both take an event
+    coll.update_many(
+        {"id": {"$in": ids}, **due},
+        {"$set": {"status": PROCESSING, "lease_owner": owner, "lease_until": now + timedelta(seconds=lease_seconds)}},
+    )
+    return list(coll.find({"id": {"$in": ids}, "lease_owner": owner, "status": PROCESSING}))
+
+
+def _handle_award_events(user_id: str, events: List[Dict]) -> None:
+    award_xp_events(user_id, [{"id": e["id"], **(e.get("payload") or {})} for e in events])
+
+
+# event type -> handler(user_id, events); handlers must be idempotent per event id
+HANDLERS = {
+    AWARD_XP: _handle_award_events,
+}
+
+
+def process(events: List[Dict], max_attempts: int = 8) -> Dict:
+    """Apply claimed events grouped by (type, user). Returns counts of done/retried/dead."""
+    coll = get_db()[COLLECTION]
+    groups: Dict[tuple, List[Dict]] = {}
+    for e in events:
+        groups.setdefault((e.get("type"), e.get("user_id")), []).append(e)
+    stats = {"done": 0, "retried": 0, "dead": 0}
+    done_ids: List[str] = []
+    for (event_type, user_id), group in groups.items():
+        handler = HANDLERS.get(event_type)
+        try:
+            if handler is None:
+                raise RuntimeError(f"no handler for outbox event type {event_type!r}")
+            handler(user_id, group)
+            done_ids.extend(e["id"] for e in group)
+        except Exception as exc:
+            for e in group:
+                attempts = int(e.get("attempts") or 0) + 1
+                dead = attempts >= max_attempts
+                coll.update_one({"id": e["id"]}, {"$set": {
+                    "status": DEAD if dead else PENDING,
+                    "attempts": attempts,
+                    "available_at": _now() + timedelta(seconds=min(2 ** attempts, 300)),
+                    "lease_owner": None,
+                    "lease_until": None,
+                    "last_error": str(exc)[:500],
+                }})
+                stats["dead" if dead else "retried"] += 1
+    if done_ids:
+        coll.update_many(
+            {"id": {"$in": done_ids}},
+            {"$set": {"status": DONE, "processed_at": _now(), "lease_owner": None, "lease_until": None}},
+        )
+        stats["done"] = len(done_ids)
+    return stats
+
+
+def drain(owner: Optional[str] = None, batch: int = 500, lease_seconds: float = 60, max_attempts: int = 8) -> Dict:
+    """Process batches until nothing is due. Returns cumulative counts."""
+    owner = owner or worker_id()
+    totals = {"done": 0, "retried": 0, "dead": 0, "batches": 0}
+    while True:
+        events = claim(owner, batch, lease_seconds)
+        if not events:
+            return totals
+        stats = process(events, max_attempts=max_attempts)
+        totals["batches"] += 1
+        for k, v in stats.items():
+            totals[k] += v
@@ -0,0 +1,194 @@
+"""Slow-query log and N+1 detector for Mongo access (dev/staging, and tests).
+
+Every command a client built by core.mongo sends is reduced to a *shape*: the
+command, the collection and its filter with the values replaced by "?", e.g.
+``find recurring_rules {"id": "?", "is_deleted": {"$ne": "?"}}``. The same code
+path always produces the same shape, so one request sending a shape many times
+is a query in a loop (N+1).
+
+With QUERY_AUDIT on, QueryAuditMiddleware records each request's commands, logs
+commands slower than QUERY_SLOW_MS with their shape and calling view, and warns
+(or with QUERY_AUDIT_RAISE, raises) when a shape repeats more than
+QUERY_REPEAT_LIMIT times in one request. Tests pin per-endpoint budgets with the
+same recording::
+
+    with query_budget(max_queries=8, max_repeats=1):
+        self.client.post("/api/recurring/run-due/", ...)
+"""
+import json
+import logging
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import NamedTuple, Optional
+from django.conf import settings
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+# Driver and session housekeeping: not queries the code chose to send
+IGNORED = {
+    "hello", "isMaster", "ismaster", "ping", "buildInfo", "saslStart", "saslContinue", "endSessions",
+    "getMore", "killCursors", "commitTransaction", "abortTransaction",
+}
+
+# Where each command keeps its filter; update/delete hold statements in a list
+_FILTERS = {
+    "find": "filter", "count": "query", "distinct": "query", "findAndModify": "query",
+    "update": ("updates", "q"), "delete": ("deletes", "q"),
+}
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class Query(NamedTuple):
+    command: str
+    collection: str
+    shape: str
+
+
+def _shape(value):
+    if isinstance(value, dict):
+        return {k: _shape(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)) and any(isinstance(v, dict) for v in value):
+        # $and/$or clauses keep their structure; lists of values ($in) do not
+        return [_shape(v) for v in value]
+    return "?"
+
+
+def _filter_of(name: str, command: dict):
+    if name == "aggregate":
+        # Stage names, with the $match filters shaped
+        return [
+            {"$match": _shape(stage["$match"])} if "$match" in stage else next(iter(stage), "?")
+            for stage in command.get("pipeline") or []
+        ]
+    where = _FILTERS.get(name)
+    if where is None:
+        return None
+    if isinstance(where, tuple):
+        statements = command.get(where[0]) or [{}]
+        return _shape(statements[0].get(where[1]) or {})
+    return _shape(command.get(where) or {})
+
+
+def describe(name: str, command: dict) -> Query:
+    collection = command.get(name)
+    if not isinstance(collection, str):
+        collection = command.get("collection") or "-"
+    flt = _filter_of(name, command)
+    shape = f"{name} {collection}" if flt is None else f"{name} {collection} {json.dumps(flt, default=str)}"
+    return Query(name, collection, shape)
+
+
+class QueryLog:
+    """Commands recorded while a capture() is active (from any thread or task sharing its context)."""
+
+    def __init__(self, request=None):
+        self.request = request
+        self.queries = []
+        self._lock = threading.Lock()
+
+    def add(self, query: Query) -> None:
+        with self._lock:
+            self.queries.append(query)
+
+    @property
+    def view(self) -> str:
+        match = getattr(self.request, "resolver_match", None)
+        if match is not None:
+            return match.view_name
+        return getattr(self.request, "path", None) or "-"
+
+    def __len__(self) -> int:
+        return len(self.queries)
+
+    def repeats(self) -> Counter:
+        return Counter(q.shape for q in self.queries)
+
+    def problems(self, max_queries: Optional[int] = None, max_repeats: Optional[int] = None) -> list:
+        out = []
+        if max_queries is not None and len(self.queries) > max_queries:
+            out.append(f"{len(self.queries)} Mongo commands (budget {max_queries}):")
+            out.extend(f"  {q.shape}" for q in self.queries)
+        if max_repeats is not None:
+            for shape, n in self.repeats().most_common():
+                if n <= max_repeats:
+                    break
+                out.append(f"{n} x {shape} (limit {max_repeats}; a query inside a loop?)")
+        return out
+
+
+_logs = ContextVar("query_logs", default=())
+# (connection, request id) -> (command, started query or None, QueryLogs) until the reply arrives
+_pending = {}
+
+
+def _slow_ms() -> float:
+    return getattr(settings, "QUERY_SLOW_MS", 100) if getattr(settings, "QUERY_AUDIT", False) else 0
+
+
+class CommandListener(monitoring.CommandListener):
+    def started(self, event):
+        logs = _logs.get()
+        if not logs and not _slow_ms():
+            return
+        name = event.command_name
+        query = None
+        if logs and name not in IGNORED:
+            query = describe(name, event.command)
+            for log in logs:
+                log.add(query)
+        _pending[(event.connection_id, event.request_id)] = (event.command, query, logs)
+
+    def succeeded(self, event):
+        started = _pending.pop((event.connection_id, event.request_id), None)
+        threshold = _slow_ms()
+        if started is None or not threshold or event.duration_micros < threshold * 1000:
+            return
+        command, query, logs = started
+        query = query or describe(event.command_name, command)
+        view = next((log.view for log in reversed(logs) if log.request is not None), "-")
+        logger.warning("slow Mongo command: %.1f ms in %s: %s", event.duration_micros / 1000, view, query.shape)
+
+    def failed(self, event):
+        self.succeeded(event)
+
+
+command_listener = CommandListener()
+
+
+@contextmanager
+def capture(request=None):
+    """Record the Mongo commands sent inside the block into the yielded QueryLog."""
+    log = QueryLog(request)
+    token = _logs.set(_logs.get() + (log,))
+    try:
+        yield log
+    finally:
+        _logs.reset(token)
+
+
+@contextmanager
+def query_budget(max_queries: Optional[int] = None, max_repeats: Optional[int] = None):
+    """Test helper: fail with QueryBudgetExceeded (an AssertionError) when the block sends more
+    than ``max_queries`` Mongo commands, or any one shape more than ``max_repeats`` times."""
+    with capture() as log:
+        yield log
+    problems = log.problems(max_queries, max_repeats)
+    if problems:
+        raise QueryBudgetExceeded("\n".join(problems))
+
+
+def check_request(log: QueryLog) -> None:
+    """Warn about (or, with QUERY_AUDIT_RAISE, raise on) shapes repeated past QUERY_REPEAT_LIMIT."""
+    problems = log.problems(max_repeats=getattr(settings, "QUERY_REPEAT_LIMIT", 10))
+    if not problems:
+        return
+    message = f"N+1 Mongo access in {log.view}:\n" + "\n".join(problems)
+    if getattr(settings, "QUERY_AUDIT_RAISE", False):
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
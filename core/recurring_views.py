@@ -1,11 +1,15 @@
 import json
 import uuid
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, timezone
 from typing import Optional
-from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_GET, require_POST
-from .mongo import get_db
+from .renderers import FastJsonResponse
+from .mongo import get_db, run_in_transaction
+from . import dataversion
+from .outbox import worker_id
+from .cadence import CADENCES, aware, next_after
+from .scheduler import RECURRING, SAVINGS, apply_savings, insert_transactions, plan_recurring, run_due, transaction_doc
 
 
 def _now():
@@ -19,34 +23,14 @@ def _get_user_id(request) -> Optional[str]:
     return request.headers.get("X-User-Id")
 
 
-def _advance_next_run(cadence: str, dt: datetime) -> datetime:
-    cadence = (cadence or "").lower()
-    if cadence == "daily":
-        return dt + timedelta(days=1)
-    if cadence == "weekly":
-        return dt + timedelta(weeks=1)
-    if cadence == "monthly":
-        # naive monthly add ~30 days
-        return dt + timedelta(days=30)
-    return dt + timedelta(days=7)
-
-
 @require_GET
 def list_recurring(request):
     user_id = _get_user_id(request)
     if not user_id:
-        return JsonResponse({"error": "Unauthorized"}, status=401)
+        return FastJsonResponse({"error": "Unauthorized"}, status=401)
     db = get_db()
-    rules = list(db["recurring_rules"].find({"user_id": user_id, "is_deleted": {"$ne": True}}))
-    for r in rules:
-        r.pop("_id", None)
-        r["id"] = r.get("id")
-        # Convert datetimes to ISO
-        for k in ("next_run", "created_at", "updated_at"):
-            v = r.get(k)
-            if isinstance(v, datetime):
-                r[k] = v.isoformat()
-    return JsonResponse({"items": rules})
+    rules = list(db["recurring_rules"].find({"user_id": user_id, "is_deleted": {"$ne": True}}, {"_id": 0}))
+    return FastJsonResponse({"items": rules})
 
 
 @csrf_exempt
@@ -54,7 +38,7 @@ def list_recurring(request):
 def create_recurring(request):
     user_id = _get_user_id(request)
     if not user_id:
-        return JsonResponse({"error": "Unauthorized"}, status=401)
+        return FastJsonResponse({"error": "Unauthorized"}, status=401)
     try:
         body = json.loads(request.body or b"{}")
         name = (body.get("name") or "").strip() or "Recurring"
@@ -65,7 +49,9 @@ def create_recurring(request):
         cadence = (body.get("cadence") or "monthly").lower()
         tx_type = (body.get("type") or "expense").lower()
         if amount <= 0:
-            return JsonResponse({"error": "amount must be > 0"}, status=400)
+            return FastJsonResponse({"error": "amount must be > 0"}, status=400)
+        if cadence not in CADENCES:
+            return FastJsonResponse({"error": f"cadence must be one of {', '.join(CADENCES)}"}, status=400)
         now = _now()
         rule = {
             "id": str(uuid.uuid4()),
@@ -78,6 +64,8 @@ def create_recurring(request):
             "type": tx_type,
             "cadence": cadence,
             "next_run": now,
+            # monthly/yearly runs stay on this day of the month (clamped for short months)
+            "anchor_day": now.day,
             "active": True,
             "created_at": now,
             "updated_at": now,
@@ -85,34 +73,19 @@ def create_recurring(request):
         }
         db = get_db()
         db["recurring_rules"].insert_one(rule)
+        dataversion.bump(user_id)
         rule.pop("_id", None)
-        # serialize datetime
-        rule["next_run"] = rule["next_run"].isoformat()
-        rule["created_at"] = rule["created_at"].isoformat()
-        rule["updated_at"] = rule["updated_at"].isoformat()
-        return JsonResponse(rule, status=201)
+        return FastJsonResponse(rule, status=201)
     except Exception as e:
-        return JsonResponse({"error": f"create_failed: {e}"}, status=400)
+        return FastJsonResponse({"error": f"create_failed: {e}"}, status=400)
 
 
-def _create_transaction(db, user_id: str, tx):
-    now = _now()
-    doc = {
-        "id": str(uuid.uuid4()),
-        "user_id": user_id,
-        "type": (tx.get("type") or "expense").lower(),
-        "amount": float(tx.get("amount") or 0),
-        "currency": (tx.get("currency") or "USD").upper(),
-        "category": tx.get("category"),
-        "description": tx.get("description"),
-        "occurred_at": now,
-        "created_at": now,
-        "updated_at": now,
-        "is_deleted": False,
-    }
-    db["transactions"].insert_one(doc)
-    doc.pop("_id", None)
-    return doc
+def _manual_period(doc, cadence: Optional[str], now: datetime):
+    """(occurrence a manual run fills, next_run after it). Run Now fires the schedule's
+    pending occurrence early and moves the schedule past it, so the calendar run of that
+    occurrence finds it done (same key as the scheduler's) instead of firing again."""
+    period = aware(doc.get("next_run") or now)
+    return period, next_after(doc, cadence, max(aware(now), period))
 
 
 @csrf_exempt
@@ -120,18 +93,54 @@ def _create_transaction(db, user_id: str, tx):
 def run_now_recurring(request, rid: str):
     user_id = _get_user_id(request)
     if not user_id:
-        return JsonResponse({"error": "Unauthorized"}, status=401)
+        return FastJsonResponse({"error": "Unauthorized"}, status=401)
     db = get_db()
     rule = db["recurring_rules"].find_one({"id": rid, "user_id": user_id, "is_deleted": {"$ne": True}})
     if not rule:
-        return JsonResponse({"error": "Not found"}, status=404)
+        return FastJsonResponse({"error": "Not found"}, status=404)
     if not rule.get("active", True):
-        return JsonResponse({"error": "Rule inactive"}, status=400)
-    tx = _create_transaction(db, user_id, rule)
-    next_run = _advance_next_run(rule.get("cadence"), _now())
-    db["recurring_rules"].update_one({"id": rid}, {"$set": {"next_run": next_run, "updated_at": _now()}})
-    tx["occurred_at"] = tx["occurred_at"].isoformat()
-    return JsonResponse({"transaction": tx, "next_run": next_run.isoformat()})
+        return FastJsonResponse({"error": "Rule inactive"}, status=400)
+    now = _now()
+    period, next_run = _manual_period(rule, rule.get("cadence"), now)
+    tx = transaction_doc(user_id, rule, now, rule_id=rid, occurrence=period)
+
+    def write(session):
+        fired = insert_transactions(db, [tx], session=session)
+        if fired:
+            db["recurring_rules"].update_one({"id": rid}, {"$set": {"next_run": next_run, "updated_at": now}}, session=session)
+        return fired
+
+    if not run_in_transaction(write):
+        return FastJsonResponse({"error": "This occurrence has already run", "occurrence": period}, status=409)
+    dataversion.bump(user_id)
+    return FastJsonResponse({"transaction": tx, "next_run": next_run})
+
+
+def _truthy(value) -> bool:
+    return str(value or "").lower() in ("1", "true", "yes")
+
+
+def _preview_due(db, user_id: str):
+    """What run-due would write right now, without claiming or writing anything."""
+    now = _now()
+    rules = list(db["recurring_rules"].find({
+        "user_id": user_id,
+        "is_deleted": {"$ne": True},
+        "active": True,
+        "next_run": {"$lte": now},
+    }, {"_id": 0}))
+    items = [
+        {
+            "id": r["id"],
+            "name": r.get("name"),
+            "cadence": r.get("cadence"),
+            "occurrences": occs,
+            "next_run": next_run,
+            "capped": capped,
+        }
+        for r, occs, next_run, capped in plan_recurring(rules, now)
+    ]
+    return {"dry_run": True, "processed": sum(len(i["occurrences"]) for i in items), "rules": items}
 
 
 @csrf_exempt
@@ -139,23 +148,15 @@ def run_now_recurring(request, rid: str):
 def run_due_recurring(request):
     user_id = _get_user_id(request)
     if not user_id:
-        return JsonResponse({"error": "Unauthorized"}, status=401)
+        return FastJsonResponse({"error": "Unauthorized"}, status=401)
     db = get_db()
-    now = _now()
-    due = list(db["recurring_rules"].find({
-        "user_id": user_id,
-        "is_deleted": {"$ne": True},
-        "active": True,
-        "next_run": {"$lte": now},
-    }))
+    if _truthy(request.GET.get("dry_run")):
+        return FastJsonResponse(_preview_due(db, user_id))
+    # Same lease-based claiming as `manage.py run_scheduler`, scoped to this user
     created = []
-    for r in due:
-        tx = _create_transaction(db, user_id, r)
-        nr = _advance_next_run(r.get("cadence"), now)
-        db["recurring_rules"].update_one({"id": r["id"]}, {"$set": {"next_run": nr, "updated_at": now}})
-        tx["occurred_at"] = tx["occurred_at"].isoformat()
-        created.append(tx)
-    return JsonResponse({"processed": len(created), "transactions": created})
+    for _, txs in run_due(db, RECURRING, worker_id(), user_id=user_id, repeat=False):
+        created.extend(txs)
+    return FastJsonResponse({"processed": len(created), "transactions": created})
 
 
 # Savings Plans
@@ -163,16 +164,10 @@ def run_due_recurring(request):
 def list_savings(request):
     user_id = _get_user_id(request)
     if not user_id:
-        return JsonResponse({"error": "Unauthorized"}, status=401)
+        return FastJsonResponse({"error": "Unauthorized"}, status=401)
     db = get_db()
-    items = list(db["savings_plans"].find({"user_id": user_id, "is_deleted": {"$ne": True}}))
-    for s in items:
-        s.pop("_id", None)
-        for k in ("next_run", "created_at", "updated_at"):
-            v = s.get(k)
-            if isinstance(v, datetime):
-                s[k] = v.isoformat()
-    return JsonResponse({"items": items})
+    items = list(db["savings_plans"].find({"user_id": user_id, "is_deleted": {"$ne": True}}, {"_id": 0}))
+    return FastJsonResponse({"items": items})
 
 
 @csrf_exempt
@@ -180,14 +175,16 @@ def list_savings(request):
 def create_savings(request):
     user_id = _get_user_id(request)
     if not user_id:
-        return JsonResponse({"error": "Unauthorized"}, status=401)
+        return FastJsonResponse({"error": "Unauthorized"}, status=401)
     try:
         body = json.loads(request.body or b"{}")
         goal_id = body.get("goal_id")
         amount_per_interval = float(body.get("amount_per_interval") or 0)
         interval = (body.get("interval") or "monthly").lower()
         if not goal_id or amount_per_interval <= 0:
-            return JsonResponse({"error": "goal_id and positive amount_per_interval required"}, status=400)
+            return FastJsonResponse({"error": "goal_id and positive amount_per_interval required"}, status=400)
+        if interval not in CADENCES:
+            return FastJsonResponse({"error": f"interval must be one of {', '.join(CADENCES)}"}, status=400)
         now = _now()
         s = {
             "id": str(uuid.uuid4()),
@@ -196,6 +193,7 @@ def create_savings(request):
             "amount_per_interval": amount_per_interval,
             "interval": interval,
             "next_run": now,
+            "anchor_day": now.day,
             "active": True,
             "created_at": now,
             "updated_at": now,
@@ -203,20 +201,11 @@ def create_savings(request):
         }
         db = get_db()
         db["savings_plans"].insert_one(s)
+        dataversion.bump(user_id)
         s.pop("_id", None)
-        for k in ("next_run", "created_at", "updated_at"):
-            s[k] = s[k].isoformat()
-        return JsonResponse(s, status=201)
+        return FastJsonResponse(s, status=201)
     except Exception as e:
-        return JsonResponse({"error": f"create_failed: {e}"}, status=400)
-
-
-def _increment_goal(db, user_id: str, goal_id: str, delta: float):
-    now = _now()
-    db["goals"].update_one(
-        {"id": goal_id, "user_id": user_id, "is_deleted": {"$ne": True}},
-        {"$inc": {"current_amount": float(delta)}, "$set": {"updated_at": now}},
-    )
+        return FastJsonResponse({"error": f"create_failed: {e}"}, status=400)
 
 
 @csrf_exempt
@@ -224,17 +213,16 @@ def _increment_goal(db, user_id: str, goal_id: str, delta: float):
 def run_now_savings(request, sid: str):
     user_id = _get_user_id(request)
     if not user_id:
-        return JsonResponse({"error": "Unauthorized"}, status=401)
+        return FastJsonResponse({"error": "Unauthorized"}, status=401)
     db = get_db()
     s = db["savings_plans"].find_one({"id": sid, "user_id": user_id, "is_deleted": {"$ne": True}})
     if not s:
-        return JsonResponse({"error": "Not found"}, status=404)
+        return FastJsonResponse({"error": "Not found"}, status=404)
     if not s.get("active", True):
-        return JsonResponse({"error": "Plan inactive"}, status=400)
-    _increment_goal(db, user_id, s.get("goal_id"), float(s.get("amount_per_interval") or 0))
-    nr = _advance_next_run(s.get("interval"), _now())
-    db["savings_plans"].update_one({"id": sid}, {"$set": {"next_run": nr, "updated_at": _now()}})
-    return JsonResponse({"next_run": nr.isoformat()})
+        return FastJsonResponse({"error": "Plan inactive"}, status=400)
+    period, nr = _manual_period(s, s.get("interval"), _now())
+    apply_savings(db, [s], {sid: nr}, scheduled_for=period)
+    return FastJsonResponse({"next_run": nr})
 
 
 @csrf_exempt
@@ -242,19 +230,7 @@ def run_now_savings(request, sid: str):
 def run_due_savings(request):
     user_id = _get_user_id(request)
     if not user_id:
-        return JsonResponse({"error": "Unauthorized"}, status=401)
+        return FastJsonResponse({"error": "Unauthorized"}, status=401)
     db = get_db()
-    now = _now()
-    due = list(db["savings_plans"].find({
-        "user_id": user_id,
-        "is_deleted": {"$ne": True},
-        "active": True,
-        "next_run": {"$lte": now},
-    }))
-    processed = 0
-    for s in due:
-        _increment_goal(db, user_id, s.get("goal_id"), float(s.get("amount_per_interval") or 0))
-        nr = _advance_next_run(s.get("interval"), now)
-        db["savings_plans"].update_one({"id": s["id"]}, {"$set": {"next_run": nr, "updated_at": now}})
-        processed += 1
-    return JsonResponse({"processed": processed})
+    results = [r for _, r in run_due(db, SAVINGS, worker_id(), user_id=user_id)]
+    return FastJsonResponse({"processed": sum(r["plans"] for r in results), "saved": sum(r["saved"] for r in results)})
@@ -0,0 +1,101 @@
+"""orjson-backed JSON output for DRF viewsets and the plain ``JsonResponse`` views.
+
+datetime, date, UUID and Decimal values serialize without pre-conversion, so
+views can hand Mongo documents over as they come back from pymongo. Datetimes are
+written like ``datetime.isoformat()`` (naive stays naive; DRF responses render UTC
+as ``Z``, matching DRF's encoder), and Decimals are written as strings, like
+DRF's COERCE_DECIMAL_TO_STRING and Django's encoder.
+
+orjson is in requirements.txt. Without it both classes use the stdlib encoder
+with the same type handling, only slower.
+"""
+import datetime
+import json
+import uuid
+from decimal import Decimal
+from django.http import HttpResponse
+from django.utils.encoding import force_str
+from django.utils.functional import Promise
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # requirements.txt installs it; the stdlib fallback is slower
+    orjson = None
+
+try:
+    import numpy as np
+except ImportError:  # only core/forecast.py produces numpy values
+    np = None
+
+
+def _default(obj):
+    """The types views hand over that neither orjson nor the stdlib encoder handle
+    natively. Anything else is a bug in the view and raises TypeError."""
+    if isinstance(obj, Decimal):
+        return str(obj)
+    if isinstance(obj, datetime.timedelta):
+        return str(obj.total_seconds())
+    if isinstance(obj, bytes):
+        return obj.decode()
+    if isinstance(obj, Promise):
+        # Lazy translations in DRF error details
+        return force_str(obj)
+    if np is not None and isinstance(obj, (np.generic, np.ndarray)):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class _StdlibEncoder(json.JSONEncoder):
+    utc_z = False
+
+    def default(self, obj):
+        if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+            value = obj.isoformat()
+            if self.utc_z and value.endswith("+00:00"):
+                value = value[:-6] + "Z"
+            return value
+        if isinstance(obj, uuid.UUID):
+            return str(obj)
+        return _default(obj)
+
+
+class _StdlibEncoderUTCZ(_StdlibEncoder):
+    utc_z = True
+
+
+def dumps(data, utc_z: bool = False, indent: bool = False) -> bytes:
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS
+        if utc_z:
+            option |= orjson.OPT_UTC_Z
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(data, default=_default, option=option)
+    return json.dumps(
+        data,
+        cls=_StdlibEncoderUTCZ if utc_z else _StdlibEncoder,
+        ensure_ascii=False,
+        separators=None if indent else (",", ":"),
+        indent=2 if indent else None,
+    ).encode("utf-8")
+
+
+class FastJSONRenderer(JSONRenderer):
+    """Drop-in for rest_framework.renderers.JSONRenderer."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        return dumps(data, utc_z=True, indent=bool(indent))
+
+
+class FastJsonResponse(HttpResponse):
+    """django.http.JsonResponse with the fast encoder (``encoder``/``json_dumps_params`` are not supported)."""
+
+    def __init__(self, data, safe=True, **kwargs):
+        if safe and not isinstance(data, dict):
+            raise TypeError("In order to allow non-dict objects to be serialized set the safe parameter to False.")
+        kwargs.setdefault("content_type", "application/json")
+        super().__init__(content=dumps(data), **kwargs)
@@ -0,0 +1,188 @@
+"""Versioned response cache and ETags for read-only analytics views.
+
+A response is identified by (user, endpoint, query params, data version, UTC day);
+the day is included because defaults like "this month" and forecasts move with
+the clock. Its ETag is a hash of that identity. A matching ``If-None-Match``
+therefore returns 304 after one version lookup (cached, see core/dataversion.py),
+without running the view or querying Mongo. Bodies are kept in an in-process LRU,
+or in the shared Django cache named by ANALYTICS_CACHE_ALIAS.
+
+Views that combine cacheable parts with uncacheable ones (the dashboard summary)
+cache the parts as values instead, under ``value_key``.
+"""
+import functools
+import hashlib
+from asgiref.sync import iscoroutinefunction
+from datetime import datetime, timezone
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from . import dataversion
+from .cache import LRUTTLCache
+
+_local = LRUTTLCache(
+    max_entries=getattr(settings, "ANALYTICS_CACHE_MAX_ENTRIES", 5000),
+    ttl=getattr(settings, "ANALYTICS_CACHE_TTL", 300),
+)
+
+
+def _ttl() -> int:
+    return int(getattr(settings, "ANALYTICS_CACHE_TTL", 300))
+
+
+def enabled() -> bool:
+    return _ttl() > 0
+
+
+def _etag(user_id: str, endpoint: str, request, version: int) -> str:
+    params = "&".join(f"{k}={v}" for k, values in sorted(request.GET.lists()) for v in values)
+    day = datetime.now(timezone.utc).date().isoformat()
+    raw = f"{user_id}|{endpoint}|{params}|{version}|{day}"
+    return '"' + hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def etag_for(user_id: str, endpoint: str, request) -> str:
+    return _etag(user_id, endpoint, request, dataversion.current(user_id))
+
+
+def _matches(request, etag: str) -> bool:
+    header = request.headers.get("If-None-Match") or ""
+    tags = {t.strip().removeprefix("W/") for t in header.split(",")}
+    return etag in tags or "*" in tags
+
+
+def _get(key: str):
+    shared = dataversion.shared_cache()
+    return shared.get(key) if shared is not None else _local.get(key)
+
+
+def _set(key: str, value) -> None:
+    shared = dataversion.shared_cache()
+    if shared is not None:
+        shared.set(key, value, _ttl())
+    else:
+        _local.set(key, value)
+
+
+async def _aget(key: str):
+    shared = dataversion.shared_cache()
+    return await shared.aget(key) if shared is not None else _local.get(key)
+
+
+async def _aset(key: str, value) -> None:
+    shared = dataversion.shared_cache()
+    if shared is not None:
+        await shared.aset(key, value, _ttl())
+    else:
+        _local.set(key, value)
+
+
+def value_key(user_id: str, name: str, params, version: int) -> str:
+    """Cache key for a value computed from ``params`` (hashed by repr) at data ``version``."""
+    day = datetime.now(timezone.utc).date().isoformat()
+    raw = f"{user_id}|{name}|{params!r}|{version}|{day}"
+    return "fq:val:" + hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+def get_many(keys: dict) -> dict:
+    """{name: value} for the entries of ``keys`` ({name: key}) that are cached."""
+    shared = dataversion.shared_cache()
+    if shared is not None:
+        found = shared.get_many(list(keys.values()))
+    else:
+        found = {key: value for key in keys.values() if (value := _local.get(key)) is not None}
+    return {name: found[key] for name, key in keys.items() if key in found}
+
+
+def set_many(values: dict) -> None:
+    """Cache {key: value}."""
+    shared = dataversion.shared_cache()
+    if shared is not None:
+        shared.set_many(values, _ttl())
+    else:
+        for key, value in values.items():
+            _local.set(key, value)
+
+
+async def aget_many(keys: dict) -> dict:
+    shared = dataversion.shared_cache()
+    if shared is None:
+        return get_many(keys)
+    found = await shared.aget_many(list(keys.values()))
+    return {name: found[key] for name, key in keys.items() if key in found}
+
+
+async def aset_many(values: dict) -> None:
+    shared = dataversion.shared_cache()
+    if shared is None:
+        set_many(values)
+    else:
+        await shared.aset_many(values, _ttl())
+
+
+def _finish(response, etag: str):
+    response["ETag"] = etag
+    # Browsers keep the body but must revalidate each time
+    response["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def cached_by_data_version(endpoint: str, get_user_id):
+    """Decorator for GET views whose output depends only on the user's data and the query string.
+    Works on sync and async views alike."""
+
+    def _async_wrapper(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if _ttl() <= 0:
+                return await view(request, *args, **kwargs)
+            user_id = get_user_id(request)
+            if not user_id:
+                return await view(request, *args, **kwargs)
+            etag = _etag(user_id, endpoint, request, await dataversion.acurrent(user_id))
+            if _matches(request, etag):
+                return _finish(HttpResponseNotModified(), etag)
+            key = f"fq:resp:{etag}"
+            hit = await _aget(key)
+            if hit is not None:
+                content, content_type = hit
+                return _finish(HttpResponse(content, content_type=content_type), etag)
+            response = await view(request, *args, **kwargs)
+            if response.status_code == 200 and not response.streaming:
+                await _aset(key, (response.content, response["Content-Type"]))
+                _finish(response, etag)
+            return response
+
+        return wrapper
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            return _async_wrapper(view)
+
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if _ttl() <= 0:
+                return view(request, *args, **kwargs)
+            user_id = get_user_id(request)
+            if not user_id:
+                return view(request, *args, **kwargs)
+            etag = etag_for(user_id, endpoint, request)
+            if _matches(request, etag):
+                return _finish(HttpResponseNotModified(), etag)
+            key = f"fq:resp:{etag}"
+            hit = _get(key)
+            if hit is not None:
+                content, content_type = hit
+                return _finish(HttpResponse(content, content_type=content_type), etag)
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200 and not response.streaming:
+                _set(key, (response.content, response["Content-Type"]))
+                _finish(response, etag)
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def stats() -> dict:
+    return _local.stats()
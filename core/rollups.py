@@ -0,0 +1,243 @@
+"""Per-user monthly transaction rollups.
+
+``monthly_rollups`` holds one document per (user_id, month, category, type) with the
+summed amount and row count of the user's live transactions. Every transaction write
+path applies its delta with ``$inc`` so analytics can read O(months) rollup docs
+instead of O(transactions); ``manage.py rebuild_rollups`` recomputes them from the
+raw data and reports drift.
+"""
+from datetime import datetime, timezone
+from typing import Iterable, Optional
+from pymongo import UpdateOne
+
+COLLECTION = "monthly_rollups"
+
+INCOME_KEYWORDS = ("income", "salary", "refund", "bonus", "interest", "dividend")
+
+
+def is_income_category(cat: str) -> bool:
+    if not cat:
+        return False
+    c = cat.lower()
+    return any(k in c for k in INCOME_KEYWORDS)
+
+
+# Mirrors `(category or "Uncategorized").strip() or "Uncategorized"` server-side
+CATEGORY_EXPR = {
+    "$let": {
+        "vars": {
+            "c": {
+                "$cond": [
+                    {"$eq": [{"$type": "$category"}, "string"]},
+                    {"$trim": {"input": "$category"}},
+                    "",
+                ]
+            }
+        },
+        "in": {"$cond": [{"$eq": ["$$c", ""]}, "Uncategorized", "$$c"]},
+    }
+}
+
+# Mirrors `float(amount or 0)` with unparseable values counted as 0
+AMOUNT_EXPR = {"$convert": {"input": "$amount", "to": "double", "onError": 0.0, "onNull": 0.0}}
+
+# Explicit type wins; untyped rows fall back to the category keyword heuristic
+IS_INCOME_EXPR = {
+    "$let": {
+        "vars": {"t": {"$toLower": {"$ifNull": ["$type", ""]}}},
+        "in": {
+            "$or": [
+                {"$eq": ["$$t", "income"]},
+                {"$and": [
+                    {"$eq": ["$$t", ""]},
+                    {"$eq": [{"$type": "$category"}, "string"]},
+                    {"$regexMatch": {"input": "$category", "regex": "|".join(INCOME_KEYWORDS), "options": "i"}},
+                ]},
+            ]
+        },
+    }
+}
+
+MONTH_EXPR = {"$dateToString": {"date": "$occurred_at", "format": "%Y-%m", "timezone": "UTC"}}
+
+
+def normalize_category(cat) -> str:
+    if not isinstance(cat, str):
+        return "Uncategorized"
+    return cat.strip() or "Uncategorized"
+
+
+def classify(tx: dict) -> str:
+    tx_type = tx.get("type")
+    tx_type = tx_type.lower() if isinstance(tx_type, str) else ""
+    cat = tx.get("category")
+    if tx_type == "income" or (not tx_type and isinstance(cat, str) and is_income_category(cat)):
+        return "income"
+    return "expense"
+
+
+def month_key(dt: datetime) -> str:
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc)
+    return dt.strftime("%Y-%m")
+
+
+def _amount(tx: dict) -> float:
+    try:
+        return float(tx.get("amount") or 0)
+    except Exception:
+        return 0.0
+
+
+def _rollup_delta(tx: Optional[dict], sign: int) -> Optional[tuple]:
+    """((month, category, type), amount, count) contributed by a transaction, or None if it counts for nothing."""
+    if not tx or tx.get("is_deleted") is True or not isinstance(tx.get("occurred_at"), datetime):
+        return None
+    key = (month_key(tx["occurred_at"]), normalize_category(tx.get("category")), classify(tx))
+    return key, sign * _amount(tx), sign
+
+
+def _update_op(user_id: str, key: tuple, amount: float, count: int, first_seen=None) -> UpdateOne:
+    month, category, tx_type = key
+    update = {
+        "$inc": {"total": amount, "count": count},
+        "$set": {"updated_at": datetime.now(timezone.utc)},
+    }
+    if first_seen is not None:
+        update["$min"] = {"first_seen": first_seen}
+    return UpdateOne(
+        {"user_id": user_id, "month": month, "category": category, "type": tx_type},
+        update,
+        upsert=True,
+    )
+
+
+def rollup_ops(changes: Iterable[tuple]) -> list:
+    """Coalesce (old_doc, new_doc) pairs into one UpdateOne per touched rollup key.
+
+    Inserts pass ``(None, doc)``, deletes ``(doc, None)``, updates ``(before, after)``.
+    """
+    merged = {}
+    for old, new in changes:
+        for tx, sign in ((old, -1), (new, 1)):
+            delta = _rollup_delta(tx, sign)
+            if delta is None:
+                continue
+            key, amount, count = delta
+            mk = (str(tx.get("user_id")), key)
+            total, n, first = merged.get(mk, (0.0, 0, None))
+            oid = tx.get("_id") if sign > 0 else None
+            if oid is not None and (first is None or oid < first):
+                first = oid
+            merged[mk] = (total + amount, n + count, first)
+    return [
+        _update_op(user_id, key, total, n, first)
+        for (user_id, key), (total, n, first) in merged.items()
+        if n or total
+    ]
+
+
+def apply_changes(db, changes: Iterable[tuple], session=None) -> int:
+    ops = rollup_ops(changes)
+    if ops:
+        db[COLLECTION].bulk_write(ops, ordered=False, session=session)
+    return len(ops)
+
+
+def record_insert(db, tx: dict, session=None) -> None:
+    apply_changes(db, [(None, tx)], session=session)
+
+
+def record_update(db, before: dict, after: dict, session=None) -> None:
+    apply_changes(db, [(before, after)], session=session)
+
+
+def record_delete(db, tx: dict, session=None) -> None:
+    apply_changes(db, [(tx, None)], session=session)
+
+
+def months_between(start: datetime, end: datetime) -> list:
+    """Month keys of every whole month in [start, end); both bounds must be month starts."""
+    months = []
+    y, m = start.year, start.month
+    while datetime(y, m, 1, tzinfo=timezone.utc) < end:
+        months.append(f"{y:04d}-{m:02d}")
+        y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+    return months
+
+
+# Pipelines and result shaping are split so core/async_views.py can run the same queries
+def spend_by_category_pipeline(user_id: str, months: list) -> list:
+    return [
+        {"$match": {"user_id": user_id, "month": {"$in": months}}},
+        {"$group": {"_id": "$category", "total": {"$sum": "$total"}, "count": {"$sum": "$count"}, "first_seen": {"$min": "$first_seen"}}},
+        {"$match": {"count": {"$gt": 0}}},
+        {"$sort": {"total": -1, "first_seen": 1}},
+    ]
+
+
+def spend_by_category_result(rows: Iterable[dict]) -> list:
+    return [{"category": g["_id"], "total": round(g["total"], 2)} for g in rows]
+
+
+def spend_by_category(db, user_id: str, months: list) -> list:
+    return spend_by_category_result(db[COLLECTION].aggregate(spend_by_category_pipeline(user_id, months)))
+
+
+def income_expense_pipeline(user_id: str, months: list) -> list:
+    return [
+        {"$match": {"user_id": user_id, "month": {"$in": months}}},
+        {"$group": {"_id": "$type", "total": {"$sum": "$total"}}},
+    ]
+
+
+def income_expense_result(rows: Iterable[dict]) -> dict:
+    totals = {"income": 0.0, "expense": 0.0}
+    for row in rows:
+        totals["income" if row["_id"] == "income" else "expense"] += row["total"]
+    return totals
+
+
+def income_expense(db, user_id: str, months: list) -> dict:
+    return income_expense_result(db[COLLECTION].aggregate(income_expense_pipeline(user_id, months)))
+
+
+def user_rollups(db, user_id: str, session=None) -> dict:
+    """{(month, category, type): {"total", "count", "first_seen"}} for one user, recomputed
+    from their live transactions by the same rules the write paths apply."""
+    out = {}
+    projection = {"_id": 1, "user_id": 1, "occurred_at": 1, "category": 1, "type": 1, "amount": 1, "is_deleted": 1}
+    for tx in db["transactions"].find({"user_id": user_id, "is_deleted": {"$ne": True}}, projection, session=session):
+        delta = _rollup_delta(tx, 1)
+        if delta is None:
+            continue
+        key, amount, _ = delta
+        row = out.setdefault(key, {"total": 0.0, "count": 0, "first_seen": tx["_id"]})
+        row["total"] += amount
+        row["count"] += 1
+        row["first_seen"] = min(row["first_seen"], tx["_id"])
+    return out
+
+
+def expected_rollups(db, user_id: Optional[str] = None):
+    """Stream rollups recomputed from raw transactions, sorted by user_id."""
+    match = {"is_deleted": {"$ne": True}, "occurred_at": {"$type": "date"}}
+    if user_id:
+        match["user_id"] = user_id
+    pipeline = [
+        {"$match": match},
+        {"$group": {
+            "_id": {
+                "user_id": "$user_id",
+                "month": MONTH_EXPR,
+                "category": CATEGORY_EXPR,
+                "type": {"$cond": [IS_INCOME_EXPR, "income", "expense"]},
+            },
+            "total": {"$sum": AMOUNT_EXPR},
+            "count": {"$sum": 1},
+            "first_seen": {"$min": "$_id"},
+        }},
+        {"$sort": {"_id.user_id": 1}},
+    ]
+    for row in db["transactions"].aggregate(pipeline, allowDiskUse=True):
+        yield {**row["_id"], "total": row["total"], "count": row["count"], "first_seen": row["first_seen"]}
@@ -0,0 +1,297 @@
+"""Cross-user execution of recurring rules and savings plans.
+
+Due documents are found through the global ``next_run`` indexes and claimed in
+batches under a lease (``lease_owner``/``lease_until``), so several
+``manage.py run_scheduler`` processes -- and the per-user run-due endpoints -- can
+work the same collections side by side. A claimed batch is applied with
+``insert_many``/``bulk_write``, and the lease is released in the same bulk update
+that advances ``next_run``, in one session transaction where the cluster supports it. A worker that dies mid-batch, or whose lease expires during a
+large catch-up, leaves the batch to be claimed again.
+
+The lease only keeps workers apart; it is not what prevents a duplicate. Every
+occurrence is written under a unique key -- ``(rule_id, occurrence)`` on
+transactions, ``(plan_id, scheduled_for)`` on savings_contributions -- so replaying a
+batch skips what was already fired.
+"""
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from django.conf import settings
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from . import cadence, dataversion
+from .gamelogic import increment_profile_counters_many
+from .mongo import run_in_transaction
+from . import rollups
+
+RECURRING = "recurring_rules"
+SAVINGS = "savings_plans"
+CONTRIBUTIONS = "savings_contributions"
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def catchup_cap() -> int:
+    return max(int(getattr(settings, "RECURRING_CATCHUP_MAX", 366)), 1)
+
+
+def _due(now: datetime, user_id: Optional[str] = None) -> Dict:
+    q = {
+        "active": True,
+        "is_deleted": {"$ne": True},
+        "next_run": {"$lte": now},
+        # unleased, or the previous holder's lease has expired
+        "lease_until": {"$not": {"$gt": now}},
+    }
+    if user_id:
+        q["user_id"] = user_id
+    return q
+
+
+def claim(
+    db, coll_name: str, owner: str, batch: int, lease_seconds: float, user_id: Optional[str] = None, exclude=()
+) -> List[Dict]:
+    """Lease up to ``batch`` due documents of ``coll_name`` to ``owner`` (oldest next_run first)."""
+    coll = db[coll_name]
+    now = _now()
+    due = _due(now, user_id)
+    if exclude:
+        due["id"] = {"$nin": list(exclude)}
+    ids = [d["id"] for d in coll.find(due, {"_id": 0, "id": 1}).sort("next_run", 1).limit(batch)]
+    if not ids:
+        return []
+    # Re-check the predicate so concurrent claimers cannot both take a document
+    coll.update_many(
+        {"id": {"$in": ids}, **due},
+        {"$set": {"lease_owner": owner, "lease_until": now + timedelta(seconds=lease_seconds)}},
+    )
+    return list(coll.find({"id": {"$in": ids}, "lease_owner": owner}, {"_id": 0}))
+
+
+def _release(coll, owner: Optional[str], docs: List[Dict], next_runs: Dict[str, datetime], now: datetime, session=None) -> None:
+    ops = []
+    for d in docs:
+        fields = {"next_run": next_runs[d["id"]], "last_run": now, "updated_at": now}
+        if not d.get("anchor_day") and cadence.anchor_of(d):
+            # Pin the day before a short month clamps next_run and loses it
+            fields["anchor_day"] = cadence.anchor_of(d)
+        ops.append(UpdateOne({"id": d["id"], "lease_owner": owner}, {"$set": fields, "$unset": {"lease_owner": "", "lease_until": ""}}))
+    if ops:
+        coll.bulk_write(ops, ordered=False, session=session)
+
+
+def transaction_doc(user_id: str, tx: Dict, occurred_at: datetime, rule_id: Optional[str] = None, occurrence: Optional[datetime] = None) -> Dict:
+    """A transaction for ``tx``. Pass ``rule_id`` for a recurring rule's run; ``occurrence``
+    (default ``occurred_at``) is the scheduled date it fires, unique per rule."""
+    now = _now()
+    doc = {
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "type": (tx.get("type") or "expense").lower(),
+        "amount": float(tx.get("amount") or 0),
+        "currency": (tx.get("currency") or "USD").upper(),
+        "category": tx.get("category"),
+        "description": tx.get("description"),
+        "occurred_at": occurred_at,
+        "created_at": now,
+        "updated_at": now,
+        "is_deleted": False,
+    }
+    if rule_id:
+        doc["rule_id"] = rule_id
+        doc["occurrence"] = occurrence or occurred_at
+    return doc
+
+
+def _unfired(db, docs: List[Dict], session=None) -> List[Dict]:
+    """Drop rule occurrences that already have a transaction (unique on rule_id + occurrence)."""
+    keyed = [d for d in docs if d.get("rule_id")]
+    if not keyed:
+        return docs
+    fired = {
+        (t["rule_id"], cadence.aware(t["occurrence"]))
+        for t in db["transactions"].find(
+            {"rule_id": {"$in": list({d["rule_id"] for d in keyed})}, "occurrence": {"$in": [d["occurrence"] for d in keyed]}},
+            {"_id": 0, "rule_id": 1, "occurrence": 1},
+            session=session,
+        )
+    }
+    return [d for d in docs if not d.get("rule_id") or (d["rule_id"], cadence.aware(d["occurrence"])) not in fired]
+
+
+def insert_transactions(db, docs: List[Dict], session=None) -> List[Dict]:
+    """insert_many + rollups + one tx_count $inc per user, for the occurrences not fired yet.
+    Returns the inserted transactions; the caller bumps their data versions after commit."""
+    fresh = _unfired(db, docs, session=session)
+    if not fresh:
+        return []
+    try:
+        db["transactions"].insert_many(fresh, ordered=False, session=session)
+    except BulkWriteError as exc:
+        # Only reachable without a transaction: a concurrent run fired some first
+        errors = exc.details.get("writeErrors", [])
+        if session is not None or any(w.get("code") != 11000 for w in errors):
+            raise
+        dupes = {w["index"] for w in errors}
+        fresh = [d for i, d in enumerate(fresh) if i not in dupes]
+    rollups.apply_changes(db, [(None, d) for d in fresh], session=session)
+    per_user: Dict[str, int] = {}
+    for d in fresh:
+        per_user[d["user_id"]] = per_user.get(d["user_id"], 0) + 1
+    increment_profile_counters_many({uid: {"tx_count": n} for uid, n in per_user.items()}, session=session)
+    for d in fresh:
+        d.pop("_id", None)
+    return fresh
+
+
+def plan_recurring(rules: List[Dict], now: datetime, cap: Optional[int] = None) -> List[Tuple[Dict, List[datetime], datetime, bool]]:
+    """(rule, missed occurrences, new next_run, capped) for each rule, without writing anything."""
+    cap = cap or catchup_cap()
+    return [(r, *cadence.catch_up(r, r.get("cadence"), now, cap=cap)) for r in rules]
+
+
+def run_recurring(db, rules: List[Dict], owner: str) -> List[Dict]:
+    """Fire every missed occurrence of a claimed batch of rules (up to the catch-up cap
+    per rule) with one insert_many; each transaction's occurred_at is its scheduled date.
+    Occurrences that already fired (a replayed batch) are skipped. Returns the created
+    transactions."""
+    now = _now()
+    plan = plan_recurring(rules, now)
+    docs = [transaction_doc(r["user_id"], r, occ, rule_id=r["id"]) for r, occs, _, _ in plan for occ in occs]
+    next_runs = {r["id"]: next_run for r, _, next_run, _ in plan}
+
+    def write(session):
+        fired = insert_transactions(db, docs, session=session)
+        _release(db[RECURRING], owner, rules, next_runs, now, session=session)
+        return fired
+
+    fired = run_in_transaction(write)
+    # After commit, so readers cannot cache the pre-write version under the new one
+    dataversion.bump_many({d["user_id"] for d in fired})
+    return fired
+
+
+def contribution_doc(plan: Dict, scheduled_for: datetime, applied: bool, now: datetime) -> Dict:
+    return {
+        "id": str(uuid.uuid4()),
+        "user_id": plan["user_id"],
+        "plan_id": plan["id"],
+        "goal_id": plan.get("goal_id"),
+        "amount": float(plan.get("amount_per_interval") or 0),
+        "scheduled_for": scheduled_for,
+        # False when the goal was gone; the plan still advances
+        "applied": applied,
+        "created_at": now,
+    }
+
+
+def _record_contributions(db, docs: List[Dict], session=None) -> List[Dict]:
+    """Insert contributions not recorded yet (unique on plan_id + scheduled_for). Returns the new ones."""
+    coll = db[CONTRIBUTIONS]
+    seen = {
+        (c["plan_id"], cadence.aware(c["scheduled_for"]))
+        for c in coll.find(
+            {"plan_id": {"$in": [d["plan_id"] for d in docs]}, "scheduled_for": {"$in": [d["scheduled_for"] for d in docs]}},
+            {"_id": 0, "plan_id": 1, "scheduled_for": 1},
+            session=session,
+        )
+    }
+    fresh = [d for d in docs if (d["plan_id"], cadence.aware(d["scheduled_for"])) not in seen]
+    if not fresh:
+        return []
+    try:
+        coll.insert_many(fresh, ordered=False, session=session)
+    except BulkWriteError as exc:
+        # Only reachable without a transaction: a concurrent run recorded some first
+        errors = exc.details.get("writeErrors", [])
+        if session is not None or any(w.get("code") != 11000 for w in errors):
+            raise
+        dupes = {w["index"] for w in errors}
+        fresh = [d for i, d in enumerate(fresh) if i not in dupes]
+    return fresh
+
+
+def apply_savings(
+    db, plans: List[Dict], next_runs: Dict[str, datetime], owner: Optional[str] = None, scheduled_for: Optional[datetime] = None
+) -> Dict:
+    """Apply one contribution per plan and advance the plans, in one session transaction
+    where the cluster supports it.
+
+    Each contribution is recorded in ``savings_contributions`` (keyed by plan and the
+    occurrence it covers, default the plan's next_run), so a replayed batch is a no-op.
+    Plans feeding the same goal are summed into a single ``$inc`` per goal.
+    """
+    now = _now()
+
+    def write(session):
+        goal_ids = list({p.get("goal_id") for p in plans if p.get("goal_id")})
+        live = {
+            (g["user_id"], g["id"])
+            for g in db["goals"].find(
+                {"id": {"$in": goal_ids}, "is_deleted": {"$ne": True}}, {"_id": 0, "id": 1, "user_id": 1}, session=session
+            )
+        }
+        contributions = [
+            contribution_doc(p, cadence.aware(scheduled_for or p.get("next_run") or now), (p["user_id"], p.get("goal_id")) in live, now)
+            for p in plans
+        ]
+        fresh = _record_contributions(db, contributions, session=session)
+        per_goal: Dict[tuple, float] = {}
+        saved: Dict[str, Dict] = {}
+        for c in fresh:
+            if not c["applied"]:
+                continue
+            key = (c["user_id"], c["goal_id"])
+            per_goal[key] = per_goal.get(key, 0.0) + c["amount"]
+            saved.setdefault(c["user_id"], {"total_saved": 0.0})["total_saved"] += c["amount"]
+        if per_goal:
+            db["goals"].bulk_write(
+                [
+                    UpdateOne(
+                        {"id": goal_id, "user_id": user_id, "is_deleted": {"$ne": True}},
+                        {"$inc": {"current_amount": delta}, "$set": {"updated_at": now}},
+                    )
+                    for (user_id, goal_id), delta in per_goal.items()
+                ],
+                ordered=False,
+                session=session,
+            )
+            increment_profile_counters_many(saved, session=session)
+        _release(db[SAVINGS], owner, plans, next_runs, now, session=session)
+        return {"plans": len(plans), "goals": len(per_goal), "saved": sum(per_goal.values())}
+
+    result = run_in_transaction(write)
+    # After commit, so readers cannot cache the pre-write version under the new one
+    dataversion.bump_many(p["user_id"] for p in plans)
+    return result
+
+
+def run_savings(db, plans: List[Dict], owner: str) -> Dict:
+    """Apply a claimed batch of savings plans to their goals (see apply_savings)."""
+    now = _now()
+    return apply_savings(db, plans, {p["id"]: cadence.next_after(p, p.get("interval"), now) for p in plans}, owner=owner)
+
+
+RUNNERS = {
+    RECURRING: run_recurring,
+    SAVINGS: run_savings,
+}
+
+
+def run_due(
+    db, coll_name: str, owner: str, batch: int = 500, lease_seconds: float = 60, user_id: Optional[str] = None, repeat: bool = True
+):
+    """Claim and run batches of ``coll_name`` until nothing is due.
+    With ``repeat=False`` each document runs at most once, so a rule still behind after
+    its catch-up cap waits for the next call. Yields (claimed documents, runner result) per batch."""
+    runner = RUNNERS[coll_name]
+    seen = set()
+    while True:
+        docs = claim(db, coll_name, owner, batch, lease_seconds, user_id=user_id, exclude=() if repeat else seen)
+        if not docs:
+            return
+        if not repeat:
+            seen.update(d["id"] for d in docs)
+        yield docs, runner(db, docs, owner)
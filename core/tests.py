@@ -1,3 +1,1248 @@
-from django.test import TestCase
+import csv
+import io
+import itertools
+import json
+import os
+import threading
+import time
+import tracemalloc
+import unittest
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
+import jwt
+from asgiref.sync import async_to_sync
+from django.core.management import CommandError, call_command
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from pymongo.errors import OperationFailure
+from core import analytics_views, async_views, cadence, dashboard_views, dataversion, export_views, gamelogic, import_views, metrics, mongo, outbox, recurring_views, rollups, scheduler
+from core.cache import LRUTTLCache
+from core.indexes import INDEXES
+from core.middleware import auth_middleware
+from core.query_audit import QueryBudgetExceeded, capture, command_listener, describe, query_budget
+from core.views import TransactionViewSet
 
-# Create your tests here.
+try:
+    import mongomock
+    from mongomock.collection import BulkOperationBuilder
+except ImportError:  # the in-memory tests below are skipped without it
+    mongomock = None
+
+_request_ids = itertools.count()
+
+
+def _send(name, command):
+    """Feed one command through the listener the way PyMongo would."""
+    event = SimpleNamespace(command_name=name, command=command, connection_id=("test", 0), request_id=next(_request_ids), duration_micros=100)
+    command_listener.started(event)
+    command_listener.succeeded(event)
+
+
+class QueryShapeTests(SimpleTestCase):
+    def test_values_are_masked(self):
+        a = describe("find", {"find": "goals", "filter": {"id": "a", "amount": {"$gt": 5}}})
+        b = describe("find", {"find": "goals", "filter": {"id": "b", "amount": {"$gt": 9}}})
+        self.assertEqual(a.shape, b.shape)
+        self.assertEqual(a.shape, 'find goals {"id": "?", "amount": {"$gt": "?"}}')
+
+    def test_update_and_aggregate_shapes(self):
+        update = describe("update", {"update": "goals", "updates": [{"q": {"id": {"$in": ["a", "b"]}}, "u": {"$inc": {"x": 1}}}]})
+        self.assertEqual(update.shape, 'update goals {"id": {"$in": "?"}}')
+        pipeline = [{"$match": {"user_id": "u"}}, {"$group": {"_id": "$category"}}]
+        self.assertEqual(
+            describe("aggregate", {"aggregate": "transactions", "pipeline": pipeline}).shape,
+            'aggregate transactions [{"$match": {"user_id": "?"}}, "$group"]',
+        )
+
+    def test_budget_passes_and_ignores_driver_commands(self):
+        with query_budget(max_queries=2, max_repeats=1) as log:
+            _send("find", {"find": "users", "filter": {"id": "u"}})
+            _send("getMore", {"getMore": 1, "collection": "users"})
+            _send("insert", {"insert": "xp_log", "documents": [{}]})
+        self.assertEqual(len(log), 2)
+
+    def test_repeated_shape_fails_the_budget(self):
+        with self.assertRaisesRegex(QueryBudgetExceeded, r"5 x find goals"):
+            with query_budget(max_repeats=2):
+                for i in range(5):
+                    _send("find", {"find": "goals", "filter": {"id": str(i)}})
+
+    def test_nested_captures(self):
+        with capture() as outer:
+            with capture() as inner:
+                _send("find", {"find": "a", "filter": {}})
+            _send("find", {"find": "b", "filter": {}})
+        self.assertEqual((len(outer), len(inner)), (2, 1))
+
+
+@unittest.skipIf(mongomock is None, "needs mongomock")
+# Analytics read the rollups: mongomock cannot run the raw pipelines ($type, $convert)
+@override_settings(MONGODB_DB="finance_quest_test", MONGO_DB_NAME="finance_quest_test", XP_OUTBOX_ENABLED=False, ANALYTICS_USE_ROLLUPS=True)
+class InMemoryMongoTestCase(SimpleTestCase):
+    """core.mongo pointed at a fresh mongomock client. mongomock has no sessions, so
+    run_in_transaction takes its standalone-server path."""
+
+    def setUp(self):
+        super().setUp()
+        mongo._reset_after_fork()
+        self.addCleanup(mongo._reset_after_fork)
+        mongo._clients["default"] = mongomock.MongoClient()
+        standalone = OperationFailure("Transaction numbers are only allowed on a replica set member or mongos", code=20)
+        add_update = BulkOperationBuilder.add_update
+
+        def add_update_without_sort(builder, *args, sort=None, **kwargs):
+            # PyMongo 4.11+ passes UpdateOne(sort=...), which mongomock 4.3 predates
+            return add_update(builder, *args, **kwargs)
+
+        for patcher in (
+            mock.patch.object(mongomock.MongoClient, "start_session", side_effect=standalone, create=True),
+            mock.patch.object(BulkOperationBuilder, "add_update", add_update_without_sort),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.db = mongo.get_db()
+
+
+# mongomock sends no commands, so the query-budget tests report its Collection calls to
+# the command listener as the commands PyMongo would send for them
+_COMMANDS = {
+    "find": "find", "find_one": "find", "aggregate": "aggregate", "count_documents": "count", "distinct": "distinct",
+    "insert_one": "insert", "insert_many": "insert", "update_one": "update", "update_many": "update", "replace_one": "update",
+    "delete_one": "delete", "delete_many": "delete", "bulk_write": "update",
+    "find_one_and_update": "findAndModify", "find_one_and_replace": "findAndModify", "find_one_and_delete": "findAndModify",
+}
+_in_call = threading.local()
+
+
+def _as_command(method, collection, args, kwargs):
+    name = _COMMANDS[method]
+    if method == "aggregate":
+        return name, {name: collection, "pipeline": args[0] if args else kwargs.get("pipeline")}
+    if method == "bulk_write":
+        ops = list(args[0] if args else kwargs.get("requests"))
+        return name, {name: collection, "updates": [{"q": getattr(ops[0], "_filter", None) or {}}]}
+    if method == "distinct":
+        filt = args[1] if len(args) > 1 else kwargs.get("filter")
+    else:
+        filt = args[0] if args else kwargs.get("filter")
+    if filt is not None and not isinstance(filt, dict):
+        filt = {"_id": filt}
+    filt = filt or {}
+    if name == "update":
+        return name, {name: collection, "updates": [{"q": filt}]}
+    if name == "delete":
+        return name, {name: collection, "deletes": [{"q": filt}]}
+    if name in ("findAndModify", "count", "distinct"):
+        return name, {name: collection, "query": filt}
+    return name, {name: collection, "filter": filt}
+
+
+def _recorded(method, call):
+    def wrapper(coll, *args, **kwargs):
+        # Only the outermost call: mongomock implements find_one with find, and so on
+        if not getattr(_in_call, "active", False):
+            _send(*_as_command(method, coll.name, args, kwargs))
+        _in_call.active, outer = True, getattr(_in_call, "active", False)
+        try:
+            return call(coll, *args, **kwargs)
+        finally:
+            _in_call.active = outer
+    return wrapper
+
+
+_SECRET = "query-budget-tests-" + uuid.uuid4().hex
+
+
+# Local JWT auth against the in-memory users. The auth middleware only looks users up
+# with a URI configured; the client stays mongomock.
+_AUTH_SETTINGS = {
+    "MONGO_URI": "mongodb://localhost", "MONGODB_URI": "mongodb://localhost",
+    "JWT_SECRET": _SECRET, "JWT_ALGORITHM": "HS256", "JWT_PUBLIC_KEY": "", "AUTH_VERIFY_ORDER": "local",
+}
+
+
+@override_settings(**_AUTH_SETTINGS)
+class EndpointQueryBudgetTests(InMemoryMongoTestCase):
+    """Query budgets per endpoint: an absolute number of Mongo commands, and for write
+    endpoints the same number whatever the number of items processed. Commands are
+    counted as PyMongo would send them on a standalone server (no transactions)."""
+
+    def setUp(self):
+        super().setUp()
+        for method in _COMMANDS:
+            patcher = mock.patch.object(mongomock.collection.Collection, method, _recorded(method, getattr(mongomock.collection.Collection, method)))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _user(self):
+        user_id = str(uuid.uuid4())
+        self.db["users"].insert_one({"id": user_id, "email": f"{user_id}@example.com", "is_deleted": False})
+        self.db["profiles"].insert_one({"id": str(uuid.uuid4()), "user_id": user_id, "xp": 0, "level": 1, "is_deleted": False})
+        token = jwt.encode({"sub": user_id, "exp": int(time.time()) + 600}, _SECRET, algorithm="HS256")
+        return user_id, {"HTTP_AUTHORIZATION": f"Bearer {token}", "HTTP_X_USER_ID": user_id}
+
+    def _commands(self, method, path, headers, data=None, max_queries=None):
+        with query_budget(max_queries=max_queries, max_repeats=3) as log:
+            if method == "get":
+                response = self.client.get(path, data, **headers)
+            else:
+                response = self.client.post(path, data, content_type="application/json", **headers)
+        self.assertLess(response.status_code, 300, response.content)
+        if method == "get":
+            # a dashboard section that failed still answers 200
+            self.assertNotIn("errors", response.json())
+        return len(log)
+
+    def _due_rules(self, user_id, n):
+        now = datetime.now(timezone.utc) - timedelta(minutes=1)
+        self.db["recurring_rules"].insert_many([
+            {
+                "id": str(uuid.uuid4()), "user_id": user_id, "name": f"rule {i}", "amount": 5.0, "currency": "USD",
+                "category": "bills", "description": None, "type": "expense", "cadence": "monthly", "next_run": now,
+                "anchor_day": now.day, "active": True, "created_at": now, "updated_at": now, "is_deleted": False,
+            }
+            for i in range(n)
+        ])
+
+    def _due_plans(self, user_id, n):
+        now = datetime.now(timezone.utc) - timedelta(minutes=1)
+        goal_ids = [str(uuid.uuid4()) for _ in range(n)]
+        self.db["goals"].insert_many([
+            {"id": gid, "user_id": user_id, "name": "goal", "target_amount": 100.0, "current_amount": 0.0, "is_deleted": False}
+            for gid in goal_ids
+        ])
+        self.db["savings_plans"].insert_many([
+            {
+                "id": str(uuid.uuid4()), "user_id": user_id, "goal_id": gid, "amount_per_interval": 5.0, "interval": "monthly",
+                "next_run": now, "anchor_day": now.day, "active": True, "created_at": now, "updated_at": now, "is_deleted": False,
+            }
+            for gid in goal_ids
+        ])
+
+    def _transactions(self, user_id, n):
+        now = datetime.now(timezone.utc).replace(microsecond=0)
+        docs = [
+            scheduler.transaction_doc(user_id, {"type": "expense", "amount": 4.0, "currency": "USD", "category": f"c{i % 3}"}, now - timedelta(days=i))
+            for i in range(n)
+        ]
+        self.db["transactions"].insert_many(docs)
+        rollups.apply_changes(self.db, [(None, d) for d in docs])
+        return docs
+
+    def test_run_due_recurring(self):
+        counts = []
+        for n in (1, 10):
+            user_id, headers = self._user()
+            self._due_rules(user_id, n)
+            counts.append(self._commands("post", "/api/recurring/run-due/", headers, max_queries=BUDGETS["run_due_recurring"]))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_run_due_savings(self):
+        counts = []
+        for n in (1, 10):
+            user_id, headers = self._user()
+            self._due_plans(user_id, n)
+            counts.append(self._commands("post", "/api/savings/run-due/", headers, max_queries=BUDGETS["run_due_savings"]))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_bulk_create(self):
+        counts = []
+        for n in (1, 20):
+            user_id, headers = self._user()
+            item = {"user_id": user_id, "type": "expense", "amount": "3.50", "category": "food", "occurred_at": "2024-05-01T12:00:00Z"}
+            counts.append(self._commands("post", "/api/transactions/bulk/", headers, [item] * n, max_queries=BUDGETS["bulk_create"]))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_read_endpoints(self):
+        today = datetime.now(timezone.utc).date()
+        month = today.strftime("%Y-%m")
+        # whole months: served from the rollups (mongomock lacks the raw pipeline's $type)
+        this_month = today.replace(day=1)
+        months = {"from": (this_month - timedelta(days=40)).replace(day=1).isoformat(), "to": (this_month - timedelta(days=1)).isoformat()}
+        reads = [
+            ("transaction_list", "/api/transactions/", None),
+            ("transaction_retrieve", "/api/transactions/{tx}/", None),
+            ("goal_list", "/api/goals/", None),
+            ("goal_retrieve", "/api/goals/{goal}/", None),
+            ("xp_log_list", "/api/xp-log/", None),
+            ("spend_by_category", "/api/analytics/spend-by-category/", {"month": month}),
+            ("spend_by_category_cached", "/api/analytics/spend-by-category/", {"month": month}),
+            ("income_vs_expense", "/api/analytics/income-vs-expense/", months),
+            ("goal_progress", "/api/analytics/goal-progress/", None),
+            ("dashboard_summary", "/api/dashboard/summary/", {"month": month, **months}),
+            ("me_profile", "/api/profile/", None),
+        ]
+        for n in (1, 20):
+            user_id, headers = self._user()
+            txs = self._transactions(user_id, n)
+            self._due_plans(user_id, n)
+            ids = {"tx": txs[0]["id"], "goal": self.db["goals"].find_one({"user_id": user_id})["id"]}
+            # the first request verifies the token and loads the user; budgets are for the rest
+            self._commands("get", "/api/profile/", headers)
+            for name, path, params in reads:
+                with self.subTest(endpoint=name, items=n):
+                    self._commands("get", path.format(**ids), headers, params, max_queries=BUDGETS[name])
+
+
+# Mongo commands per request. Writes include the user lookup of a fresh token; reads run
+# in the listed order after it, so only the first one looks up the data version.
+BUDGETS = {
+    "run_due_recurring": 13,
+    "run_due_savings": 14,
+    "bulk_create": 9,
+    "transaction_list": 1,
+    "transaction_retrieve": 1,
+    "goal_list": 1,
+    "goal_retrieve": 1,
+    "xp_log_list": 1,
+    "spend_by_category": 2,
+    "spend_by_category_cached": 0,
+    "income_vs_expense": 1,
+    "goal_progress": 3,
+    "dashboard_summary": 8,
+    "me_profile": 1,
+}
+
+
+class LRUTTLCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.cache = LRUTTLCache(max_entries=2, ttl=60, clock=lambda: self.now)
+
+    def test_ttl_caps_but_never_extends_the_default(self):
+        self.cache.set("short", 1, ttl=5)
+        self.cache.set("long", 2, ttl=600)
+        self.now = 6
+        self.assertIsNone(self.cache.get("short"))
+        self.assertEqual(self.cache.get("long"), 2)
+        self.now = 61
+        self.assertIsNone(self.cache.get("long"))
+        self.cache.set("expired", 3, ttl=-1)
+        self.assertIsNone(self.cache.get("expired"))
+
+    def test_least_recently_used_is_evicted(self):
+        self.cache.set("a", 1)
+        self.cache.set("b", 2)
+        self.cache.get("a")
+        self.cache.set("c", 3)
+        self.assertEqual((self.cache.get("a"), self.cache.get("b"), self.cache.get("c")), (1, None, 3))
+        self.assertEqual(self.cache.stats()["evictions"], 1)
+
+
+class MetricsViewTests(SimpleTestCase):
+    def _status(self, token=None):
+        headers = {"HTTP_AUTHORIZATION": f"Bearer {token}"} if token else {}
+        return metrics.metrics_view(RequestFactory().get("/metrics", **headers)).status_code
+
+    @override_settings(METRICS_ENABLED=False, METRICS_TOKEN="s3cret")
+    def test_disabled_is_not_found(self):
+        self.assertEqual(self._status("s3cret"), 404)
+
+    @override_settings(METRICS_ENABLED=True, METRICS_TOKEN="", DEBUG=False)
+    def test_no_token_is_not_served_outside_debug(self):
+        self.assertEqual(self._status(), 404)
+
+    @override_settings(METRICS_ENABLED=True, METRICS_TOKEN="", DEBUG=True)
+    def test_no_token_is_served_under_debug(self):
+        self.assertEqual(self._status(), 200)
+
+    @override_settings(METRICS_ENABLED=True, METRICS_TOKEN="s3cret", DEBUG=False)
+    def test_token_is_required(self):
+        self.assertEqual(self._status(), 401)
+        self.assertEqual(self._status("wrong"), 401)
+        self.assertEqual(self._status("s3cret"), 200)
+
+
+@override_settings(**_AUTH_SETTINGS)
+class AuthCacheTests(InMemoryMongoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.now = 1000.0
+        for patcher in (
+            mock.patch.object(auth_middleware.auth_cache, "_clock", lambda: self.now),
+            mock.patch.object(auth_middleware.auth_cache, "_data", OrderedDict()),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.middleware = auth_middleware.ExternalAuthMiddleware(lambda request: HttpResponse("ok"))
+        self.user_id = str(uuid.uuid4())
+        self.db["users"].insert_one({"id": self.user_id, "email": "a@example.com", "is_deleted": False})
+
+    def _status(self, token):
+        request = RequestFactory().get("/api/goals/", HTTP_AUTHORIZATION=f"Bearer {token}")
+        return self.middleware(request).status_code
+
+    def _token(self, expires_in):
+        return jwt.encode({"sub": self.user_id, "exp": int(time.time() + expires_in)}, _SECRET, algorithm="HS256")
+
+    def test_entry_expires_with_the_token(self):
+        token = self._token(10)
+        self.assertEqual(self._status(token), 200)
+        self.db["users"].update_one({"id": self.user_id}, {"$set": {"is_deleted": True}})
+        # served from the cache: no lookup sees the soft delete yet
+        self.assertEqual(self._status(token), 200)
+        self.now += 11
+        # past exp the entry is gone, even though AUTH_CACHE_TTL (60s) has not run out
+        self.assertEqual(self._status(token), 401)
+
+    def test_soft_deleted_user_is_rejected_after_the_cache_ttl(self):
+        token = self._token(3600)
+        self.assertEqual(self._status(token), 200)
+        self.db["users"].update_one({"id": self.user_id}, {"$set": {"is_deleted": True}})
+        self.now += 59
+        self.assertEqual(self._status(token), 200)
+        self.now += 2
+        self.assertEqual(self._status(token), 401)
+
+
+class RecurringReplayTests(InMemoryMongoTestCase):
+    def _rule(self, months_behind=3):
+        start = datetime.now(timezone.utc).replace(microsecond=0) - timedelta(days=31 * months_behind)
+        rule = {
+            "id": str(uuid.uuid4()), "user_id": str(uuid.uuid4()), "name": "rent", "amount": 100.0, "currency": "USD",
+            "category": "housing", "description": None, "type": "expense", "cadence": "monthly", "next_run": start,
+            "anchor_day": start.day, "active": True, "created_at": start, "updated_at": start, "is_deleted": False,
+        }
+        self.db[scheduler.RECURRING].insert_one(rule)
+        return rule
+
+    def test_replayed_batch_fires_nothing_twice(self):
+        rule = self._rule()
+        claimed = scheduler.claim(self.db, scheduler.RECURRING, "worker-a", 10, 60)
+        first = scheduler.run_recurring(self.db, claimed, "worker-a")
+        # worker-a's lease expired mid-batch and worker-b replays the same claimed documents
+        second = scheduler.run_recurring(self.db, claimed, "worker-b")
+        self.assertGreaterEqual(len(first), 3)
+        self.assertEqual(second, [])
+        self.assertEqual(self.db["transactions"].count_documents({"rule_id": rule["id"]}), len(first))
+        self.assertEqual(sum(r["count"] for r in self.db[rollups.COLLECTION].find({"user_id": rule["user_id"]})), len(first))
+        profile = self.db["profiles"].find_one({"user_id": rule["user_id"]})
+        self.assertEqual(profile["stats"]["tx_count"], len(first))
+
+    def test_occurrences_are_keyed_by_schedule(self):
+        rule = self._rule(months_behind=1)
+        fired = scheduler.run_recurring(self.db, [rule], "worker-a")
+        self.assertEqual([d["occurrence"] for d in fired], [d["occurred_at"] for d in fired])
+        self.assertEqual(cadence.aware(fired[0]["occurrence"]), cadence.aware(rule["next_run"]))
+
+
+class RunNowTests(InMemoryMongoTestCase):
+    """Run Now fires the pending occurrence early; the calendar run must not fire it again."""
+
+    def _schedule(self, coll: str, doc: dict) -> dict:
+        now = datetime.now(timezone.utc).replace(microsecond=0)
+        doc = {
+            "id": str(uuid.uuid4()), "user_id": str(uuid.uuid4()), "next_run": now + timedelta(days=5), "anchor_day": (now + timedelta(days=5)).day,
+            "active": True, "created_at": now, "updated_at": now, "is_deleted": False, **doc,
+        }
+        self.db[coll].insert_one(doc)
+        return doc
+
+    def _post(self, view, doc: dict, **kwargs):
+        request = RequestFactory().post("/", HTTP_X_USER_ID=doc["user_id"])
+        return view(request, **kwargs)
+
+    def _run_due_at(self, when: datetime, coll: str) -> list:
+        with mock.patch.object(scheduler, "_now", return_value=when + timedelta(seconds=1)):
+            return list(scheduler.run_due(self.db, coll, "scheduler", repeat=False))
+
+    def test_recurring_run_now_then_run_due(self):
+        rule = self._schedule(scheduler.RECURRING, {
+            "name": "gym", "amount": 30.0, "currency": "USD", "category": "health", "description": None,
+            "type": "expense", "cadence": "monthly",
+        })
+        response = self._post(recurring_views.run_now_recurring, rule, rid=rule["id"])
+        self.assertEqual(response.status_code, 200)
+        stored = self.db[scheduler.RECURRING].find_one({"id": rule["id"]})
+        self.assertGreater(cadence.aware(stored["next_run"]), rule["next_run"])
+        self.assertEqual(self._run_due_at(rule["next_run"], scheduler.RECURRING), [])
+        # Even a scheduler working from the old next_run finds the occurrence taken
+        self.assertEqual(scheduler.run_recurring(self.db, [rule], "scheduler"), [])
+        self.assertEqual(self.db["transactions"].count_documents({"rule_id": rule["id"]}), 1)
+        self.assertEqual(self._post(recurring_views.run_now_recurring, rule, rid=rule["id"]).status_code, 200)
+        self.assertEqual(self.db["transactions"].count_documents({"rule_id": rule["id"]}), 2)
+
+    def test_savings_run_now_then_run_due(self):
+        goal = {"id": str(uuid.uuid4()), "name": "bike", "target_amount": 500.0, "current_amount": 0.0, "is_deleted": False}
+        plan = self._schedule(scheduler.SAVINGS, {"goal_id": goal["id"], "amount_per_interval": 25.0, "interval": "weekly"})
+        self.db["goals"].insert_one({**goal, "user_id": plan["user_id"]})
+        response = self._post(recurring_views.run_now_savings, plan, sid=plan["id"])
+        self.assertEqual(response.status_code, 200)
+        self._run_due_at(plan["next_run"], scheduler.SAVINGS)
+        scheduler.apply_savings(self.db, [plan], {plan["id"]: plan["next_run"] + timedelta(days=7)})
+        self.assertEqual(self.db["goals"].find_one({"id": goal["id"]})["current_amount"], 25.0)
+
+
+class _FailedCommitSession:
+    """A session whose transaction runs its writes and then fails to commit."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def with_transaction(self, fn):
+        fn(None)  # mongomock takes no session
+        raise OperationFailure("connection reset during commitTransaction", code=91)
+
+
+class AwardXpTests(InMemoryMongoTestCase):
+    def _profile(self, user_id):
+        return self.db["profiles"].find_one({"user_id": user_id})
+
+    def test_one_award_moves_counters_and_badges_once(self):
+        user_id = str(uuid.uuid4())
+        result = gamelogic.award_xp(user_id, "add_transaction", 10, counters={"tx_count": 1})
+        self.assertEqual([b["code"] for b in result["new_badges"]], ["first_tx"])
+        gamelogic.award_xp(user_id, "add_transaction", 10, counters={"tx_count": 1})
+        profile = self._profile(user_id)
+        self.assertEqual((profile["xp"], profile["stats"]["tx_count"]), (20, 2))
+        self.assertEqual([b["code"] for b in profile["badges"]], ["first_tx"])
+        self.assertEqual(self.db["xp_log"].count_documents({"user_id": user_id}), 2)
+
+    def test_failed_commit_is_not_applied_again(self):
+        user_id = str(uuid.uuid4())
+        with mock.patch.object(mongomock.MongoClient, "start_session", return_value=_FailedCommitSession()):
+            with self.assertRaises(OperationFailure):
+                gamelogic.award_xp(user_id, "add_goal", 10, counters={"goal_count": 1})
+        # the writes the failed commit left behind are not doubled by a second, unwrapped run
+        self.assertEqual(self._profile(user_id)["stats"]["goal_count"], 1)
+        self.assertEqual(self.db["xp_log"].count_documents({"user_id": user_id}), 1)
+
+
+class DataVersionTests(InMemoryMongoTestCase):
+    @override_settings(ANALYTICS_CACHE_ALIAS="default")
+    def test_reader_racing_a_bump_cannot_cache_the_old_version(self):
+        user_id = str(uuid.uuid4())
+        dataversion.bump(user_id)
+        shared = dataversion.shared_cache()
+        shared.clear()
+        loaded = dataversion.current(user_id)
+        shared.clear()
+        # The reader loaded `loaded` from Mongo, then a write bumped before its add() ran
+        dataversion.bump(user_id)
+        shared.add(dataversion._key(user_id), loaded, 300)
+        self.assertEqual(dataversion.current(user_id), loaded + 1)
+
+    def _racing_bumps(self, user_id):
+        store = dataversion._store
+        calls = itertools.count()
+
+        def racing(versions):
+            if next(calls) == 0:
+                # bump A read back its version; bump B runs to completion before A caches it
+                dataversion.bump(user_id)
+            store(versions)
+
+        with mock.patch.object(dataversion, "_store", racing):
+            dataversion.bump(user_id)
+
+    @override_settings(ANALYTICS_CACHE_ALIAS="default")
+    def test_older_bump_cannot_overwrite_a_newer_one_in_the_shared_cache(self):
+        user_id = str(uuid.uuid4())
+        self._racing_bumps(user_id)
+        self.assertEqual(dataversion.shared_cache().get(dataversion._key(user_id)), 2)
+        self.assertEqual(dataversion.current(user_id), 2)
+
+    @override_settings(ANALYTICS_CACHE_ALIAS="")
+    def test_older_bump_cannot_overwrite_a_newer_one_in_process(self):
+        user_id = str(uuid.uuid4())
+        self._racing_bumps(user_id)
+        self.assertEqual(dataversion.current(user_id), 2)
+
+
+def _expected_rollups(db, user_id=None):
+    """rollups.expected_rollups computed per user in Python: mongomock lacks $convert."""
+    users = [user_id] if user_id else sorted(db["transactions"].distinct("user_id", {"is_deleted": {"$ne": True}}))
+    for uid in users:
+        for (month, category, tx_type), row in rollups.user_rollups(db, uid).items():
+            yield {"user_id": uid, "month": month, "category": category, "type": tx_type, **row}
+
+
+class RebuildRollupsTests(InMemoryMongoTestCase):
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(rollups, "expected_rollups", _expected_rollups)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user_id = str(uuid.uuid4())
+        at = datetime(2024, 3, 10, tzinfo=timezone.utc)
+        self._insert(*[
+            {"type": "expense", "amount": 10.0, "currency": "USD", "category": "food"},
+            {"type": "expense", "amount": 2.5, "currency": "USD", "category": "food"},
+            {"type": "income", "amount": 100.0, "currency": "USD", "category": "salary"},
+        ], at=at)
+        rows = self.db[rollups.COLLECTION]
+        rows.update_one({"user_id": self.user_id, "category": "food"}, {"$inc": {"total": 5.0}})
+        rows.delete_one({"user_id": self.user_id, "category": "salary"})
+        rows.insert_one({"user_id": self.user_id, "month": "2024-03", "category": "ghost", "type": "expense", "total": 1.0, "count": 1})
+
+    def _insert(self, *txs, at=datetime(2024, 3, 12, tzinfo=timezone.utc)):
+        docs = [scheduler.transaction_doc(self.user_id, tx, at) for tx in txs]
+        self.db["transactions"].insert_many(docs)
+        rollups.apply_changes(self.db, [(None, d) for d in docs])
+
+    def _rebuild(self, *args):
+        out = io.StringIO()
+        call_command("rebuild_rollups", *args, stdout=out, stderr=io.StringIO())
+        return out.getvalue()
+
+    def _state(self):
+        return {
+            (r["category"], r["type"]): (round(r["total"], 2), r["count"])
+            for r in self.db[rollups.COLLECTION].find({"user_id": self.user_id, "count": {"$ne": 0}})
+        }
+
+    def test_verify_reports_drift_without_writing(self):
+        before = self._state()
+        out = self._rebuild("--verify")
+        self.assertEqual(out.count("drift user="), 3, out)
+        self.assertIn("found drift in 3 rollup row(s) across 1 user(s)", out)
+        self.assertEqual(self._state(), before)
+
+    def test_run_repairs_drift(self):
+        self._rebuild()
+        self.assertEqual(self._state(), {("food", "expense"): (12.5, 2), ("salary", "income"): (100.0, 1)})
+        self.assertIn("found drift in 0 rollup row(s)", self._rebuild("--verify"))
+
+    def test_concurrent_write_during_repair_is_kept(self):
+        recompute = rollups.user_rollups
+        calls = itertools.count()
+
+        def racing(db, user_id, session=None):
+            result = recompute(db, user_id, session=session)
+            if next(calls) == 0:
+                # a transaction write lands between the recompute and the repair's writes
+                self._insert({"type": "expense", "amount": 4.0, "currency": "USD", "category": "food"})
+            return result
+
+        with mock.patch.object(rollups, "user_rollups", racing):
+            self._rebuild()
+        self.assertEqual(self._state(), {("food", "expense"): (16.5, 3), ("salary", "income"): (100.0, 1)})
+
+
+class EnsureIndexesTests(InMemoryMongoTestCase):
+    def test_duplicate_live_profiles_are_reported_not_indexed(self):
+        dup, other = str(uuid.uuid4()), str(uuid.uuid4())
+        self.db["profiles"].insert_many([
+            {"id": "p1", "user_id": dup, "is_deleted": False},
+            {"id": "p2", "user_id": dup, "is_deleted": False},
+            {"id": "p3", "user_id": other, "is_deleted": False},
+            {"id": "p4", "user_id": other, "is_deleted": True},
+        ])
+        err = io.StringIO()
+        with self.assertRaisesRegex(CommandError, "1 index build"):
+            call_command("ensure_indexes", "--collection", "profiles", stdout=io.StringIO(), stderr=err)
+        self.assertIn("uniq_profiles_user_live not created", err.getvalue())
+        self.assertIn(dup, err.getvalue())
+        self.assertIn("ids p1, p2", err.getvalue())
+        self.assertNotIn(other, err.getvalue())
+        names = set(self.db["profiles"].index_information())
+        self.assertIn("uniq_profiles_id", names)
+        self.assertNotIn("uniq_profiles_user_live", names)
+
+        self.db["profiles"].update_one({"id": "p2"}, {"$set": {"is_deleted": True}})
+        call_command("ensure_indexes", "--collection", "profiles", stdout=io.StringIO(), stderr=io.StringIO())
+        self.assertIn("uniq_profiles_user_live", self.db["profiles"].index_information())
+
+
+class _FakeCursor:
+    """Just enough of a PyMongo cursor for export_views._rows; documents are made on demand."""
+
+    def __init__(self, docs):
+        self._docs = docs
+
+    def sort(self, *args):
+        return self
+
+    def batch_size(self, n):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __iter__(self):
+        return self._docs
+
+
+def _export_db(docs):
+    coll = SimpleNamespace(find=lambda filt, projection: _FakeCursor(docs))
+    return {"transactions": coll}
+
+
+def _tx(i, **overrides):
+    at = datetime(2024, 1, 1, tzinfo=timezone.utc) + timedelta(seconds=i)
+    return {
+        "id": str(uuid.UUID(int=i)),
+        "user_id": "u1",
+        "type": "expense",
+        "amount": 12.5 + i % 100,
+        "currency": "USD",
+        "category": "Groceries",
+        "description": f"Corner shop #{i}",
+        "occurred_at": at,
+        "created_at": at,
+        "updated_at": at,
+        **overrides,
+    }
+
+
+class ExportTests(SimpleTestCase):
+    # EXPORT_TEST_ROWS=1000000 for the full-size run; the default keeps the suite quick
+    ROWS = int(os.getenv("EXPORT_TEST_ROWS", "20000"))
+    CHUNK = 64 * 1024
+
+    def _peak(self, fmt):
+        docs = (_tx(i) for i in range(self.ROWS))
+        tracemalloc.start()
+        try:
+            size = sum(len(chunk) for chunk in export_views.stream(_export_db(docs), "u1", fmt, chunk_bytes=self.CHUNK))
+            return size, tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    def test_memory_does_not_grow_with_rows(self):
+        for fmt in ("csv", "ndjson"):
+            with self.subTest(fmt=fmt):
+                size, peak = self._peak(fmt)
+                # one chunk being filled plus the one handed out, with headroom for the
+                # serializer; independent of ROWS, and well under the size of the body
+                bound = 16 * self.CHUNK
+                self.assertGreater(size, 2 * bound)
+                self.assertLess(peak, bound, f"{self.ROWS} rows peaked at {peak} bytes")
+
+    def test_csv_escapes_formulas(self):
+        docs = iter([
+            _tx(1, description="=HYPERLINK(\"http://x\")", category="+cmd"),
+            _tx(2, description="-2+3", category="@SUM(A1)"),
+            _tx(3, description="Refund -5", category="Food"),
+        ])
+        body = b"".join(export_views.stream(_export_db(docs), "u1", "csv")).decode()
+        rows = list(csv.DictReader(io.StringIO(body)))
+        self.assertEqual([r["description"] for r in rows], ["'=HYPERLINK(\"http://x\")", "'-2+3", "Refund -5"])
+        self.assertEqual([r["category"] for r in rows], ["'+cmd", "'@SUM(A1)", "Food"])
+        # amounts are ours, not user text, and stay numeric
+        self.assertFalse(rows[0]["amount"].startswith("'"))
+
+
+def _parse(fmt, text):
+    return [item for _, item in import_views.PARSERS[fmt](io.BytesIO(text.encode()))]
+
+
+_OFX = """OFXHEADER:100
+DATA:OFXSGML
+
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><CURDEF>EUR
+<BANKTRANLIST>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20240305120000[-5:EST]<TRNAMT>-42.10<FITID>A1<NAME>Corner &amp; Co<MEMO>card</STMTTRN>
+<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20240306<TRNAMT>1500.00<FITID>A2<NAME>Salary</STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+"""
+
+
+class ImportParsingTests(SimpleTestCase):
+    def test_amount_formats(self):
+        cases = {
+            "1,234.56": "1234.56", "1.234,56": "1234.56", "-1.234.567,89": "-1234567.89", "1.234.567": "1234567",
+            "12,5": "12.5", "1,234": "1234", "$-12.00": "-12.00", "(12.00)": "-12.00", "€ 3,99": "3.99",
+        }
+        for text, expected in cases.items():
+            with self.subTest(text=text):
+                self.assertEqual(import_views._amount(text), Decimal(expected))
+        self.assertIsNone(import_views._amount(" "))
+        with self.assertRaises(ValueError):
+            import_views._amount("n/a")
+
+    def test_csv_type_column(self):
+        items = _parse("csv", (
+            "Date,Description,Amount,Type\n"
+            "2024-03-01,Rent,\"1.200,00\",Debit\n"
+            "2024-03-02,Salary,2500.00,CREDIT\n"
+            "2024-03-03,Refund,-5.00,POS\n"
+            "2024-03-04,Interest,0.12,\n"
+        ))
+        self.assertEqual([i["type"] for i in items], ["expense", "income", "expense", "income"])
+        self.assertEqual([i["amount"] for i in items], ["1200.00", "2500.00", "5.00", "0.12"])
+        self.assertEqual(items[0]["occurred_at"], "2024-03-01T00:00:00+00:00")
+
+    def test_csv_debit_credit_columns(self):
+        items = _parse("csv", "Posting Date,Payee,Debit,Credit\n03/01/2024,Shop,12.50,\n03/02/2024,Pay,,100\n\n")
+        self.assertEqual([(i["type"], i["amount"]) for i in items], [("expense", "12.50"), ("income", "100")])
+        # unparsed dates are left for the serializer to report
+        self.assertEqual(items[0]["occurred_at"], "03/01/2024")
+
+    def test_ofx(self):
+        items = _parse("ofx", _OFX)
+        self.assertEqual(items[0], {
+            "occurred_at": "2024-03-05T12:00:00-05:00", "description": "Corner & Co - card", "external_id": "A1",
+            "currency": "EUR", "type": "expense", "amount": "42.10",
+        })
+        self.assertEqual((items[1]["type"], items[1]["amount"], items[1]["occurred_at"]), ("income", "1500.00", "2024-03-06T00:00:00+00:00"))
+
+
+class ImportDedupeTests(InMemoryMongoTestCase):
+    CSV = (
+        "Date,Description,Amount\n"
+        "2024-03-01,Coffee,-3.50\n"
+        "2024-03-01,Coffee,-3.50\n"
+        "2024-03-02,Books,-20.00\n"
+        "2024-03-02,oops,abc\n"
+    )
+
+    def setUp(self):
+        super().setUp()
+        # only the content-hash index: mongomock ignores partialFilterExpression, so the
+        # (rule_id, occurrence) one would reject every import row after the first
+        self.db["transactions"].create_indexes([i for i in INDEXES["transactions"] if i.document["name"] == "uniq_transactions_user_content_hash"])
+        self.user_id = str(uuid.uuid4())
+
+    def _import(self, text, fmt="csv"):
+        return import_views.import_file(self.db, self.user_id, io.BytesIO(text.encode()), fmt, chunk_size=2)
+
+    def test_reimport_inserts_nothing_twice(self):
+        first = self._import(self.CSV)
+        self.assertEqual((first["rows"], first["inserted"], first["duplicates"], first["invalid"]), (4, 3, 0, 1))
+        self.assertEqual(first["errors"][0]["line"], 5)
+        second = self._import(self.CSV)
+        self.assertEqual((second["inserted"], second["duplicates"]), (0, 3))
+        # an overlapping statement only adds what is new; the two equal coffees stay two
+        third = self._import("Date,Description,Amount\n2024-03-01,Coffee,-3.50\n2024-03-03,Cinema,-9.00\n")
+        self.assertEqual((third["inserted"], third["duplicates"]), (1, 1))
+        self.assertEqual(self.db["transactions"].count_documents({"user_id": self.user_id}), 4)
+        self.assertEqual(sum(r["count"] for r in self.db[rollups.COLLECTION].find({"user_id": self.user_id})), 4)
+
+    def test_ofx_reimport(self):
+        self.assertEqual(self._import(_OFX, "ofx")["inserted"], 2)
+        self.assertEqual(self._import(_OFX, "ofx")["duplicates"], 2)
+
+
+class DashboardSummaryCacheTests(InMemoryMongoTestCase):
+    def _summary(self, user_id):
+        request = RequestFactory().get("/api/dashboard/summary/", {"sections": "profile,spend_by_category,income_vs_expense"}, HTTP_X_USER_ID=user_id)
+        response = dashboard_views.dashboard_summary(request)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_analytics_sections_are_cached_by_data_version(self):
+        user_id = str(uuid.uuid4())
+        spend = mock.Mock(wraps=analytics_views._spend_by_category_for)
+        income = mock.Mock(wraps=analytics_views._income_expense_for)
+        profile = mock.Mock(wraps=dashboard_views._profile)
+        with mock.patch.object(analytics_views, "_spend_by_category_for", spend), \
+                mock.patch.object(analytics_views, "_income_expense_for", income), \
+                mock.patch.dict(dashboard_views.LOADERS, profile=profile):
+            first = self._summary(user_id)
+            self.assertEqual(self._summary(user_id).content, first.content)
+            self.assertEqual((spend.call_count, income.call_count, profile.call_count), (1, 1, 2))
+            dataversion.bump(user_id)
+            self._summary(user_id)
+            self.assertEqual((spend.call_count, income.call_count, profile.call_count), (2, 2, 3))
+
+
+def _python_spend_by_category(txs):
+    """The Python loop spend_by_category ran before the aggregation pipeline."""
+    totals = {}
+    for t in txs:
+        cat = (t.get("category") or "Uncategorized").strip() or "Uncategorized"
+        try:
+            amt = float(t.get("amount") or 0)
+        except Exception:
+            amt = 0
+        totals[cat] = totals.get(cat, 0.0) + amt
+    return [{"category": k, "total": round(v, 2)} for k, v in sorted(totals.items(), key=lambda x: -x[1])]
+
+
+def _python_income_expense(txs):
+    """The Python loop income_vs_expense ran before the aggregation pipeline."""
+    income = expense = 0.0
+    for t in txs:
+        try:
+            amt = float(t.get("amount") or 0)
+        except Exception:
+            amt = 0
+        tx_type = (t.get("type") or "").lower()
+        cat = t.get("category") or ""
+        if tx_type == "income" or (not tx_type and rollups.is_income_category(cat)):
+            income += amt
+        else:
+            expense += amt
+    return income, expense
+
+
+def _python_period(dt, unit):
+    day = dt.date()
+    if unit == "week":
+        day -= timedelta(days=day.weekday())
+    elif unit == "month":
+        day = day.replace(day=1)
+    return day.isoformat()
+
+
+@override_settings(ANALYTICS_USE_ROLLUPS=False)
+class AnalyticsPipelineParityTests(InMemoryMongoTestCase):
+    """The aggregation pipelines against the Python loops they replaced, on the same rows.
+    mongomock lacks operators the pipelines use, so these skip unless PIPELINE_TEST_MONGO_URI
+    names a real server (its finance_quest_test database is dropped afterwards)."""
+
+    def setUp(self):
+        super().setUp()
+        uri = os.getenv("PIPELINE_TEST_MONGO_URI")
+        if uri:
+            from pymongo import MongoClient
+
+            client = mongo._clients["default"] = MongoClient(uri)
+            mongo._dbs.clear()
+            self.db = mongo.get_db()
+            self.addCleanup(client.close)
+            self.addCleanup(client.drop_database, self.db.name)
+        self.user_id = str(uuid.uuid4())
+        march = lambda day: datetime(2024, 3, day, 12, tzinfo=timezone.utc)
+        rows = [
+            {"category": "Food", "type": "expense", "amount": 10.0, "occurred_at": march(1)},
+            # missing type, string amount, padded category: counts as Food, so Food ties with Rent
+            {"category": "Food ", "amount": "5.5", "occurred_at": march(4)},
+            {"category": "Rent", "type": "EXPENSE", "amount": 15.5, "occurred_at": march(5)},
+            {"category": "Books", "type": "expense", "amount": 4, "occurred_at": march(11)},
+            {"category": "Games", "type": "expense", "amount": 4.0, "occurred_at": march(12)},
+            {"category": "Salary", "amount": "100", "occurred_at": march(15)},
+            {"category": "Gift", "type": "Income", "amount": 20, "occurred_at": march(18)},
+            {"category": None, "type": "expense", "amount": None, "occurred_at": march(20)},
+            {"category": "", "amount": "n/a", "occurred_at": march(25)},
+            {"category": "Uncategorized", "type": "expense", "amount": "2.25", "occurred_at": march(31)},
+            {"category": "Food", "type": "expense", "amount": 1000.0, "occurred_at": march(2), "is_deleted": True},
+            {"category": "Food", "type": "expense", "amount": 7.0, "occurred_at": datetime(2024, 4, 1, tzinfo=timezone.utc)},
+        ]
+        docs = [{"id": str(uuid.uuid4()), "user_id": self.user_id, "is_deleted": False, **r} for r in rows]
+        docs.append({**docs[0], "id": str(uuid.uuid4()), "user_id": str(uuid.uuid4())})
+        self.db["transactions"].insert_many(docs)
+        self.live = [
+            d for d in docs
+            if d["user_id"] == self.user_id and not d["is_deleted"] and d["occurred_at"] < datetime(2024, 4, 1, tzinfo=timezone.utc)
+        ]
+
+    def _get(self, view, params):
+        try:
+            response = view(RequestFactory().get("/", params, HTTP_X_USER_ID=self.user_id))
+        except (NotImplementedError, OperationFailure) as e:
+            self.skipTest(f"in-memory Mongo cannot run the pipeline: {e}")
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content)
+
+    def test_spend_by_category(self):
+        body = self._get(analytics_views.spend_by_category, {"month": "2024-03"})
+        self.assertEqual(body, {"month": "2024-03", "data": _python_spend_by_category(self.live)})
+        # ties keep first-seen order
+        self.assertEqual([r["category"] for r in body["data"][2:6]], ["Food", "Rent", "Books", "Games"])
+
+    def test_income_vs_expense(self):
+        body = self._get(analytics_views.income_vs_expense, {"from": "2024-03-01", "to": "2024-03-31"})
+        income, expense = _python_income_expense(self.live)
+        self.assertEqual(body, {
+            "from": "2024-03-01T00:00:00+00:00",
+            "to": "2024-04-01T00:00:00+00:00",
+            "income": round(income, 2),
+            "expense": round(expense, 2),
+            "net": round(income - expense, 2),
+        })
+
+    def test_income_vs_expense_group_by(self):
+        for unit in analytics_views.GROUP_BY_UNITS:
+            with self.subTest(group_by=unit):
+                body = self._get(analytics_views.income_vs_expense, {"from": "2024-03-01", "to": "2024-03-31", "group_by": unit})
+                periods = {}
+                for t in self.live:
+                    periods.setdefault(_python_period(t["occurred_at"], unit), []).append(t)
+                series = []
+                for period, txs in sorted(periods.items()):
+                    income, expense = _python_income_expense(txs)
+                    series.append({"period": period, "income": round(income, 2), "expense": round(expense, 2), "net": round(income - expense, 2)})
+                self.assertEqual(body["series"], series)
+                self.assertEqual((body["income"], body["expense"]), tuple(round(v, 2) for v in _python_income_expense(self.live)))
+
+
+class _AsyncCursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def sort(self, *args):
+        self._cursor.sort(*args)
+        return self
+
+    def limit(self, n):
+        self._cursor.limit(n)
+        return self
+
+    async def to_list(self, length):
+        return list(self._cursor)
+
+
+class _AsyncCollection:
+    def __init__(self, coll):
+        self._coll = coll
+
+    def find(self, *args, **kwargs):
+        return _AsyncCursor(self._coll.find(*args, **kwargs))
+
+    async def find_one(self, *args, **kwargs):
+        return self._coll.find_one(*args, **kwargs)
+
+
+class _AsyncDb:
+    """The slice of PyMongo's async database API the async viewset reads use, over mongomock."""
+
+    def __init__(self, db):
+        self._db = db
+
+    def __getitem__(self, name):
+        return _AsyncCollection(self._db[name])
+
+
+class AsyncReadParityTests(InMemoryMongoTestCase):
+    """async_views serves viewset list/retrieve without DRF; its responses must match DRF's."""
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(async_views, "get_async_db", lambda name="default": _AsyncDb(self.db))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user_id = str(uuid.uuid4())
+        at = datetime(2024, 3, 10, 9, 30, tzinfo=timezone.utc)
+        self.docs = [
+            scheduler.transaction_doc(self.user_id, {"type": "expense", "amount": 1.5 + i, "category": "food"}, at - timedelta(days=i % 2))
+            for i in range(5)
+        ]
+        self.db["transactions"].insert_many([{**d} for d in self.docs])
+        self.db["transactions"].insert_one(scheduler.transaction_doc(str(uuid.uuid4()), {"amount": 3}, at))
+
+    def _both(self, action, params=None, **kwargs):
+        drf_view = TransactionViewSet.as_view({"get": action})
+        request = lambda: RequestFactory().get("/api/transactions/", params or {}, HTTP_X_USER_ID=self.user_id, HTTP_ACCEPT="application/json")
+        drf = drf_view(request(), **kwargs).render()
+        native = async_to_sync(async_views._async_reads(drf_view))(request(), **kwargs)
+        for name in ("Content-Type", "Vary", "Link", "X-Next-Cursor"):
+            self.assertEqual(native.get(name), drf.get(name), name)
+        self.assertEqual((native.status_code, json.loads(native.content)), (drf.status_code, json.loads(drf.content)))
+        return drf
+
+    def test_list_pages(self):
+        first = self._both("list", {"limit": 2})
+        self.assertIn("X-Next-Cursor", first)
+        second = self._both("list", {"limit": 2, "cursor": first["X-Next-Cursor"]})
+        self.assertEqual(len(json.loads(second.content)), 2)
+        self._both("list", {"limit": 2, "cursor": second["X-Next-Cursor"]})
+        self._both("list")
+
+    def test_list_errors(self):
+        self.assertEqual(self._both("list", {"cursor": "not-a-cursor"}).status_code, 400)
+        self.assertEqual(self._both("list", {"limit": "many"}).status_code, 400)
+
+    def test_retrieve(self):
+        self.assertEqual(self._both("retrieve", pk=self.docs[0]["id"]).status_code, 200)
+        self.assertEqual(self._both("retrieve", pk=str(uuid.uuid4())).status_code, 404)
+        other = self.db["transactions"].find_one({"user_id": {"$ne": self.user_id}})
+        self.assertEqual(self._both("retrieve", pk=other["id"]).status_code, 403)
+
+
+class _OldestFirstTransactions(TransactionViewSet):
+    default_sort = [("occurred_at", 1)]
+
+
+class KeysetPaginationTests(InMemoryMongoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user_id = str(uuid.uuid4())
+        at = datetime(2024, 3, 10, tzinfo=timezone.utc)
+        # three-way and two-way ties on occurred_at, and two rows without one
+        times = [at, at, at, at - timedelta(days=1), at - timedelta(days=1), at + timedelta(days=1), at - timedelta(days=2), None, None]
+        self.docs = [scheduler.transaction_doc(self.user_id, {"amount": 1}, t) for t in times]
+        self.db["transactions"].insert_many([{**d} for d in self.docs])
+        self.db["transactions"].insert_one(scheduler.transaction_doc(str(uuid.uuid4()), {"amount": 1}, at))
+
+    def _page(self, params, viewset=TransactionViewSet):
+        request = RequestFactory().get("/api/transactions/", params, HTTP_X_USER_ID=self.user_id, HTTP_ACCEPT="application/json")
+        return viewset.as_view({"get": "list"})(request).render()
+
+    def _walk(self, viewset, limit):
+        ids, params = [], {"limit": limit}
+        for _ in range(len(self.docs) + 1):
+            response = self._page(params, viewset)
+            self.assertEqual(response.status_code, 200)
+            ids += [row["id"] for row in json.loads(response.content)]
+            if "X-Next-Cursor" not in response:
+                return ids
+            self.assertIn(f"cursor={response['X-Next-Cursor']}", response["Link"])
+            params = {"limit": limit, "cursor": response["X-Next-Cursor"]}
+        self.fail("pagination did not end")
+
+    def _expected(self, direction):
+        dated = [d["id"] for d in sorted((d for d in self.docs if d["occurred_at"]), key=lambda d: (d["occurred_at"], d["id"]), reverse=direction < 0)]
+        undated = sorted((d["id"] for d in self.docs if not d["occurred_at"]), reverse=direction < 0)
+        # Mongo sorts null below every value
+        return dated + undated if direction < 0 else undated + dated
+
+    def test_walks_every_row_once_across_ties_and_nulls(self):
+        for limit in (1, 2, 3, 4):
+            with self.subTest(limit=limit):
+                self.assertEqual(self._walk(TransactionViewSet, limit), self._expected(-1))
+
+    def test_ascending_walk_puts_nulls_first(self):
+        for limit in (1, 2, 3):
+            with self.subTest(limit=limit):
+                self.assertEqual(self._walk(_OldestFirstTransactions, limit), self._expected(1))
+
+    def test_malformed_cursor_is_a_400(self):
+        for cursor in ("not-a-cursor", "e30", "W10"):
+            with self.subTest(cursor=cursor):
+                response = self._page({"cursor": cursor})
+                self.assertEqual((response.status_code, json.loads(response.content)), (400, {"detail": "Invalid cursor."}))
+
+    @override_settings(LIST_PAGE_SIZE=4, LIST_MAX_PAGE_SIZE=3)
+    def test_limit_is_clamped(self):
+        for limit, size in ((1000, 3), (None, 3), (0, 1), (-5, 1), (2, 2)):
+            with self.subTest(limit=limit):
+                response = self._page({} if limit is None else {"limit": limit})
+                self.assertEqual(len(json.loads(response.content)), size)
+                self.assertIn("X-Next-Cursor", response)
+
+
+class OutboxTests(InMemoryMongoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.now = datetime(2024, 3, 10, 12, tzinfo=timezone.utc)
+        patcher = mock.patch.object(outbox, "_now", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user_id = str(uuid.uuid4())
+        self.event = outbox.award_event(self.user_id, "add_transaction", 10, {"tx_count": 1})
+        outbox.enqueue([self.event])
+
+    def _stored(self):
+        return self.db[outbox.COLLECTION].find_one({"id": self.event["id"]})
+
+    def _fail(self, user_id, events):
+        raise RuntimeError("handler down")
+
+    def test_lease_keeps_other_workers_out_until_it_expires(self):
+        self.assertEqual([e["id"] for e in outbox.claim("a", 10, 60)], [self.event["id"]])
+        self.assertEqual(outbox.claim("b", 10, 60), [])
+        self.now += timedelta(seconds=59)
+        self.assertEqual(outbox.claim("b", 10, 60), [])
+        self.now += timedelta(seconds=2)
+        self.assertEqual([e["id"] for e in outbox.claim("b", 10, 60)], [self.event["id"]])
+        self.assertEqual(self._stored()["lease_owner"], "b")
+
+    def test_failures_back_off_exponentially(self):
+        with mock.patch.dict(outbox.HANDLERS, {outbox.AWARD_XP: self._fail}):
+            for attempts, delay in ((1, 2), (2, 4), (3, 8)):
+                self.assertEqual(outbox.process(outbox.claim("a", 10, 60)), {"done": 0, "retried": 1, "dead": 0})
+                stored = self._stored()
+                self.assertEqual((stored["status"], stored["attempts"], stored["last_error"]), (outbox.PENDING, attempts, "handler down"))
+                self.now += timedelta(seconds=delay - 1)
+                self.assertEqual(outbox.claim("a", 10, 60), [])
+                self.now += timedelta(seconds=1)
+            self.db[outbox.COLLECTION].update_one({"id": self.event["id"]}, {"$set": {"attempts": 20}})
+            outbox.process(outbox.claim("a", 10, 60), max_attempts=30)
+            self.now += timedelta(seconds=299)
+            self.assertEqual(outbox.claim("a", 10, 60), [])
+            self.now += timedelta(seconds=1)
+            self.assertEqual(len(outbox.claim("a", 10, 60)), 1)
+
+    def test_dead_letters_after_max_attempts(self):
+        with mock.patch.dict(outbox.HANDLERS, {outbox.AWARD_XP: self._fail}):
+            totals = {"done": 0, "retried": 0, "dead": 0}
+            for _ in range(3):
+                stats = outbox.process(outbox.claim("a", 10, 60), max_attempts=3)
+                totals = {k: totals[k] + stats[k] for k in totals}
+                self.now += timedelta(seconds=300)
+        self.assertEqual(totals, {"done": 0, "retried": 2, "dead": 1})
+        self.assertEqual((self._stored()["status"], self._stored()["attempts"]), (outbox.DEAD, 3))
+        self.now += timedelta(days=1)
+        self.assertEqual(outbox.claim("a", 10, 60), [])
+
+    def test_crashed_worker_event_is_redelivered_and_applied_once(self):
+        claimed = outbox.claim("a", 10, 60)
+        # worker a applies the award, then dies before marking the event done
+        outbox.HANDLERS[outbox.AWARD_XP](self.user_id, claimed)
+        self.assertEqual(outbox.drain("b", lease_seconds=60), {"done": 0, "retried": 0, "dead": 0, "batches": 0})
+        self.now += timedelta(seconds=61)
+        self.assertEqual(outbox.drain("b", lease_seconds=60), {"done": 1, "retried": 0, "dead": 0, "batches": 1})
+        self.assertEqual(self._stored()["status"], outbox.DONE)
+        profile = self.db["profiles"].find_one({"user_id": self.user_id})
+        self.assertEqual((profile["xp"], profile["stats"]["tx_count"]), (10, 1))
+        self.assertEqual(self.db["xp_log"].count_documents({"event_id": self.event["id"]}), 1)
+
+
+class BulkCreateTests(InMemoryMongoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice, self.bob = str(uuid.uuid4()), str(uuid.uuid4())
+
+    def _item(self, user_id, **overrides):
+        return {"user_id": user_id, "type": "expense", "amount": "12.50", "category": "food", "occurred_at": "2024-03-10T09:00:00Z", **overrides}
+
+    def _post(self, items, user_id=None):
+        headers = {"HTTP_X_USER_ID": user_id} if user_id else {}
+        request = RequestFactory().post("/api/transactions/bulk/", json.dumps(items), content_type="application/json", **headers)
+        response = TransactionViewSet.as_view({"post": "bulk"})(request).render()
+        return response.status_code, json.loads(response.content)
+
+    def _mixed_batch(self):
+        return [
+            self._item(self.alice),
+            {"user_id": self.alice, "amount": "5"},  # no occurred_at
+            self._item(self.bob, amount="-3"),
+            self._item(self.alice, type="income", category="salary"),
+            "not an object",
+            self._item(self.bob, currency="EURO"),
+            self._item(self.bob),
+        ]
+
+    def test_mixed_batch_reports_errors_and_inserts_the_valid_rows(self):
+        award = mock.Mock(wraps=gamelogic.award_xp)
+        with mock.patch("core.views.award_xp", award):
+            code, body = self._post(self._mixed_batch())
+        self.assertEqual(code, 201)
+        self.assertEqual([e["index"] for e in body["errors"]], [1, 2, 4, 5])
+        self.assertIn("occurred_at", body["errors"][0]["errors"])
+        self.assertIn("amount", body["errors"][1]["errors"])
+        self.assertIn("currency", body["errors"][3]["errors"])
+        self.assertEqual(sorted((r["user_id"], r["type"]) for r in body["created"]), sorted([(self.alice, "expense"), (self.alice, "income"), (self.bob, "expense")]))
+        self.assertEqual(self.db["transactions"].count_documents({}), 3)
+        # one award per user for the whole batch
+        self.assertEqual(sorted(c.args[0] for c in award.call_args_list), sorted([self.alice, self.bob]))
+        self.assertEqual(set(body["xp_awards"]), {self.alice, self.bob})
+        for user_id, count in ((self.alice, 2), (self.bob, 1)):
+            logs = list(self.db["xp_log"].find({"user_id": user_id}))
+            self.assertEqual([l["xp_delta"] for l in logs], [10 * count])
+            profile = self.db["profiles"].find_one({"user_id": user_id})
+            self.assertEqual((profile["xp"], profile["stats"]["tx_count"]), (10 * count, count))
+
+    def test_header_user_rejects_other_users_rows(self):
+        code, body = self._post([self._item(self.alice), self._item(self.bob)], user_id=self.alice)
+        self.assertEqual(code, 201)
+        self.assertEqual(body["errors"], [{"index": 1, "errors": {"user_id": ["user_id mismatch between header and payload."]}}])
+        self.assertEqual(body["xp_award"]["xp_awarded"], 10)
+        self.assertEqual(self.db["xp_log"].count_documents({}), 1)
+
+    def test_all_invalid_is_a_400(self):
+        code, body = self._post([{"user_id": self.alice}, "x"])
+        self.assertEqual((code, body["created"], [e["index"] for e in body["errors"]]), (400, [], [0, 1]))
+        self.assertEqual(self.db["xp_log"].count_documents({}), 0)
+
+    @override_settings(XP_OUTBOX_ENABLED=True)
+    def test_outbox_queues_one_award_event_per_user(self):
+        code, body = self._post(self._mixed_batch())
+        self.assertEqual(code, 201)
+        events = {e["user_id"]: e for e in self.db[outbox.COLLECTION].find()}
+        self.assertEqual(set(events), {self.alice, self.bob})
+        self.assertEqual(events[self.alice]["payload"], {"reason": "add_transaction", "xp_amount": 20, "counters": {"tx_count": 2}})
+        self.assertEqual({u: a["event_id"] for u, a in body["xp_awards"].items()}, {u: e["id"] for u, e in events.items()})
+        self.assertEqual(self.db["xp_log"].count_documents({}), 0)
@@ -1,22 +1,35 @@
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.conf import settings
 from rest_framework import viewsets, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 from datetime import datetime, timezone, date
+import base64
+import json
+import logging
 import uuid
-from .mongo import get_db
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
+from .mongo import get_db, run_in_transaction
 from .serializers import (
     ProfileSerializer,
     TransactionSerializer,
     GoalSerializer,
     XPLogSerializer,
 )
-from .gamelogic import award_xp
+from .gamelogic import award_xp, increment_profile_counters
+from . import dataversion, outbox, rollups
+from .compiled_serializers import compile_serializer
+from .renderers import FastJsonResponse
+
+logger = logging.getLogger(__name__)
 
 # Create your views here.
 def health(request):
-    return JsonResponse({"status": "ok"})
+    return FastJsonResponse({"status": "ok"})
 
 def _request_user_id(request):
     return request.headers.get("X-User-Id")
@@ -24,6 +37,61 @@ def _request_user_id(request):
 def _utcnow():
     return datetime.now(timezone.utc)
 
+
+def _encode_cursor(sort_value, doc_id) -> str:
+    """Opaque keyset token for the position after (sort_value, id)."""
+    if isinstance(sort_value, datetime):
+        v = {"dt": sort_value.isoformat()}
+    else:
+        v = {"v": sort_value}
+    raw = json.dumps([v, doc_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(token: str):
+    """Inverse of _encode_cursor; raises ValueError on anything malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        v, doc_id = json.loads(raw)
+        if "dt" in v:
+            return datetime.fromisoformat(v["dt"]), doc_id
+        return v["v"], doc_id
+    except Exception as e:
+        raise ValueError("invalid cursor") from e
+
+
+def _live(doc) -> bool:
+    return bool(doc) and doc.get("is_deleted") is not True
+
+
+def _float(value) -> float:
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _keyset_filter(field: str, direction: int, value, doc_id) -> dict:
+    """Documents strictly after (value, id) in (field, id) order. Mongo sorts null/missing
+    below every value, so nulls trail descending pages and lead ascending ones."""
+    op = "$lt" if direction < 0 else "$gt"
+    if value is None:
+        if direction < 0:
+            return {field: None, "id": {op: doc_id}}
+        return {"$or": [{field: {"$ne": None}}, {field: None, "id": {op: doc_id}}]}
+    clauses = [{field: {op: value}}, {field: value, "id": {op: doc_id}}]
+    if direction < 0:
+        clauses.append({field: None})
+    return {"$or": clauses}
+
+def _per_user(docs: list) -> dict:
+    """{user_id: number of docs} for the docs that have an owner."""
+    counts = {}
+    for d in docs:
+        if d.get("user_id"):
+            counts[str(d["user_id"])] = counts.get(str(d["user_id"]), 0) + 1
+    return counts
+
 class BaseMongoViewSet(viewsets.ViewSet):
     collection_name = None
     serializer_class = None
@@ -54,32 +122,135 @@ class BaseMongoViewSet(viewsets.ViewSet):
                 out[k] = v
         return out
 
+    def _build_doc(self, validated: dict, uid) -> dict:
+        now = _utcnow()
+        doc = {
+            **self._normalize_doc(validated),
+            "id": str(uuid.uuid4()),
+            "created_at": now,
+            "updated_at": now,
+            "is_deleted": validated.get("is_deleted", False),
+        }
+        if uid and not doc.get("user_id"):
+            doc["user_id"] = uid
+        return doc
+
+    # Write hooks for derived data; called after the primary write succeeds
+    def _after_create(self, doc: dict):
+        pass
+
+    def _after_update(self, before: dict, after: dict):
+        pass
+
+    def _after_destroy(self, doc: dict):
+        pass
+
+    def _counter_deltas(self, before: dict | None, after: dict | None) -> dict:
+        """Profile badge counter changes (gamelogic.PROFILE_COUNTERS) caused by a write."""
+        return {}
+
+    def _bump_counters(self, before: dict | None, after: dict | None):
+        """Apply the counter deltas of a write; ``before``/``after`` must come from the write
+        itself (see _write_live). The entity is already saved, so a failure is logged for
+        `manage.py backfill_profile_counters` rather than failing the request."""
+        owner = (after or before or {}).get("user_id")
+        if not owner:
+            return
+        counters = self._counter_deltas(before, after)
+        try:
+            increment_profile_counters(str(owner), counters)
+        except Exception:
+            logger.exception("profile counter update failed for user %s: %s", owner, counters)
+
     def _ensure_user_match(self, header_uid, payload_uid):
         if header_uid and payload_uid and str(header_uid) != str(payload_uid):
             return Response({"detail": "user_id mismatch between header and payload."}, status=400)
         return None
 
-    def list(self, request):
+    def _projection(self) -> dict:
+        # Only fetch what the serializer emits (plus the sort key used for cursors)
+        cls = type(self)
+        proj = cls.__dict__.get("_projection_cache")
+        if proj is None:
+            proj = {name: 1 for name in self.serializer_class().fields}
+            for field, _ in self.default_sort or []:
+                proj[field] = 1
+            proj["_id"] = 0
+            cls._projection_cache = proj
+        return proj
+
+    def _page_size(self, request) -> int:
+        default = getattr(settings, "LIST_PAGE_SIZE", 100)
+        maximum = getattr(settings, "LIST_MAX_PAGE_SIZE", 500)
+        raw = request.GET.get("limit")
+        size = int(raw) if raw not in (None, "") else default
+        return max(1, min(size, maximum))
+
+    # list()/retrieve() are split into query and response halves so that
+    # core/async_views.py can serve the same reads with the async driver.
+    def _list_query(self, request):
+        """(filter, sort, limit) for a list request; raises ValueError with the 400 detail."""
         uid = _request_user_id(request)
         filt = {"is_deleted": False}
         if uid:
             filt["user_id"] = uid
-        cursor = self._coll().find(filt)
-        if self.default_sort:
-            cursor = cursor.sort(self.default_sort)
-        items = list(cursor)
-        # Serializer for output
-        data = [self.serializer_class(instance=i).data for i in items]
-        return Response(data)
+        try:
+            limit = self._page_size(request)
+        except ValueError:
+            raise ValueError("limit must be an integer.") from None
+        # updated_at/occurred_at are mutable: a row edited between pages can move past the
+        # cursor (skipped) or ahead of it (repeated); see the README
+        sort_field, direction = (self.default_sort or [("id", 1)])[0]
+        token = request.GET.get("cursor")
+        if token:
+            try:
+                after_value, after_id = _decode_cursor(token)
+            except ValueError:
+                raise ValueError("Invalid cursor.") from None
+            if sort_field == "id":
+                filt["id"] = {"$lt" if direction < 0 else "$gt": after_id}
+            else:
+                filt.update(_keyset_filter(sort_field, direction, after_value, after_id))
+        order = [(sort_field, direction)] if sort_field == "id" else [(sort_field, direction), ("id", direction)]
+        return filt, order, limit
 
-    def retrieve(self, request, pk=None):
-        uid = _request_user_id(request)
-        doc = self._coll().find_one({"id": pk, "is_deleted": False})
+    def _list_page(self, request, items: list, limit: int):
+        """(serialized page, pagination headers) from up to limit + 1 fetched documents."""
+        sort_field = (self.default_sort or [("id", 1)])[0][0]
+        headers = {}
+        if len(items) > limit:
+            items = items[:limit]
+            last = items[-1]
+            next_token = _encode_cursor(last.get(sort_field), last.get("id"))
+            headers["X-Next-Cursor"] = next_token
+            next_url = replace_query_param(request.get_full_path(), "cursor", next_token)
+            headers["Link"] = f'<{next_url}>; rel="next"'
+        # Compiled read-only serializer: same output as serializer_class(instance=i).data
+        to_representation = compile_serializer(self.serializer_class)
+        return [to_representation(i) for i in items], headers
+
+    def list(self, request):
+        try:
+            filt, order, limit = self._list_query(request)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=400)
+        items = list(self._coll().find(filt, self._projection()).sort(order).limit(limit + 1))
+        data, headers = self._list_page(request, items, limit)
+        return Response(data, headers=headers)
+
+    def _retrieve_result(self, request, doc):
+        """(payload, status) for a retrieve of ``doc`` (None when missing)."""
         if not doc:
-            return Response({"detail": "Not found"}, status=404)
+            return {"detail": "Not found"}, 404
+        uid = _request_user_id(request)
         if uid and str(doc.get("user_id")) != str(uid):
-            return Response({"detail": "Forbidden"}, status=403)
-        return Response(self.serializer_class(instance=doc).data)
+            return {"detail": "Forbidden"}, 403
+        return compile_serializer(self.serializer_class)(doc), 200
+
+    def retrieve(self, request, pk=None):
+        doc = self._coll().find_one({"id": pk, "is_deleted": False})
+        payload, code = self._retrieve_result(request, doc)
+        return Response(payload, status=code)
 
     def create(self, request):
         serializer = self.serializer_class(data=request.data)
@@ -89,24 +260,37 @@ class BaseMongoViewSet(viewsets.ViewSet):
         if err:
             return err
         try:
-            doc = {
-                **self._normalize_doc(serializer.validated_data),
-                "id": str(uuid.uuid4()),
-                "created_at": _utcnow(),
-                "updated_at": _utcnow(),
-                "is_deleted": serializer.validated_data.get("is_deleted", False),
-            }
-            if uid and not doc.get("user_id"):
-                doc["user_id"] = uid
-            # Insert transaction
-            self._coll().insert_one(doc)
-            # Award XP for creating a transaction
+            doc = self._build_doc(serializer.validated_data, uid)
+            counters = self._counter_deltas(None, doc)
             xp_result = None
-            try:
-                if doc.get("user_id"):
-                    xp_result = award_xp(str(doc["user_id"]), reason="add_transaction", xp_amount=10)
-            except Exception as e:
-                xp_result = None
+            if outbox.enabled() and doc.get("user_id"):
+                # Entity + award event commit together; run_outbox_worker applies the XP
+                event = outbox.award_event(
+                    str(doc["user_id"]), "add_transaction", 10, counters,
+                    entity_type=self.collection_name, entity_id=doc["id"],
+                )
+                outbox.insert_with_events(self._coll(), doc, [event])
+                self._after_create(doc)
+                xp_result = outbox.pending_marker(event)
+            else:
+                # Insert transaction
+                self._coll().insert_one(doc)
+                self._after_create(doc)
+                # Award XP for creating a transaction
+                try:
+                    if doc.get("user_id"):
+                        xp_result = award_xp(
+                            str(doc["user_id"]),
+                            reason="add_transaction",
+                            xp_amount=10,
+                            counters=counters,
+                        )
+                except Exception:
+                    # The transaction is saved; its XP and counters are not. Logged so
+                    # backfill_profile_counters can be run instead of the drift going unnoticed
+                    logger.exception("award_xp failed for user %s (counters %s)", doc.get("user_id"), counters)
+                    xp_result = None
+            dataversion.bump(doc.get("user_id"))
             payload = self.serializer_class(instance=doc).data
             if xp_result is not None:
                 payload = {**payload, "xp_award": xp_result}
@@ -115,6 +299,14 @@ class BaseMongoViewSet(viewsets.ViewSet):
             # Surface error to client for debugging
             return Response({"error": f"create_failed: {str(e)}"}, status=400)
 
+    def _write_live(self, pk, update: dict):
+        """Apply ``update`` to the live document ``pk`` and return it as it was just before
+        the write, or None if it is gone. Derived-data deltas are computed from this
+        document, not from an earlier read, so concurrent writes cannot apply a delta twice."""
+        return self._coll().find_one_and_update(
+            {"id": pk, "is_deleted": False}, update, return_document=ReturnDocument.BEFORE
+        )
+
     def update(self, request, pk=None):
         existing = self._coll().find_one({"id": pk, "is_deleted": False})
         if not existing:
@@ -128,8 +320,13 @@ class BaseMongoViewSet(viewsets.ViewSet):
         if err:
             return err
         update_doc = {**self._normalize_doc(serializer.validated_data), "updated_at": _utcnow()}
-        self._coll().update_one({"id": pk}, {"$set": update_doc})
-        updated = self._coll().find_one({"id": pk})
+        before = self._write_live(pk, {"$set": update_doc})
+        if before is None:
+            return Response({"detail": "Not found"}, status=404)
+        updated = {**before, **update_doc}
+        self._after_update(before, updated)
+        self._bump_counters(before, updated)
+        dataversion.bump_many([before.get("user_id"), updated.get("user_id")])
         return Response(self.serializer_class(instance=updated).data)
 
     def destroy(self, request, pk=None):
@@ -139,7 +336,13 @@ class BaseMongoViewSet(viewsets.ViewSet):
         uid = _request_user_id(request)
         if uid and str(existing.get("user_id")) != str(uid):
             return Response({"detail": "Forbidden"}, status=403)
-        self._coll().update_one({"id": pk}, {"$set": {"is_deleted": True, "updated_at": _utcnow()}})
+        before = self._write_live(pk, {"$set": {"is_deleted": True, "updated_at": _utcnow()}})
+        if before is None:
+            # Deleted concurrently; that request applied the derived changes
+            return Response(status=204)
+        self._after_destroy(before)
+        self._bump_counters(before, None)
+        dataversion.bump(before.get("user_id"))
         return Response(status=204)
 
 class ProfileViewSet(BaseMongoViewSet):
@@ -152,11 +355,115 @@ class TransactionViewSet(BaseMongoViewSet):
     serializer_class = TransactionSerializer
     default_sort = [("occurred_at", -1)]
 
+    def _counter_deltas(self, before, after):
+        return {"tx_count": int(_live(after)) - int(_live(before))}
+
+    def _after_create(self, doc: dict):
+        rollups.record_insert(get_db(), doc)
+
+    def _after_update(self, before: dict, after: dict):
+        rollups.record_update(get_db(), before, after)
+
+    def _after_destroy(self, doc: dict):
+        rollups.record_delete(get_db(), doc)
+
+    @action(detail=False, methods=["post"], url_path="bulk")
+    def bulk(self, request):
+        """Create many transactions in one insert_many and award their XP in one call.
+
+        Invalid items are skipped and reported as ``errors: [{"index", "errors"}]``.
+        """
+        items = request.data
+        if not isinstance(items, list):
+            return Response({"detail": "Expected a list of transactions."}, status=400)
+        max_items = getattr(settings, "BULK_MAX_ITEMS", 1000)
+        if len(items) > max_items:
+            return Response({"detail": f"At most {max_items} transactions per request."}, status=400)
+        uid = _request_user_id(request)
+        child = self.serializer_class(many=True).child
+        docs, positions, errors = [], [], []
+        for idx, item in enumerate(items):
+            try:
+                validated = child.run_validation(item)
+            except ValidationError as e:
+                errors.append({"index": idx, "errors": e.detail})
+                continue
+            if uid and validated.get("user_id") and str(validated["user_id"]) != str(uid):
+                errors.append({"index": idx, "errors": {"user_id": ["user_id mismatch between header and payload."]}})
+                continue
+            docs.append(self._build_doc(validated, uid))
+            positions.append(idx)
+        if not docs:
+            return Response({"created": [], "errors": errors}, status=400)
+
+        def write(session):
+            failed = {}
+            try:
+                self._coll().insert_many(docs, ordered=False, session=session)
+            except BulkWriteError as e:
+                if session is not None:
+                    # The error aborted the transaction: none of the batch was written
+                    raise
+                failed = {we["index"]: we.get("errmsg", "write failed") for we in e.details.get("writeErrors", [])}
+            inserted = [d for i, d in enumerate(docs) if i not in failed]
+            events = []
+            if outbox.enabled():
+                # One award event per user, committed with the rows it pays for
+                events = [
+                    outbox.award_event(user_id, "add_transaction", 10 * count, {"tx_count": count}, entity_type="transactions")
+                    for user_id, count in _per_user(inserted).items()
+                ]
+                outbox.enqueue(events, session=session)
+            return failed, inserted, events
+
+        try:
+            failed, inserted, events = run_in_transaction(write) if outbox.enabled() else write(None)
+        except BulkWriteError as e:
+            reasons = {we["index"]: we.get("errmsg", "write failed") for we in e.details.get("writeErrors", [])}
+            failed = {i: reasons.get(i, "not written: another item in the batch failed") for i in range(len(docs))}
+            inserted, events = [], []
+        for i, reason in failed.items():
+            errors.append({"index": positions[i], "errors": {"non_field_errors": [reason]}})
+        rollups.apply_changes(get_db(), [(None, d) for d in inserted])
+        dataversion.bump_many(d.get("user_id") for d in inserted)
+
+        # One XP award per user for the whole batch instead of one per row
+        xp_awards = {}
+        if outbox.enabled():
+            xp_awards = {e["user_id"]: outbox.pending_marker(e) for e in events}
+        else:
+            for user_id, count in _per_user(inserted).items():
+                try:
+                    xp_awards[user_id] = award_xp(
+                        user_id, reason="add_transaction", xp_amount=10 * count, counters={"tx_count": count}
+                    )
+                except Exception:
+                    logger.exception("award_xp failed for user %s (counters %s)", user_id, {"tx_count": count})
+                    xp_awards[user_id] = None
+        to_representation = compile_serializer(self.serializer_class)
+        payload = {
+            "created": [to_representation(d) for d in inserted],
+            "errors": sorted(errors, key=lambda e: e["index"]),
+        }
+        if len(xp_awards) == 1:
+            payload["xp_award"] = next(iter(xp_awards.values()))
+        elif xp_awards:
+            payload["xp_awards"] = xp_awards
+        return Response(payload, status=status.HTTP_201_CREATED if inserted else 400)
+
 class GoalViewSet(BaseMongoViewSet):
     collection_name = "goals"
     serializer_class = GoalSerializer
     default_sort = [("updated_at", -1)]
 
+    def _counter_deltas(self, before, after):
+        saved_before = _float(before.get("current_amount")) if _live(before) else 0.0
+        saved_after = _float(after.get("current_amount")) if _live(after) else 0.0
+        return {
+            "goal_count": int(_live(after)) - int(_live(before)),
+            "total_saved": saved_after - saved_before,
+        }
+
 class XPLogViewSet(BaseMongoViewSet):
     collection_name = "xp_log"
     serializer_class = XPLogSerializer
@@ -1,5 +1,5 @@
 import React, { useEffect, useMemo, useState } from "react";
-import { Analytics } from "../services/mongodbClient";
+import { Dashboard } from "../services/mongodbClient";
 import {
   ResponsiveContainer,
   PieChart,
@@ -29,14 +29,17 @@ export default function AnalyticsPage() {
     setLoading(true);
     setError("");
     try {
-      const [{ data: sbc } = { data: {} }, ivxRes, gp] = await Promise.all([
-        Analytics.spendByCategory(month).then((d)=>({ data: d })),
-        Analytics.incomeVsExpense({ from: range.from || undefined, to: range.to || undefined }),
-        Analytics.goalProgress(),
-      ]);
-      setSpendData((sbc?.data) || []);
+      const summary = await Dashboard.summary(
+        ["spend_by_category", "income_vs_expense", "goal_progress"],
+        { month, from: range.from || undefined, to: range.to || undefined },
+      );
+      const sbc = summary.spend_by_category || {};
+      const ivxRes = summary.income_vs_expense || {};
+      const gp = summary.goal_progress || {};
+      setSpendData(sbc.data || []);
       setIvx({ income: ivxRes.income || 0, expense: ivxRes.expense || 0, net: ivxRes.net || 0 });
       setGoals(Array.isArray(gp.goals) ? gp.goals : []);
+      if (summary.errors) setError("Some analytics failed to load");
     } catch (e) {
       setError("Failed to load analytics");
     } finally {
@@ -123,7 +123,9 @@ export default function RecurringPage() {
           <select className="border rounded-lg px-3 py-2" value={form.cadence} onChange={(e)=>setForm({...form, cadence:e.target.value})}>
             <option value="monthly">monthly</option>
             <option value="weekly">weekly</option>
+            <option value="biweekly">biweekly</option>
             <option value="daily">daily</option>
+            <option value="yearly">yearly</option>
           </select>
           <div className="sm:col-span-6">
             <button className="mt-1 px-4 py-2 bg-emerald-600 text-white rounded-lg hover:bg-emerald-700">Create</button>
@@ -106,7 +106,9 @@ export default function SavingsPage() {
           <select className="border rounded-lg px-3 py-2" value={form.interval} onChange={(e)=>setForm({...form, interval:e.target.value})}>
             <option value="monthly">monthly</option>
             <option value="weekly">weekly</option>
+            <option value="biweekly">biweekly</option>
             <option value="daily">daily</option>
+            <option value="yearly">yearly</option>
           </select>
           <div className="sm:col-span-5">
             <button className="mt-1 px-4 py-2 bg-emerald-600 text-white rounded-lg hover:bg-emerald-700">Create</button>
@@ -123,11 +123,27 @@ export default {
   onAuthChange,
 };
 
+// Keyset-paginated list endpoints return one page per request; follow X-Next-Cursor
+// until the last page so callers still get every row.
+const LIST_PAGE_LIMIT = 500;
+
+export async function listAll(path, params) {
+  const items = [];
+  let cursor = null;
+  do {
+    const query = { ...(params || {}), limit: LIST_PAGE_LIMIT };
+    if (cursor) query.cursor = cursor;
+    const { data, headers } = await api.get(path, { params: query });
+    if (Array.isArray(data)) items.push(...data);
+    cursor = headers["x-next-cursor"] || null;
+  } while (cursor);
+  return items;
+}
+
 // Domain API helpers
 export const Transactions = {
   async list() {
-    const { data } = await api.get('/api/transactions/');
-    return data;
+    return listAll('/api/transactions/');
   },
   async create(payload) {
     const { data } = await api.post('/api/transactions/', payload);
@@ -141,8 +157,7 @@ export const Transactions = {
 
 export const Goals = {
   async list() {
-    const { data } = await api.get('/api/goals/');
-    return data;
+    return listAll('/api/goals/');
   },
   async create(payload) {
     const { data } = await api.post('/api/goals/', payload);
@@ -150,6 +165,12 @@ export const Goals = {
   },
 };
 
+export const XPLog = {
+  async list() {
+    return listAll('/api/xp-log/');
+  },
+};
+
 export async function getProfile() {
   const { data } = await api.get('/api/profile/');
   return data;
@@ -177,3 +198,13 @@ export const Analytics = {
     return data;
   },
 };
+
+// Dashboard summary: several sections in one request (sections: array of names; params: month, from, to, window)
+export const Dashboard = {
+  async summary(sections, params) {
+    const query = { ...(params || {}) };
+    if (sections && sections.length) query.sections = sections.join(',');
+    const { data } = await api.get('/api/dashboard/summary/', { params: query });
+    return data;
+  },
+};